@@ -0,0 +1,67 @@
+import itertools
+import time
+import statistics
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# Trailing bytes after the image data, ignored by the decoder; they make every
+# upload unique so the API's feature cache (keyed by the bytes) never answers
+_uploads = itertools.count()
+
+
+def post_image(url, image_bytes, filename, unique=True):
+    if unique:
+        image_bytes += b"\0bench%d" % next(_uploads)
+    start = time.perf_counter()
+    response = requests.post(url, files={"file": (filename, image_bytes, "image/jpeg")})
+    return (time.perf_counter() - start) * 1000, response.status_code
+
+
+def run_level(url, image_bytes, filename, concurrency, requests_per_client, unique=True):
+    """Throughput in req/s plus latencies for one concurrency level"""
+    total = concurrency * requests_per_client
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        results = list(clients.map(lambda _: post_image(url, image_bytes, filename, unique), range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(ms for ms, _ in results)
+    errors = sum(1 for _, status in results if status >= 500)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return total / elapsed, statistics.median(latencies), p95, errors
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Load-test /recognize/image at increasing concurrency")
+    parser.add_argument("image", help="Image to upload on every request")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+    parser.add_argument("--repeat", action="store_true",
+                        help="Upload identical bytes every time, measuring the feature cache instead of extraction")
+    args = parser.parse_args()
+
+    image_path = Path(args.image)
+    image_bytes = image_path.read_bytes()
+    url = f"{args.url}/recognize/image"
+
+    # One warm-up request so model loading is not counted
+    post_image(url, image_bytes, image_path.name)
+
+    print(f"{'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'5xx':>5}")
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        throughput, p50, p95, errors = run_level(url, image_bytes, image_path.name, concurrency, args.requests,
+                                                 unique=not args.repeat)
+        print(f"{concurrency:>8} {throughput:8.1f} {p50:8.1f} {p95:8.1f} {errors:5d}")
+
+    health = requests.get(f"{args.url}/health").json()
+    if health.get("feature_cache"):
+        cache = health["feature_cache"]
+        print(f"\nFeature cache: {cache['hits']} hits, {cache['misses']} misses (server lifetime)")
+    pool = health.get("pool")
+    if pool:
+        print(f"\nPool: {pool['size']} workers, utilization {pool['utilization']:.0%}, "
+              f"avg wait {pool['wait_avg_ms']:.1f}ms, max wait {pool['wait_max_ms']:.1f}ms")
@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+import mediapipe as mp
+from landmarkers import Landmarkers
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def load_frames(path, max_frames):
+    """Frames from a video, or a single image repeated"""
+    image = cv2.imread(str(path))
+    if image is not None:
+        return [image] * max_frames
+
+    frames = []
+    cap = cv2.VideoCapture(str(path))
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def benchmark(frames, size, hand_roi):
+    """Average hand/frame latency in ms and mean hands found per frame"""
+    landmarkers = Landmarkers("models", running_mode="image", hand_roi=hand_roi)
+    hands_found = []
+    for frame in frames:
+        resized = cv2.resize(frame, size)
+        img_rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
+        hands_result, _, _ = landmarkers.detect(mp_image)
+        hands_found.append(len(hands_result.hand_landmarks))
+
+    averages = landmarkers.timings.averages()
+    landmarkers.close()
+    return averages["hands"], averages["frame"], float(np.mean(hands_found))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Full-frame vs pose-guided hand landmarking latency")
+    parser.add_argument("input", help="Image or video file")
+    parser.add_argument("--frames", type=int, default=50)
+    args = parser.parse_args()
+
+    frames = load_frames(args.input, args.frames)
+    print(f"{len(frames)} frames from {args.input}")
+
+    for name, size in RESOLUTIONS.items():
+        full_hands, full_frame, full_found = benchmark(frames, size, hand_roi=False)
+        roi_hands, roi_frame, roi_found = benchmark(frames, size, hand_roi=True)
+        print(f"{name:>6} full frame: hands {full_hands:.1f}ms, frame {full_frame:.1f}ms, "
+              f"{full_found:.2f} hands/frame")
+        print(f"{name:>6}   hand ROI: hands {roi_hands:.1f}ms, frame {roi_frame:.1f}ms, "
+              f"{roi_found:.2f} hands/frame")
+        if roi_frame > 0:
+            print(f"{name:>6}    speedup: {full_frame / roi_frame:.2f}x per frame")
@@ -0,0 +1,128 @@
+"""Latency, memory and top-1 agreement with exact search for each index profile
+
+Builds one throwaway collection per profile (see index_profiles.py) from the
+training blocks of a corpus and queries it with the held-out blocks, the same
+split as validate_sampling.py. Agreement is measured against brute-force
+cosine search in NumPy over the same points.
+
+    python benchmark_index_profiles.py vectors --url http://localhost:6333
+
+Without --url or q_url it falls back to the in-memory client, which always
+searches brute force and ignores HNSW/quantization: fine for a dry run, not
+for numbers.
+
+Memory is reported twice: "est MB" is index_profiles.ram_estimate, computed
+from array sizes, and "RSS +MB" is measured, the growth of the server's
+memory_resident_bytes metric (of this process with the in-memory client)
+from before the build to after the queries.
+"""
+import os
+import resource
+import time
+import urllib.request
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct
+from index_profiles import INDEX_PROFILES, collection_config, search_params, ram_estimate
+from search_backend import normalize
+from upload_to_qdrant import wait_indexed
+from validate_sampling import split
+from vector_store import load_vectors
+
+
+def exact_top1(train, queries):
+    """Row index of each query's cosine nearest neighbour"""
+    train, queries = normalize(train), normalize(queries)
+    return np.concatenate([
+        (queries[start:start + 1024] @ train.T).argmax(axis=1) for start in range(0, len(queries), 1024)
+    ])
+
+
+def resident_bytes(url=None, api_key=None):
+    """Resident memory of the Qdrant server at url (its /metrics), or of this process"""
+    if url is None:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    request = urllib.request.Request(f"{url.rstrip('/')}/metrics", headers={"api-key": api_key} if api_key else {})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        for line in response.read().decode().splitlines():
+            if line.startswith("memory_resident_bytes "):
+                return int(float(line.split()[1]))
+    raise RuntimeError(f"{url}/metrics has no memory_resident_bytes")
+
+
+def build(client, collection_name, profile, train, labels, batch_size=256):
+    """Fresh collection under a profile holding train, point id = row index"""
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(collection_name=collection_name, **collection_config(profile, train.shape[1]))
+    start = time.perf_counter()
+    for i in range(0, len(train), batch_size):
+        client.upsert(collection_name=collection_name, points=[
+            PointStruct(id=i + j, vector=vector.tolist(), payload={"label": str(labels[i + j])})
+            for j, vector in enumerate(train[i:i + batch_size])
+        ])
+    wait_indexed(client, collection_name)
+    return time.perf_counter() - start
+
+
+def run(client, collection_name, profile, queries, truth, warmup=20):
+    """(latencies in ms, top-1 point ids) of every query"""
+    params = search_params(profile)
+    for query in queries[:warmup]:
+        client.query_points(collection_name=collection_name, query=query.tolist(), limit=1, search_params=params)
+    latencies, ids = [], []
+    for query in queries:
+        start = time.perf_counter()
+        points = client.query_points(
+            collection_name=collection_name, query=query.tolist(), limit=1, search_params=params
+        ).points
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(points[0].id if points else -1)
+    return np.array(latencies), np.array(ids)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare Qdrant index profiles on a vector corpus")
+    parser.add_argument("vectors", nargs="?", default="vectors", help="vectors/ tree or vector store")
+    parser.add_argument("--url", default=os.getenv("q_url"), help="Qdrant server (default: q_url, else in-memory)")
+    parser.add_argument("--profiles", default=",".join(INDEX_PROFILES), help="Comma-separated index profiles")
+    parser.add_argument("--queries", type=int, default=1000, help="Held-out queries per profile")
+    args = parser.parse_args()
+
+    api_key = os.getenv("q_api") or None
+    if args.url:
+        client = QdrantClient(url=args.url, api_key=api_key)
+    else:
+        print("No --url: in-memory client, which ignores index settings (dry run)\n")
+        client = QdrantClient(location=":memory:")
+
+    matrix, meta = load_vectors(args.vectors)
+    test = split(meta["frame"])
+    train, train_labels = matrix[~test], meta["label"][~test]
+    rng = np.random.default_rng(0)
+    picked = rng.choice(np.where(test)[0], size=min(args.queries, int(test.sum())), replace=False)
+    queries, query_labels = matrix[picked], meta["label"][picked]
+    truth = exact_top1(train, queries)
+    print(f"{len(train)} indexed, {len(queries)} queries, exact top-1 label accuracy "
+          f"{(train_labels[truth] == query_labels).mean():.1%}\n")
+
+    print(f"{'profile':>9} {'build s':>8} {'p50 ms':>7} {'p99 ms':>7} {'est MB':>7} {'RSS +MB':>8} {'agree':>7} "
+          f"{'label acc':>10}")
+    for profile in args.profiles.split(","):
+        collection_name = f"bench_index_{profile}"
+        before = resident_bytes(args.url, api_key)
+        build_seconds = build(client, collection_name, profile, train, train_labels)
+        latencies, ids = run(client, collection_name, profile, queries, truth)
+        measured = (resident_bytes(args.url, api_key) - before) / 2**20
+        found = ids >= 0
+        agree = (ids == truth).mean()
+        label_acc = (train_labels[ids[found]] == query_labels[found]).sum() / len(ids)
+        ram = ram_estimate(profile, len(train), train.shape[1]) / 2**20
+        print(f"{profile:>9} {build_seconds:8.1f} {np.percentile(latencies, 50):7.2f} {np.percentile(latencies, 99):7.2f} "
+              f"{ram:7.1f} {measured:8.1f} {agree:7.1%} {label_acc:10.1%}")
+        client.delete_collection(collection_name)
+
+    print(f"\nBenchmark process peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
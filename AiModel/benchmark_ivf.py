@@ -0,0 +1,108 @@
+"""Recall vs latency of the IVF index as nprobe grows, on synthetic corpora
+
+Synthetic vectors are real sign vectors plus Gaussian noise scaled to each
+dimension's spread, so any size keeps the corpus's cluster structure. For
+each size the script builds a flat IVF index (and a PQ one with --pq), then
+reports per-query p50/p99 latency, recall@1 and recall@10 against exact
+cosine search over the same points, and how often the top-1 label matches
+exact search's, for every nprobe, with the exact scan as the baseline row.
+Near-duplicate frames sit closer together than PQ codes resolve, so PQ's
+recall is low while its label agreement is what recognition sees.
+
+    python benchmark_ivf.py vectors --sizes 100000,1000000 --nprobe 1,2,4,8,16,32,64 --pq 52
+
+nlist defaults to sqrt(size). 1M vectors take about 1 GB as float32 and the
+build holds two more copies, so plan for ~4 GB of RAM.
+"""
+import time
+import numpy as np
+from ivf_index import IVFIndex
+from search_backend import normalize, top_k_rows
+from vector_store import load_vectors
+
+
+def synthetic(base, labels, size, noise=0.1, seed=0, block=65536):
+    """(size, dim) unit vectors around random base rows, with their labels"""
+    rng = np.random.default_rng(seed)
+    scale = (noise * base.std(axis=0)).astype(np.float32)
+    picked = rng.integers(0, len(base), size)
+    out = np.empty((size, base.shape[1]), dtype=np.float32)
+    for start in range(0, size, block):
+        rows = picked[start:start + block]
+        out[start:start + len(rows)] = normalize(
+            base[rows] + rng.standard_normal((len(rows), base.shape[1]), dtype=np.float32) * scale
+        )
+    return out, labels[picked]
+
+
+def exact_top(matrix, queries, top_k=10):
+    """(row ids (queries, top_k), per-query latencies in ms) of brute-force cosine search"""
+    rows, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        idx, _ = top_k_rows((matrix @ query)[None, :], top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        rows.append(idx[0])
+    return np.array(rows), np.array(latencies)
+
+
+def sweep(index, queries, truth, labels, nprobes, top_k=10):
+    """(nprobe, p50 ms, p99 ms, recall@1, recall@10, label agreement) per nprobe"""
+    results = []
+    for nprobe in nprobes:
+        for query in queries[:20]:
+            index.search_rows(query, top_k, nprobe)
+        latencies, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            rows, _ = index.search_rows(query, top_k, nprobe)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found.append(index.ids[rows])
+        recall1 = np.mean([len(f) and f[0] == t[0] for f, t in zip(found, truth)])
+        recall10 = np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)])
+        agree = np.mean([len(f) and labels[f[0]] == labels[t[0]] for f, t in zip(found, truth)])
+        results.append((nprobe, np.percentile(latencies, 50), np.percentile(latencies, 99), recall1, recall10, agree))
+    return results
+
+
+def print_rows(name, rows):
+    for nprobe, p50, p99, recall1, recall10, agree in rows:
+        print(f"{name:>10} {nprobe:>7} {p50:8.2f} {p99:8.2f} {recall1:9.1%} {recall10:10.1%} {agree:7.1%}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sweep IVF nprobe on synthetic corpora")
+    parser.add_argument("vectors", nargs="?", default="vectors", help="vectors/ tree or store the synthetic data derives from")
+    parser.add_argument("--sizes", default="100000,1000000", help="Comma-separated corpus sizes")
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32,64", help="Comma-separated nprobe values")
+    parser.add_argument("--nlist", type=int, default=None, help="Partitions (default: sqrt(size))")
+    parser.add_argument("--pq", type=int, default=None, help="Also benchmark PQ residuals with this many codes")
+    parser.add_argument("--noise", type=float, default=0.1, help="Noise, as a fraction of each dimension's std")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per setting")
+    args = parser.parse_args()
+
+    base, meta = load_vectors(args.vectors)
+    nprobes = [int(n) for n in args.nprobe.split(",")]
+    print(f"Synthetic data from {len(base)} vectors of {args.vectors}, noise {args.noise}\n")
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        matrix, labels = synthetic(base, meta["label"], size, args.noise)
+        queries, _ = synthetic(base, meta["label"], args.queries, args.noise, seed=1)
+        truth, exact_latencies = exact_top(matrix, queries)
+        nlist = args.nlist or int(np.sqrt(size))
+        print(f"{size} vectors, nlist {nlist}")
+        print(f"{'index':>10} {'nprobe':>7} {'p50 ms':>8} {'p99 ms':>8} {'recall@1':>9} {'recall@10':>10} {'label':>7}")
+        print(f"{'exact':>10} {'-':>7} {np.percentile(exact_latencies, 50):8.2f} "
+              f"{np.percentile(exact_latencies, 99):8.2f} {1:9.1%} {1:10.1%} {1:7.1%}")
+
+        for pq in (None, args.pq) if args.pq else (None,):
+            name = f"ivf-pq{pq}" if pq else "ivf-flat"
+            index = IVFIndex.train(matrix, labels, nlist=nlist, pq=pq, info={"profile": "synthetic"})
+            megabytes = sum(a.nbytes for a in (index.vectors, index.codes, index.codebooks) if a is not None) / 2**20
+            print(f"{'':>10} {name}: built in {index.info['build_seconds']}s, {megabytes:.0f} MB of vectors")
+            print_rows(name, sweep(index, queries, truth, labels, [n for n in nprobes if n <= nlist]))
+            del index
+        del matrix, labels
+        print()
@@ -0,0 +1,51 @@
+import time
+import cv2
+from concurrent.futures import ThreadPoolExecutor
+from process_pool import ProcessWorkerPool
+
+
+def run(frame, workers, requests_total, profile="full", parallel=False):
+    """Frames/sec through a ProcessWorkerPool with 2 client threads per worker"""
+    pool = ProcessWorkerPool({"profile": profile, "parallel": parallel}, workers=workers)
+    try:
+        # Model loading is not part of the measurement
+        pool.wait_ready()
+        pool.extract(frame)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2 * workers) as clients:
+            list(clients.map(lambda _: pool.extract(frame), range(requests_total)))
+        elapsed = time.perf_counter() - start
+        return requests_total / elapsed, pool.timings.summary()
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="Requests/sec of process-pool landmarking by worker count")
+    parser.add_argument("image", help="Image sent on every request")
+    parser.add_argument("--workers", default=None, help="Comma-separated worker counts (default: 1,2,4,.. up to the cores)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--profile", default="full")
+    args = parser.parse_args()
+
+    frame = cv2.imread(args.image)
+    if frame is None:
+        raise SystemExit(f"Could not read {args.image}")
+
+    if args.workers:
+        counts = [int(n) for n in args.workers.split(",")]
+    else:
+        cores = os.cpu_count() or 1
+        counts = [n for n in (1, 2, 4, 8, 16, 32) if n <= cores]
+
+    print(f"{frame.shape[1]}x{frame.shape[0]}, {args.requests} requests, {os.cpu_count()} cores\n")
+    print(f"{'workers':>8} {'req/s':>8} {'scaling':>8}")
+    baseline = None
+    for workers in counts:
+        throughput, timings = run(frame, workers, args.requests, args.profile)
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:8.1f} {throughput / baseline:7.2f}x   {timings}")
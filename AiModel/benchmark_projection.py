@@ -0,0 +1,146 @@
+"""Speedup and top-1 agreement of PCA-projected search with full-dimension rerank
+
+Fits a projection on the training blocks of a corpus for each --dims and
+queries with the held-out blocks (the split of validate_sampling.py),
+comparing each search with and without the projection stage:
+
+    exact   brute-force scan of all rows vs projected scan + rerank
+    ivf     IVF partitions in full vs projected space (ivf_index.py)
+    qdrant  unnamed vector vs pca prefetch rescored on full (with --url)
+
+Agreement is the share of queries whose top-1 point (and label) matches the
+unprojected search of the same kind. --size grows the indexed set with
+synthetic vectors around the training rows (see benchmark_ivf.py).
+
+    python benchmark_projection.py vectors --dims 32,48,64 --candidates 64 [--url http://localhost:6333]
+"""
+import os
+import time
+import numpy as np
+from benchmark_ivf import synthetic
+from ivf_index import IVFIndex
+from projection import Projection, rerank, FULL_VECTOR, REDUCED_VECTOR
+from search_backend import QdrantBackend, normalize, top_k_rows
+from validate_sampling import split
+from vector_store import load_vectors
+
+
+def timed(search, queries):
+    """(per-query latencies in ms, top-1 rows) of search(query) -> rows"""
+    for query in queries[:20]:
+        search(query)
+    latencies, top = [], []
+    for query in queries:
+        start = time.perf_counter()
+        rows = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        top.append(rows[0] if len(rows) else -1)
+    return np.array(latencies), np.array(top)
+
+
+def qdrant_collection(client, collection_name, train, labels, projection=None, batch_size=256):
+    """Fresh collection holding train, point id = row index, with pca vectors if projected"""
+    from index_profiles import collection_config
+    from qdrant_client.models import PointStruct
+    from upload_to_qdrant import wait_indexed
+
+    if client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+    client.create_collection(collection_name=collection_name,
+                             **collection_config(None, train.shape[1], projection.dims if projection is not None else None))
+    for i in range(0, len(train), batch_size):
+        block = train[i:i + batch_size]
+        vectors = block.tolist() if projection is None else [
+            {FULL_VECTOR: v.tolist(), REDUCED_VECTOR: r.tolist()} for v, r in zip(block, projection.transform(block))
+        ]
+        client.upsert(collection_name=collection_name, points=[
+            PointStruct(id=i + j, vector=vector, payload={"label": str(labels[i + j])}) for j, vector in enumerate(vectors)
+        ])
+    wait_indexed(client, collection_name)
+
+
+def qdrant_search(backend):
+    """search(query) -> point ids through a QdrantBackend's query"""
+    def search(query):
+        return [p.id for p in backend.client.query_points(
+            collection_name=backend.collection_name, search_params=backend.params, with_payload=False,
+            **backend._query(query, 1)
+        ).points]
+    return search
+
+
+def report(kind, dims, energy, baseline, projected, labels):
+    """One result line: projected search against the same kind without projection"""
+    (base_ms, base_top), (ms, top) = baseline, projected
+    agree = (top == base_top).mean()
+    label_agree = (labels[top] == labels[base_top]).mean()
+    print(f"{kind:>7} {dims:>5} {energy:7.1%} {np.percentile(base_ms, 50):9.2f} {np.percentile(ms, 50):8.2f} "
+          f"{np.percentile(ms, 99):8.2f} {np.percentile(base_ms, 50) / np.percentile(ms, 50):8.1f}x "
+          f"{agree:7.1%} {label_agree:7.1%}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare search with and without a PCA projection stage")
+    parser.add_argument("vectors", nargs="?", default="vectors", help="vectors/ tree or vector store")
+    parser.add_argument("--dims", default="32,48,64", help="Comma-separated projection sizes")
+    parser.add_argument("--candidates", type=int, default=64, help="Rows reranked at full dimension")
+    parser.add_argument("--size", type=int, default=None, help="Index this many synthetic vectors instead")
+    parser.add_argument("--queries", type=int, default=500, help="Held-out queries")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF partitions (default: sqrt(indexed))")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF partitions scanned per query")
+    parser.add_argument("--url", default=os.getenv("q_url"), help="Qdrant server (default: q_url, else skipped)")
+    args = parser.parse_args()
+
+    matrix, meta = load_vectors(args.vectors)
+    test = split(meta["frame"])
+    train, labels = matrix[~test], meta["label"][~test]
+    if args.size:
+        train, labels = synthetic(train, labels, args.size)
+    train = normalize(train)
+    rng = np.random.default_rng(0)
+    queries = normalize(matrix[rng.choice(np.where(test)[0], size=min(args.queries, int(test.sum())), replace=False)])
+    nlist = args.nlist or int(np.sqrt(len(train)))
+    print(f"{len(train)} indexed, {len(queries)} queries, {args.candidates} reranked, ivf nlist {nlist} nprobe {args.nprobe}\n")
+
+    client = None
+    if args.url:
+        from qdrant_client import QdrantClient
+        client = QdrantClient(url=args.url, api_key=os.getenv("q_api") or None)
+    else:
+        print("No --url: Qdrant skipped\n")
+
+    exact = timed(lambda q: top_k_rows((train @ q)[None, :], 1)[0][0], queries)
+    ivf = IVFIndex.train(train, labels, nlist=nlist, nprobe=args.nprobe)
+    ivf_full = timed(lambda q: ivf.ids[ivf.search_rows(q, 1)[0]], queries)
+    del ivf
+    if client is not None:
+        qdrant_collection(client, "bench_projection_full", train, labels)
+        qdrant_full = timed(qdrant_search(QdrantBackend(client, "bench_projection_full")), queries)
+        client.delete_collection("bench_projection_full")
+
+    print(f"{'search':>7} {'dims':>5} {'energy':>7} {'full ms':>9} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>9} "
+          f"{'top-1':>7} {'label':>7}")
+    for dims in (int(d) for d in args.dims.split(",")):
+        projection = Projection.fit(train, dims)
+        energy = projection.info["energy"]
+        reduced = projection.transform(train)
+
+        def projected(query):
+            candidates, _ = top_k_rows((reduced @ projection.transform(query))[None, :], args.candidates)
+            return rerank(train, candidates[0], query, 1)[0]
+
+        report("exact", dims, energy, exact, timed(projected, queries), labels)
+        del reduced
+
+        ivf = IVFIndex.train(train, labels, nlist=nlist, nprobe=args.nprobe, dims=dims)
+        ivf.candidates = args.candidates
+        report("ivf", dims, energy, ivf_full, timed(lambda q: ivf.ids[ivf.search_rows(q, 1)[0]], queries), labels)
+        del ivf
+
+        if client is not None:
+            qdrant_collection(client, "bench_projection_pca", train, labels, projection)
+            backend = QdrantBackend(client, "bench_projection_pca", projection=projection, candidates=args.candidates)
+            report("qdrant", dims, energy, qdrant_full, timed(qdrant_search(backend), queries), labels)
+            client.delete_collection("bench_projection_pca")
@@ -0,0 +1,113 @@
+"""Latency and agreement of the per-label prototype stage against full search
+
+Builds prototypes from the training blocks of a corpus (the split of
+validate_sampling.py) for each method and --per-label, and queries with the
+held-out blocks:
+
+    labels@N   share of queries whose full-search top-1 label is among the
+               N best prototype labels, i.e. what a shortlist of N can find
+    proto      prototype scores alone (prototype_rerank=0)
+    +exact     prototypes, then exact search inside the shortlisted labels
+    +qdrant    the same through a Qdrant label filter (with --url)
+
+Each row shows p50/p99 latency, speedup over the full search it replaces,
+top-1 label agreement with that search and accuracy against the true label.
+
+    python benchmark_prototypes.py vectors --per-label 1,4,8,16 --shortlist 3 [--url http://localhost:6333]
+"""
+import os
+import tempfile
+import time
+import numpy as np
+from benchmark_projection import qdrant_collection
+from prototypes import PrototypeIndex, METHODS
+from search_backend import ExactIndex, QdrantBackend
+from validate_sampling import split
+from vector_store import load_vectors
+
+
+def timed(backend, queries, warmup=20):
+    """(per-query latencies in ms, top-1 labels) of backend.search"""
+    for query in queries[:warmup]:
+        backend.search(query, 1)
+    latencies, top = [], []
+    for query in queries:
+        start = time.perf_counter()
+        matches = backend.search(query, 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        top.append(matches[0].label if matches else None)
+    return np.array(latencies), np.array(top, dtype=object)
+
+
+def report(stage, method, per_label, full, result, truth):
+    (full_ms, full_top), (ms, top) = full, result
+    print(f"{stage:>8} {method:>8} {per_label:>9} {np.percentile(ms, 50):8.3f} {np.percentile(ms, 99):8.3f} "
+          f"{np.percentile(full_ms, 50) / np.percentile(ms, 50):8.1f}x {(top == full_top).mean():7.1%} "
+          f"{(top == truth).mean():9.1%}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare prototype-first search with full search")
+    parser.add_argument("vectors", nargs="?", default="vectors", help="vectors/ tree or vector store")
+    parser.add_argument("--per-label", default="1,4,8,16", help="Comma-separated prototypes per label")
+    parser.add_argument("--methods", default=",".join(METHODS), help="Comma-separated prototype methods")
+    parser.add_argument("--shortlist", type=int, default=3, help="Labels searched after the prototype pass")
+    parser.add_argument("--queries", type=int, default=500, help="Held-out queries")
+    parser.add_argument("--url", default=os.getenv("q_url"), help="Qdrant server (default: q_url, else skipped)")
+    args = parser.parse_args()
+
+    matrix, meta = load_vectors(args.vectors)
+    test = split(meta["frame"])
+    train, labels = matrix[~test], meta["label"][~test]
+    rng = np.random.default_rng(0)
+    picked = rng.choice(np.where(test)[0], size=min(args.queries, int(test.sum())), replace=False)
+    queries, truth = matrix[picked], meta["label"][picked].astype(object)
+    print(f"{len(train)} indexed, {len(set(labels.tolist()))} labels, {len(queries)} queries, "
+          f"shortlist {args.shortlist}\n")
+
+    tmp = tempfile.TemporaryDirectory()
+    exact = ExactIndex.write(tmp.name, train, labels)
+    exact_full = timed(exact, queries)
+    qdrant = None
+    if args.url:
+        from qdrant_client import QdrantClient
+        from qdrant_client.models import PayloadSchemaType
+
+        client = QdrantClient(url=args.url, api_key=os.getenv("q_api") or None)
+        qdrant_collection(client, "bench_prototypes", train, labels)
+        client.create_payload_index("bench_prototypes", field_name="label", field_schema=PayloadSchemaType.KEYWORD)
+        qdrant = QdrantBackend(client, "bench_prototypes")
+        qdrant_full = timed(qdrant, queries)
+    else:
+        print("No --url: Qdrant skipped\n")
+
+    print(f"full exact p50 {np.percentile(exact_full[0], 50):.3f} ms, top-1 accuracy {(exact_full[1] == truth).mean():.1%}"
+          + (f"; full qdrant p50 {np.percentile(qdrant_full[0], 50):.3f} ms" if qdrant is not None else "") + "\n")
+    print(f"{'stage':>8} {'method':>8} {'per label':>9} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>9} {'agree':>7} "
+          f"{'accuracy':>9}")
+
+    recalls = []
+    for method in args.methods.split(","):
+        for per_label in (int(n) for n in args.per_label.split(",")):
+            index = PrototypeIndex.train(train, labels, per_label=per_label, method=method)
+            index.shortlist = args.shortlist
+            ranked = [[m.label for m in index.label_scores(q, 5)] for q in queries]
+            recalls.append((method, per_label, [
+                np.mean([full in r[:n] for full, r in zip(exact_full[1], ranked)]) for n in (1, 2, 3, 5)
+            ]))
+
+            report("proto", method, per_label, exact_full, timed(index, queries), truth)
+            index.rerank = exact
+            report("+exact", method, per_label, exact_full, timed(index, queries), truth)
+            if qdrant is not None:
+                index.rerank = qdrant
+                report("+qdrant", method, per_label, qdrant_full, timed(index, queries), truth)
+
+    print(f"\n{'method':>8} {'per label':>9} {'labels@1':>9} {'labels@2':>9} {'labels@3':>9} {'labels@5':>9}")
+    for method, per_label, recall in recalls:
+        print(f"{method:>8} {per_label:>9} " + " ".join(f"{r:9.1%}" for r in recall))
+    if qdrant is not None:
+        client.delete_collection("bench_prototypes")
+    tmp.cleanup()
@@ -0,0 +1,63 @@
+import time
+import cv2
+import mediapipe as mp
+from landmarkers import Landmarkers
+from sign_features import FeatureBuilder
+
+
+def benchmark_clip(video_path, running_mode, max_frames=None, parallel=False):
+    """Run hand/pose/face landmarking over a clip, returns (frames, seconds, vectors, timings)"""
+    landmarkers = Landmarkers("models", running_mode=running_mode, parallel=parallel)
+    features = FeatureBuilder()
+
+    cap = cv2.VideoCapture(str(video_path))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+
+    frames = 0
+    vectors = 0
+    elapsed = 0.0
+
+    while max_frames is None or frames < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
+        timestamp_ms = frames * 1000.0 / fps if fps > 0 else frames * 33
+
+        # Only inference and feature math are timed, decode is the same for both modes
+        start = time.perf_counter()
+        results = landmarkers.detect(mp_image, timestamp_ms)
+        if features.from_results(*results) is not None:
+            vectors += 1
+        elapsed += time.perf_counter() - start
+
+        frames += 1
+
+    cap.release()
+    landmarkers.close()
+    return frames, elapsed, vectors, landmarkers.timings.summary()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare IMAGE vs VIDEO running mode on one clip")
+    parser.add_argument("video_path")
+    parser.add_argument("--frames", type=int, default=None, help="Limit frames per run")
+    parser.add_argument("--parallel", action="store_true", help="Run the three detectors concurrently")
+    args = parser.parse_args()
+
+    print(f"Clip: {args.video_path} (parallel={args.parallel})")
+    results = {}
+    for mode in ("image", "video"):
+        frames, elapsed, vectors, timings = benchmark_clip(args.video_path, mode, args.frames, args.parallel)
+        fps = frames / elapsed if elapsed > 0 else 0.0
+        results[mode] = fps
+        print(f"{mode:>6}: {frames} frames in {elapsed:.2f}s -> {fps:.1f} frames/sec "
+              f"({vectors} vectors)")
+        print(f"        {timings}")
+
+    if results["image"] > 0:
+        print(f"Speedup (video / image): {results['video'] / results['image']:.2f}x")
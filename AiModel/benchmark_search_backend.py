@@ -0,0 +1,84 @@
+"""Single-query and batched latency of the local exact index versus Qdrant
+
+    python search_backend.py build vectors vectors_index
+    python benchmark_search_backend.py vectors_index --url http://localhost:6333 --collection sign_vectors
+
+Queries are rows of the index itself with a little noise, so both backends
+see the same workload. Without --url the Qdrant side is the in-memory client
+loaded with the same vectors, which has no network round trip and so
+flatters Qdrant.
+"""
+import os
+import time
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams, PointStruct
+from search_backend import QdrantBackend, open_index
+
+
+def timed(fn, batches):
+    """Per-call latencies in ms"""
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        fn(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def in_memory_collection(index, name="bench_search"):
+    """In-memory Qdrant collection with the index's vectors and labels"""
+    client = QdrantClient(location=":memory:")
+    client.create_collection(name, vectors_config=VectorParams(size=index.matrix.shape[1], distance=Distance.COSINE))
+    for start in range(0, index.count(), 512):
+        rows = range(start, min(start + 512, index.count()))
+        client.upsert(name, points=[
+            PointStruct(id=i, vector=index.matrix[i].tolist(),
+                        payload={"label": str(index.label_names[index.label_codes[i]])})
+            for i in rows
+        ])
+    return client
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local exact index vs Qdrant search latency")
+    parser.add_argument("index", help="Local index directory (search_backend.py build)")
+    parser.add_argument("--url", default=None, help="Qdrant server; default: in-memory client")
+    parser.add_argument("--collection", default="sign_vectors", help="Collection on --url holding the same vectors")
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    local = open_index(args.index)
+    if args.url:
+        client = QdrantClient(url=args.url, api_key=os.getenv("q_api") or None)
+        remote = QdrantBackend(client, args.collection)
+    else:
+        print("No --url: Qdrant in-memory client, no network round trip\n")
+        remote = QdrantBackend(in_memory_collection(local), "bench_search")
+
+    rng = np.random.default_rng(0)
+    rows = rng.choice(local.count(), size=args.queries, replace=False)
+    queries = np.asarray(local.matrix[rows]) + rng.normal(0, 0.01, (args.queries, local.matrix.shape[1]))
+    queries = queries.astype(np.float32)
+
+    agree = np.mean([
+        a[0].label == b[0].label
+        for a, b in zip(local.search_batch(queries, 1), remote.search_batch(queries, 1))
+    ])
+    print(f"{local.count()} vectors, {args.queries} queries, top-1 label agreement {agree:.1%}\n")
+
+    print(f"{'backend':>8} {'batch':>6} {'p50 ms/call':>12} {'p99 ms/call':>12} {'µs/query':>9}")
+    for size in [int(n) for n in args.batch_sizes.split(",")]:
+        batches = [queries[i:i + size] for i in range(0, len(queries), size)]
+        for backend in (local, remote):
+            if size == 1:
+                latencies = timed(lambda b: backend.search(b[0], args.top_k), batches)
+            else:
+                latencies = timed(lambda b: backend.search_batch(b, args.top_k), batches)
+            per_query = latencies.sum() / len(queries) * 1000
+            print(f"{backend.name:>8} {size:6d} {np.percentile(latencies, 50):12.3f} "
+                  f"{np.percentile(latencies, 99):12.3f} {per_query:9.0f}")
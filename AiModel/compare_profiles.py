@@ -0,0 +1,107 @@
+"""Side-by-side accuracy/latency report for the feature profiles
+
+Extracts vectors with every profile from the same inputs, then scores each
+profile with nearest-neighbour top-1 accuracy on a held-out split.
+
+Reindexing a collection with another profile:
+    python video_vectorizer.py data/ vectors_pose_face --profile pose_face
+    python upload_to_qdrant.py vectors_pose_face sign_vectors_pose_face
+and start sign_api with feature_profile=pose_face.
+"""
+import time
+import cv2
+import numpy as np
+import mediapipe as mp
+from pathlib import Path
+from landmarkers import Landmarkers
+from search_backend import normalize
+from sign_features import FeatureBuilder, PROFILES
+
+VIDEO_EXTS = (".mp4", ".mov", ".avi")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def iter_samples(input_dir, frame_stride):
+    """(label, group, BGR frame) for every image and every frame_stride-th video frame
+
+    group is the position used for the train/test split: the image index within
+    its label, or the block of frames within a video.
+    """
+    seen = {}
+    for path in sorted(Path(input_dir).rglob("*")):
+        suffix = path.suffix.lower()
+        if suffix in IMAGE_EXTS:
+            label = path.parent.name
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                seen[label] = seen.get(label, -1) + 1
+                yield label, seen[label], frame
+        elif suffix in VIDEO_EXTS:
+            cap = cv2.VideoCapture(str(path))
+            frame_idx = 0
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if frame_idx % frame_stride == 0:
+                    # Blocks of 10 sampled frames, so neighbouring frames share a split
+                    yield path.stem, frame_idx // (frame_stride * 10), frame
+                frame_idx += 1
+            cap.release()
+
+
+def extract_all(samples, profile):
+    """Feature matrix, labels, groups and per-frame latencies for one profile"""
+    landmarkers = Landmarkers("models", running_mode="image", detectors=PROFILES[profile]["detectors"])
+    builder = FeatureBuilder(profile)
+
+    vectors, labels, groups, latencies = [], [], [], []
+    missed = 0
+    for label, group, frame in samples:
+        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
+
+        start = time.perf_counter()
+        features = builder.from_results(*landmarkers.detect(mp_image))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        if features is None:
+            missed += 1
+            continue
+        vectors.append(features)
+        labels.append(label)
+        groups.append(group)
+
+    landmarkers.close()
+    return np.array(vectors), np.array(labels), np.array(groups), np.array(latencies), missed
+
+
+def holdout_accuracy(vectors, labels, groups, test_every=5):
+    """Top-1 cosine nearest-neighbour accuracy, every test_every-th group held out"""
+    test = groups % test_every == test_every - 1
+    if not test.any() or test.all():
+        return float("nan"), 0
+
+    normed = normalize(vectors)
+    scores = normed[test] @ normed[~test].T
+    predicted = labels[~test][scores.argmax(axis=1)]
+    return float((predicted == labels[test]).mean()), int(test.sum())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare feature profiles on labeled images/videos")
+    parser.add_argument("input_dir", help="Folder of label/<images> and/or <label>.mov videos")
+    parser.add_argument("--frame-stride", type=int, default=3, help="Use every n-th video frame")
+    args = parser.parse_args()
+
+    samples = list(iter_samples(args.input_dir, args.frame_stride))
+    print(f"{len(samples)} frames from {args.input_dir}\n")
+
+    print(f"{'profile':>10} {'p50 ms':>8} {'p90 ms':>8} {'vectors':>8} {'missed':>7} {'top-1':>7} {'tested':>7}")
+    for profile in PROFILES:
+        vectors, labels, groups, latencies, missed = extract_all(samples, profile)
+        accuracy, tested = holdout_accuracy(vectors, labels, groups) if len(vectors) else (float("nan"), 0)
+        p50, p90 = np.percentile(latencies, [50, 90])
+        print(f"{profile:>10} {p50:8.1f} {p90:8.1f} {len(vectors):8d} {missed:7d} {accuracy:7.1%} {tested:7d}")
@@ -0,0 +1,112 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Rough per-entry bookkeeping (dict slots, key, tuple) on top of the vector itself
+ENTRY_OVERHEAD = 256
+PREDICTION_BYTES = 128
+
+
+class _Entry:
+    __slots__ = ("features", "rejected_by", "created", "predictions", "size")
+
+    def __init__(self, features, rejected_by, created):
+        self.features = features
+        self.rejected_by = rejected_by
+        self.created = created
+        self.predictions = {}  # top_k -> list of {"label", "confidence"}
+        self.size = ENTRY_OVERHEAD + (features.nbytes if features is not None else 0)
+
+
+class FeatureCache:
+    """LRU cache of extraction results keyed by a hash of the uploaded bytes
+
+    The same upload always gives the same features (or the same rejection), so a
+    resubmitted capture skips decode and detection. Search results can be kept
+    on the entry as well, per top_k. Entries expire after ttl seconds, which
+    also bounds how stale cached search results get after a reindex. The least
+    recently used entries are evicted once the estimated size passes max_bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, ttl=300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @staticmethod
+    def key(data):
+        """128-bit BLAKE2b digest of the raw upload"""
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get(self, key):
+        """Cached entry (features, rejected_by, predictions) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl:
+                self._remove(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, features, rejected_by):
+        if features is not None:
+            # Shared between requests from now on
+            features.setflags(write=False)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            entry = _Entry(features, rejected_by, time.monotonic())
+            self._entries[key] = entry
+            self._bytes += entry.size
+            self._evict()
+
+    def put_predictions(self, key, top_k, predictions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or top_k in entry.predictions:
+                return
+            entry.predictions[top_k] = predictions
+            added = PREDICTION_BYTES * max(len(predictions), 1)
+            entry.size += added
+            self._bytes += added
+            self._evict()
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key).size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+import cv2
+
+_DONE = object()
+
+
+class StageStats:
+    """Items handled, time spent working and time spent blocked on a queue for one stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+
+    def summary(self, wall):
+        rate = self.items / self.busy if self.busy > 0 else 0.0
+        return (f"{self.name:>7}: {self.items} items, {rate:.1f}/s while busy, "
+                f"busy {self.busy / wall:.0%}, blocked {self.waiting / wall:.0%}")
+
+
+class FrameDecoder:
+    """Reads and converts frames on a background thread, bounded by queue_size
+
+    Iterating yields (frame_idx, frame_bgr, frame_rgb) in order. When the queue
+    is full the decoder blocks, so at most queue_size frames are held in memory
+    however far ahead decoding could run.
+    """
+
+    def __init__(self, cap, start_frame=0, end_frame=None, queue_size=8):
+        self.cap = cap
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.stats = StageStats("decode")
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="frame-decoder", daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.stats.waiting += time.perf_counter() - start
+
+    def _run(self):
+        try:
+            # Skip by decoding rather than seeking, seeks are not frame-exact for every codec
+            frame_idx = 0
+            while frame_idx < self.start_frame and self.cap.grab():
+                frame_idx += 1
+
+            while not self._stop.is_set() and (self.end_frame is None or frame_idx < self.end_frame):
+                start = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                self.stats.busy += time.perf_counter() - start
+                self.stats.items += 1
+                self._put((frame_idx, frame, rgb))
+                frame_idx += 1
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(_DONE)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """Stop decoding early, e.g. when inference failed"""
+        self._stop.set()
+        self._thread.join()
+
+
+class BatchWriter:
+    """Hands records to a sink (see vector_store) on a background thread
+
+    add() blocks once queue_size records are waiting. The thread takes up to
+    batch_size records at a time and writes them in order, so the output is
+    the same as writing them inline.
+    """
+
+    def __init__(self, sink, queue_size=256, batch_size=32):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.stats = StageStats("write")
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="vector-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, name, record):
+        self._queue.put((name, record))
+
+    def _run(self):
+        done = False
+        while not done:
+            start = time.perf_counter()
+            batch = [self._queue.get()]
+            self.stats.waiting += time.perf_counter() - start
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            start = time.perf_counter()
+            for item in batch:
+                if item is _DONE:
+                    done = True
+                    break
+                # After a failure keep draining, so add() never blocks forever
+                if self._error is None:
+                    try:
+                        self.sink.add(*item)
+                        self.stats.items += 1
+                    except Exception as e:
+                        self._error = e
+            self.stats.busy += time.perf_counter() - start
+
+    def close(self, commit=True):
+        """Flush everything, close the sink and re-raise a write error if there was one
+
+        commit=False only stops the thread, e.g. after inference failed, and
+        leaves the sink unclosed.
+        """
+        self._queue.put(_DONE)
+        self._thread.join()
+        if not commit:
+            return
+        if self._error is not None:
+            raise self._error
+        start = time.perf_counter()
+        self.sink.close()
+        self.stats.busy += time.perf_counter() - start
+
+
+def report(stages, wall):
+    """Per-stage lines plus the stage that limits throughput"""
+    lines = [stage.summary(wall) for stage in stages]
+    bottleneck = max(stages, key=lambda stage: stage.busy)
+    lines.append(f"Bottleneck: {bottleneck.name}")
+    return "\n".join(lines)
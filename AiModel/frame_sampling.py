@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class MotionSampler:
+    """Keeps a video frame only when its features moved away from the last kept frame
+
+    A held sign gives long runs of nearly identical vectors; indexing all of
+    them grows the collection without adding anything a search can use. A frame
+    is kept when the L2 distance between its 260D vector and the last kept one
+    reaches threshold, but never sooner than min_stride frames after it. With
+    max_stride, a frame is kept at least that often even without motion, so
+    long holds still leave a few samples.
+    """
+
+    def __init__(self, threshold, min_stride=1, max_stride=None):
+        if min_stride < 1 or (max_stride is not None and max_stride < min_stride):
+            raise ValueError("Need 1 <= min_stride <= max_stride")
+        self.threshold = threshold
+        self.min_stride = min_stride
+        self.max_stride = max_stride
+        self.seen = 0
+        self.kept = 0
+        self.reset()
+
+    def reset(self):
+        """Start a new clip; the counters keep running across clips"""
+        self._last = None
+        self._last_idx = None
+
+    def keep(self, frame_idx, features):
+        self.seen += 1
+        if self._last is not None:
+            stride = frame_idx - self._last_idx
+            if stride < self.min_stride:
+                return False
+            moved = np.linalg.norm(features - self._last) >= self.threshold
+            if not moved and (self.max_stride is None or stride < self.max_stride):
+                return False
+        self._last = np.array(features, dtype=np.float32)
+        self._last_idx = frame_idx
+        self.kept += 1
+        return True
+
+    @property
+    def reduction(self):
+        """Share of frames with features that were dropped"""
+        return 1.0 - self.kept / self.seen if self.seen else 0.0
+
+    def summary(self):
+        return sampling_summary(self.kept, self.seen)
+
+    def options(self):
+        return {"threshold": self.threshold, "min_stride": self.min_stride, "max_stride": self.max_stride}
+
+
+def sampling_summary(kept, seen):
+    """Report line for kept out of seen frames, also used to total counts from several samplers"""
+    reduction = 1.0 - kept / seen if seen else 0.0
+    return f"kept {kept}/{seen} frames ({reduction:.0%} fewer vectors)"
+
+
+def sample_sequence(frames, vectors, threshold, min_stride=1, max_stride=None):
+    """Boolean keep-mask for one clip's (frame index, vector) rows, in any row order"""
+    sampler = MotionSampler(threshold, min_stride, max_stride)
+    mask = np.zeros(len(frames), dtype=bool)
+    for row in np.argsort(frames, kind="stable"):
+        mask[row] = sampler.keep(int(frames[row]), vectors[row])
+    return mask
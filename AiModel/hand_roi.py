@@ -0,0 +1,115 @@
+from collections import namedtuple
+import numpy as np
+import mediapipe as mp
+
+# Pose landmark indices: (wrist, elbow) per arm
+ARMS = [(15, 13), (16, 14)]
+
+Landmark = namedtuple("Landmark", "x y z")
+HandResult = namedtuple("HandResult", "hand_landmarks handedness")
+
+
+class HandRoiDetector:
+    """Hand landmarking on pose-guided crops instead of the full frame
+
+    The pose wrists/elbows give a tight box around each hand, extended past the
+    wrist along the forearm. The hand model only sees those crops, which is
+    cheaper on large frames and makes small hands bigger for the palm detector.
+    Landmarks are mapped back into full-frame normalized coordinates, so the
+    result can be used like a regular HandLandmarker result.
+    """
+
+    def __init__(self, model_dir="models", min_side=960, box_scale=1.6, min_visibility=0.5):
+        BaseOptions = mp.tasks.BaseOptions
+        HandLandmarker = mp.tasks.vision.HandLandmarker
+        HandLandmarkerOptions = mp.tasks.vision.HandLandmarkerOptions
+        VisionRunningMode = mp.tasks.vision.RunningMode
+
+        # Crops move around between frames, so they are always independent images
+        self.hands = HandLandmarker.create_from_options(
+            HandLandmarkerOptions(
+                base_options=BaseOptions(model_asset_path=f"{model_dir}/hand_landmarker.task"),
+                running_mode=VisionRunningMode.IMAGE,
+                num_hands=2,
+                min_hand_detection_confidence=0.5
+            )
+        )
+        self.min_side = min_side
+        self.box_scale = box_scale
+        self.min_visibility = min_visibility
+        self.stats = {"roi": 0, "fallback": 0}
+
+    def applies(self, mp_image):
+        """Only frames with a long side of at least min_side are cropped"""
+        return max(mp_image.width, mp_image.height) >= self.min_side
+
+    def boxes(self, pose_landmarks, width, height):
+        """Square pixel boxes (x0, y0, x1, y1) around each visible wrist, overlaps merged"""
+        boxes = []
+        for wrist_idx, elbow_idx in ARMS:
+            wrist = pose_landmarks[wrist_idx]
+            elbow = pose_landmarks[elbow_idx]
+            if getattr(wrist, "visibility", 1.0) < self.min_visibility:
+                continue
+
+            wx, wy = wrist.x * width, wrist.y * height
+            ex, ey = elbow.x * width, elbow.y * height
+            forearm = max(np.hypot(wx - ex, wy - ey), 0.05 * max(width, height))
+
+            # The hand continues past the wrist in the elbow -> wrist direction
+            cx = wx + 0.4 * (wx - ex)
+            cy = wy + 0.4 * (wy - ey)
+            half = 0.5 * self.box_scale * forearm
+
+            x0, y0 = int(max(cx - half, 0)), int(max(cy - half, 0))
+            x1, y1 = int(min(cx + half, width)), int(min(cy + half, height))
+            if x1 - x0 >= 16 and y1 - y0 >= 16:
+                boxes.append((x0, y0, x1, y1))
+
+        if len(boxes) == 2:
+            (ax0, ay0, ax1, ay1), (bx0, by0, bx1, by1) = boxes
+            if ax0 < bx1 and bx0 < ax1 and ay0 < by1 and by0 < ay1:
+                boxes = [(min(ax0, bx0), min(ay0, by0), max(ax1, bx1), max(ay1, by1))]
+        return boxes
+
+    def detect(self, mp_image, pose_result, fallback):
+        """Detect hands inside pose-guided crops
+
+        fallback() runs full-frame hand detection and is used when there is no
+        pose to guide the crops. Visible pose but no visible wrists means no hands.
+        """
+        if not pose_result.pose_landmarks:
+            self.stats["fallback"] += 1
+            return fallback()
+
+        width, height = mp_image.width, mp_image.height
+        boxes = self.boxes(pose_result.pose_landmarks[0], width, height)
+        self.stats["roi"] += 1
+
+        frame = mp_image.numpy_view()
+        hand_landmarks = []
+        handedness = []
+        for x0, y0, x1, y1 in boxes:
+            crop = np.ascontiguousarray(frame[y0:y1, x0:x1])
+            result = self.hands.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=crop))
+
+            crop_w, crop_h = x1 - x0, y1 - y0
+            for landmarks, hand_class in zip(result.hand_landmarks, result.handedness):
+                mapped = [
+                    Landmark(
+                        (x0 + lm.x * crop_w) / width,
+                        (y0 + lm.y * crop_h) / height,
+                        lm.z * crop_w / width
+                    )
+                    for lm in landmarks
+                ]
+                # The same hand can show up in two crops that touch but do not overlap
+                if any(abs(h[0].x - mapped[0].x) + abs(h[0].y - mapped[0].y) < 0.02 for h in hand_landmarks):
+                    continue
+                hand_landmarks.append(mapped)
+                handedness.append(hand_class)
+
+        return HandResult(hand_landmarks=hand_landmarks[:2], handedness=handedness[:2])
+
+    def close(self):
+        self.hands.close()
@@ -0,0 +1,90 @@
+"""Named Qdrant index settings: how a collection is built and how it is searched
+
+A profile fixes the HNSW graph, quantization and storage of a collection and
+the matching query-time parameters. The uploader builds with one
+(upload_to_qdrant.py --index-profile) and sign_api must search with the same
+one (index_profile=...). benchmark_index_profiles.py compares them. A
+projected collection (see projection.py) applies the profile to both of its
+named vectors.
+
+    fast      int8 vectors in RAM, originals on disk, no rescoring, small hnsw_ef
+    balanced  int8 vectors in RAM, originals in RAM, rescored with 2x oversampling
+    exact     float32 in RAM, brute-force search: the reference for recall
+"""
+from qdrant_client.models import (
+    Distance, VectorParams, HnswConfigDiff, ScalarQuantization, ScalarQuantizationConfig,
+    ScalarType, SearchParams, QuantizationSearchParams
+)
+
+INDEX_PROFILES = {
+    "fast": {
+        "m": 16, "ef_construct": 100, "quantization": "int8", "vectors_on_disk": True, "payload_on_disk": True,
+        "hnsw_ef": 32, "rescore": False, "oversampling": 1.0, "exact": False,
+    },
+    "balanced": {
+        "m": 16, "ef_construct": 200, "quantization": "int8", "vectors_on_disk": False, "payload_on_disk": False,
+        "hnsw_ef": 64, "rescore": True, "oversampling": 2.0, "exact": False,
+    },
+    "exact": {
+        "m": 16, "ef_construct": 100, "quantization": None, "vectors_on_disk": False, "payload_on_disk": False,
+        "hnsw_ef": None, "rescore": None, "oversampling": None, "exact": True,
+    },
+}
+
+
+def _profile(name):
+    if name not in INDEX_PROFILES:
+        raise ValueError(f"Unknown index profile '{name}', expected one of {tuple(INDEX_PROFILES)}")
+    return INDEX_PROFILES[name]
+
+
+def _vectors_config(vector_dim, projection_dims, on_disk=None):
+    """One unnamed vector, or full and pca named vectors when projected"""
+    if projection_dims is None:
+        return VectorParams(size=vector_dim, distance=Distance.COSINE, on_disk=on_disk)
+    from projection import FULL_VECTOR, REDUCED_VECTOR
+    return {
+        FULL_VECTOR: VectorParams(size=vector_dim, distance=Distance.COSINE, on_disk=on_disk),
+        REDUCED_VECTOR: VectorParams(size=projection_dims, distance=Distance.COSINE, on_disk=on_disk),
+    }
+
+
+def collection_config(name, vector_dim, projection_dims=None):
+    """create_collection keyword arguments of a profile; None gives Qdrant's defaults"""
+    if name is None:
+        return {"vectors_config": _vectors_config(vector_dim, projection_dims)}
+    profile = _profile(name)
+    config = {
+        "vectors_config": _vectors_config(vector_dim, projection_dims, profile["vectors_on_disk"]),
+        "hnsw_config": HnswConfigDiff(m=profile["m"], ef_construct=profile["ef_construct"]),
+        "on_disk_payload": profile["payload_on_disk"],
+    }
+    if profile["quantization"] == "int8":
+        config["quantization_config"] = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    return config
+
+
+def search_params(name):
+    """SearchParams for query_points under a profile; None for Qdrant's defaults"""
+    if name is None:
+        return None
+    profile = _profile(name)
+    if profile["exact"]:
+        return SearchParams(exact=True)
+    quantization = None
+    if profile["quantization"] is not None:
+        quantization = QuantizationSearchParams(rescore=profile["rescore"], oversampling=profile["oversampling"])
+    return SearchParams(hnsw_ef=profile["hnsw_ef"], quantization=quantization)
+
+
+def ram_estimate(name, points, vector_dim):
+    """Rough resident bytes of a collection: RAM-held vectors, quantized copies and HNSW links"""
+    profile = INDEX_PROFILES.get(name, {"m": 16, "quantization": None, "vectors_on_disk": False, "exact": False})
+    total = 0 if profile["vectors_on_disk"] else points * vector_dim * 4
+    if profile["quantization"] == "int8":
+        total += points * vector_dim
+    # Layer 0 keeps 2m neighbours of 4 bytes per point; upper layers add little
+    total += points * profile["m"] * 2 * 4
+    return total
@@ -0,0 +1,270 @@
+"""Approximate in-process index: k-means partitions (IVF) with optional PQ residuals
+
+Vectors are split into nlist partitions around spherical k-means centroids.
+A query scores the centroids, scans only the nprobe closest partitions and
+returns their top-k, so a search touches about nprobe / nlist of the corpus.
+With --pq, each vector is kept as its partition centroid plus a product-
+quantized residual (pq bytes instead of 4 * 260) and scored through
+per-query lookup tables; without it partitions hold the float32 vectors and
+scores are exact within the probed partitions.
+
+The whole index is one .npz file:
+
+    python ivf_index.py build vectors vectors.ivf.npz --nlist 256 --nprobe 8 [--pq 26]
+
+and is used like any local index: search_backend=local,
+local_index=vectors.ivf.npz, with local_nprobe to override the default.
+benchmark_ivf.py sweeps nprobe. With --dims the partitions (and PQ codes)
+live in a PCA projection stored in the same file, and the candidates found
+there are reranked against the full vectors (see projection.py).
+"""
+import json
+import os
+import time
+import numpy as np
+from pathlib import Path
+from projection import Projection, RERANK_CANDIDATES, rerank
+from search_backend import SearchBackend, Match, label_mask, normalize, top_k_rows
+from sign_features import FEATURE_VERSION
+from vector_store import write_npz
+
+PQ_CENTROIDS = 256
+
+
+def assign(x, centroids, spherical=True, block=65536):
+    """Index of the nearest centroid per row: highest dot product, or smallest L2 distance"""
+    bias = None if spherical else -0.5 * np.einsum("kd,kd->k", centroids, centroids)
+    out = np.empty(len(x), dtype=np.int32)
+    for start in range(0, len(x), block):
+        scores = x[start:start + block] @ centroids.T
+        if bias is not None:
+            scores += bias
+        out[start:start + block] = scores.argmax(axis=1)
+    return out
+
+
+def kmeans(x, k, iterations=20, spherical=True, max_train=None, seed=0):
+    """Lloyd's k-means on (a sample of) x; spherical keeps centroids at unit length for cosine"""
+    rng = np.random.default_rng(seed)
+    if max_train is not None and len(x) > max_train:
+        x = x[np.sort(rng.choice(len(x), max_train, replace=False))]
+    if len(x) < k:
+        raise ValueError(f"k-means needs at least {k} vectors, got {len(x)}")
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    centroids = x[rng.choice(len(x), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = assign(x, centroids, spherical)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        sums = np.add.reduceat(x[order], starts[filled], axis=0)
+        centroids[filled] = sums / counts[filled, None]
+        # Empty partitions restart from random points
+        centroids[~filled] = x[rng.choice(len(x), int((~filled).sum()), replace=False)]
+        if spherical:
+            centroids = normalize(centroids)
+    return centroids
+
+
+class IVFIndex(SearchBackend):
+    """Inverted-file index over unit vectors; partitions are stored contiguously, in list order"""
+
+    name = "ivf"
+
+    def __init__(self, centroids, offsets, ids, label_codes, info, vectors=None, codebooks=None, codes=None,
+                 projection=None, full=None):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.label_codes = label_codes
+        self.info = info
+        self.label_names = np.array(info["labels"])
+        self.vectors = vectors
+        self.codebooks = codebooks
+        self.codes = codes
+        self.projection = projection
+        self.full = full
+        self.nprobe = info["nprobe"]
+        self.candidates = RERANK_CANDIDATES
+        self.path = None
+
+    @classmethod
+    def train(cls, matrix, labels, nlist=256, nprobe=8, pq=None, dims=None, iterations=20, seed=0, info=None):
+        """Index for a (rows, dim) matrix and its row labels, partitioned in a dims-D projection if given"""
+        start = time.perf_counter()
+        x = normalize(matrix)
+        full_dim = x.shape[1]
+        projection = full = None
+        if dims:
+            projection = Projection.fit(x, dims)
+            full, x = x, projection.transform(x)
+        dim = x.shape[1]
+        if pq is not None and dim % pq:
+            divisors = [m for m in range(2, dim) if dim % m == 0]
+            raise ValueError(f"--pq must divide the dimension {dim}, e.g. one of {divisors}")
+
+        centroids = kmeans(x, nlist, iterations, spherical=True, max_train=64 * nlist, seed=seed)
+        lists = assign(x, centroids)
+        order = np.argsort(lists, kind="stable")
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(lists, minlength=nlist)))).astype(np.int64)
+        names, codes = np.unique(np.asarray(labels), return_inverse=True)
+
+        vectors = codebooks = pq_codes = None
+        if pq is None:
+            vectors = x[order]
+        else:
+            # Residuals to the partition centroid, quantized per subspace of dim / pq values
+            sub = dim // pq
+            sample = order[np.random.default_rng(seed).permutation(len(order))[:64 * PQ_CENTROIDS]]
+            residuals = (x[sample] - centroids[lists[sample]]).reshape(len(sample), pq, sub)
+            codebooks = np.stack([
+                kmeans(residuals[:, m], PQ_CENTROIDS, iterations, spherical=False, seed=seed + m)
+                for m in range(pq)
+            ])
+            pq_codes = np.empty((len(x), pq), dtype=np.uint8)
+            for block in range(0, len(order), 65536):
+                rows = order[block:block + 65536]
+                residuals = (x[rows] - centroids[lists[rows]]).reshape(len(rows), pq, sub)
+                for m in range(pq):
+                    pq_codes[block:block + len(rows), m] = assign(residuals[:, m], codebooks[m], spherical=False)
+        del x
+        if full is not None:
+            full = full[order]
+            info = dict(info or {}, projection=projection.info)
+
+        info = dict(info or {})
+        info.update(kind="ivf", labels=names.tolist(), nlist=nlist, nprobe=nprobe, pq=pq, dimension=full_dim,
+                    count=int(len(order)), feature_version=info.get("feature_version", FEATURE_VERSION),
+                    build_seconds=round(time.perf_counter() - start, 2))
+        return cls(centroids, offsets, order.astype(np.int64), codes[order].astype(np.uint16), info,
+                   vectors=vectors, codebooks=codebooks, codes=pq_codes, projection=projection, full=full)
+
+    @classmethod
+    def build(cls, vectors_path, path, **options):
+        """Train on a vectors/ tree or store and save to path"""
+        from vector_store import load_vectors
+
+        matrix, meta = load_vectors(vectors_path)
+        profiles = sorted(set(meta["profile"].tolist()))
+        if len(profiles) > 1:
+            raise ValueError(f"Mixed feature profiles in {vectors_path}: {profiles}, build one index per profile")
+        index = cls.train(matrix, meta["label"], info={"profile": profiles[0], "source": str(vectors_path)}, **options)
+        index.save(path)
+        return index
+
+    def save(self, path):
+        arrays = {
+            "info": np.array(json.dumps(self.info)),
+            "centroids": self.centroids,
+            "offsets": self.offsets,
+            "ids": self.ids,
+            "label_codes": self.label_codes,
+        }
+        if self.vectors is not None:
+            arrays["vectors"] = self.vectors
+        else:
+            arrays["codebooks"] = self.codebooks
+            arrays["codes"] = self.codes
+        if self.projection is not None:
+            arrays.update(self.projection.arrays(), full=self.full)
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.tmp")
+        write_npz(tmp, arrays)
+        os.replace(tmp, path)
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls(
+                data["centroids"], data["offsets"], data["ids"], data["label_codes"], json.loads(str(data["info"])),
+                vectors=data["vectors"] if "vectors" in data else None,
+                codebooks=data["codebooks"] if "codebooks" in data else None,
+                codes=data["codes"] if "codes" in data else None,
+                projection=Projection.from_arrays(data) if "projection_components" in data else None,
+                full=data["full"] if "full" in data else None,
+            )
+        index.path = Path(path)
+        return index
+
+    def search_rows(self, vector, top_k=5, nprobe=None, labels=None):
+        """(index rows, scores) of the top_k in the nprobe nearest partitions, of labels only if given
+
+        ids[rows] are the corpus rows.
+        """
+        query = full_query = normalize(vector)
+        if self.projection is not None:
+            query = self.projection.transform(full_query)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        coarse = self.centroids @ query
+        probe = np.argpartition(-coarse, nprobe - 1)[:nprobe] if nprobe < len(coarse) else np.arange(len(coarse))
+        spans = [(self.offsets[p], self.offsets[p + 1]) for p in probe]
+        rows = np.concatenate([np.arange(a, b) for a, b in spans]) if spans else np.zeros(0, dtype=np.int64)
+        row_lists = np.repeat(probe, [b - a for a, b in spans])
+        if labels is not None:
+            keep = label_mask(self.label_codes[rows], self.label_names, labels)
+            rows, row_lists = rows[keep], row_lists[keep]
+
+        if self.vectors is not None:
+            scores = self.vectors[rows] @ query
+        else:
+            pq, sub = self.codes.shape[1], len(query) // self.codes.shape[1]
+            tables = np.einsum("md,mkd->mk", query.reshape(pq, sub), self.codebooks)
+            scores = coarse[row_lists] + tables[np.arange(pq), self.codes[rows]].sum(axis=1)
+
+        if self.projection is not None:
+            positions, _ = top_k_rows(scores[None, :].astype(np.float32), max(top_k, self.candidates))
+            return rerank(self.full, rows[positions[0]], full_query, top_k)
+        positions, best = top_k_rows(scores[None, :].astype(np.float32), top_k)
+        return rows[positions[0]], best[0]
+
+    def search(self, vector, top_k=5, nprobe=None):
+        rows, scores = self.search_rows(vector, top_k, nprobe)
+        return [Match(str(self.label_names[self.label_codes[r]]), float(s)) for r, s in zip(rows, scores)]
+
+    def search_batch(self, vectors, top_k=5, nprobe=None):
+        return [self.search(v, top_k, nprobe) for v in vectors]
+
+    def search_labels(self, vector, labels, top_k=5, nprobe=None):
+        # Only the probed partitions are filtered, so labels far from the query can come back empty
+        rows, scores = self.search_rows(vector, top_k, nprobe, labels)
+        return [Match(str(self.label_names[self.label_codes[r]]), float(s)) for r, s in zip(rows, scores)]
+
+    def count(self):
+        return int(self.info["count"])
+
+    def describe(self):
+        summary = {"backend": self.name, "index": str(self.path), "vectors": self.count(),
+                   "profile": self.info["profile"], "nlist": self.info["nlist"], "nprobe": self.nprobe,
+                   "pq": self.info["pq"]}
+        if self.projection is not None:
+            summary.update(projection=self.projection.dims, candidates=self.candidates)
+        return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build approximate (IVF) search indexes")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="IVF index file from a vectors/ tree or store")
+    build_parser.add_argument("vectors")
+    build_parser.add_argument("index_file", help="Output, e.g. vectors.ivf.npz")
+    build_parser.add_argument("--nlist", type=int, default=256, help="k-means partitions (default: 256)")
+    build_parser.add_argument("--nprobe", type=int, default=8,
+                              help="Partitions scanned per query unless local_nprobe says otherwise (default: 8)")
+    build_parser.add_argument("--pq", type=int, default=None,
+                              help="Product-quantize residuals into this many one-byte codes "
+                                   "(must divide 260, or --dims; 52 or 130 keep top-1 close to exact)")
+    build_parser.add_argument("--dims", type=int, default=None,
+                              help="Partition a PCA projection to this many dims and rerank at full dimension")
+    args = parser.parse_args()
+
+    index = IVFIndex.build(args.vectors, args.index_file, nlist=args.nlist, nprobe=args.nprobe, pq=args.pq,
+                           dims=args.dims)
+    size = os.path.getsize(args.index_file) / 2**20
+    print(f"✓ {index.count()} vectors in {args.nlist} partitions{f', pq {args.pq}' if args.pq else ''}"
+          f"{f', projected to {args.dims}D' if args.dims else ''}, "
+          f"{size:.1f} MB, built in {index.info['build_seconds']}s -> {args.index_file}")
@@ -0,0 +1,248 @@
+"""Raw landmark archive, so a new feature recipe does not need MediaPipe again
+
+With --archive the vectorizers also keep what the detectors found, one
+compressed shard per video or image folder under <output_dir>/_landmarks/:
+
+    <name>.landmarks.npz
+        hands             float32 (rows, 2, 21, 3)   hand_count uint8
+        handedness        int8 (rows, 2)             0 Left, 1 Right, -1 no hand
+        handedness_score  float32 (rows, 2)
+        pose              float32 (rows, 33, 4)      x, y, z, visibility; pose_found bool
+        face              float32 (rows, 478, 3)     face_found bool
+        file, label, profile, frame, timestamp       as in vector_store
+        name, folder                                 where the vectorizer wrote the row's vectors
+
+There is a row for every frame or image read, including ones without a face
+or dropped by sampling, so a different recipe may still use them. featurize
+rebuilds the vectors from the archive alone:
+
+    python landmark_archive.py featurize vectors/_landmarks vectors_v2 --format store
+    python landmark_archive.py report vectors/_landmarks
+"""
+import os
+import time
+import numpy as np
+from pathlib import Path
+from frame_sampling import MotionSampler
+from sign_features import FeatureBuilder, PROFILES, MAX_HANDS, HAND_POINTS, mirror_features
+from vector_store import JsonSink, ShardSink, encode_columns, decode_columns, write_npz
+
+ARCHIVE_DIR = "_landmarks"
+ARCHIVE_SUFFIX = ".landmarks.npz"
+POSE_POINTS = 33
+FACE_POINTS = 478
+HANDEDNESS = {"Left": 0, "Right": 1}
+META_COLUMNS = ("file", "label", "profile", "name", "folder")
+
+
+def archive_file(name):
+    return f"{name}{ARCHIVE_SUFFIX}"
+
+
+def _points(landmarks, count, columns=3):
+    out = np.zeros((count, columns), dtype=np.float32)
+    for i, lm in enumerate(landmarks[:count]):
+        out[i, :3] = (lm.x, lm.y, lm.z)
+        if columns == 4:
+            out[i, 3] = getattr(lm, "visibility", None) or 0.0
+    return out
+
+
+class LandmarkRecorder:
+    """Collects the detections of one video or image folder and writes them as a shard on close()"""
+
+    def __init__(self, directory, name):
+        self.directory = Path(directory)
+        self.name = name
+        self.rows = []
+        self.hands = []
+        self.hand_count = []
+        self.handedness = []
+        self.handedness_score = []
+        self.pose = []
+        self.face = []
+
+    def add(self, row, hands_result, pose_result, face_result):
+        """row holds the metadata columns; results as returned by Landmarkers.detect"""
+        hands = np.zeros((MAX_HANDS, HAND_POINTS, 3), dtype=np.float32)
+        handedness = np.full(MAX_HANDS, -1, dtype=np.int8)
+        scores = np.zeros(MAX_HANDS, dtype=np.float32)
+        count = 0
+        if hands_result is not None:
+            count = min(len(hands_result.hand_landmarks), MAX_HANDS)
+            for h in range(count):
+                hands[h] = _points(hands_result.hand_landmarks[h], HAND_POINTS)
+                if h < len(hands_result.handedness) and hands_result.handedness[h]:
+                    category = hands_result.handedness[h][0]
+                    handedness[h] = HANDEDNESS.get(category.category_name, -1)
+                    scores[h] = category.score
+
+        pose = None
+        if pose_result is not None and pose_result.pose_landmarks:
+            pose = _points(pose_result.pose_landmarks[0], POSE_POINTS, columns=4)
+        face = None
+        if face_result is not None and face_result.face_landmarks:
+            face = _points(face_result.face_landmarks[0], FACE_POINTS)
+
+        self.rows.append(row)
+        self.hands.append(hands)
+        self.hand_count.append(count)
+        self.handedness.append(handedness)
+        self.handedness_score.append(scores)
+        self.pose.append(pose)
+        self.face.append(face)
+
+    def close(self):
+        def stack(items, shape):
+            return np.stack([np.zeros(shape, dtype=np.float32) if item is None else item for item in items]) \
+                if items else np.zeros((0, *shape), dtype=np.float32)
+
+        arrays = encode_columns(self.rows, META_COLUMNS)
+        arrays.update(
+            hands=stack(self.hands, (MAX_HANDS, HAND_POINTS, 3)),
+            hand_count=np.array(self.hand_count, dtype=np.uint8),
+            handedness=np.array(self.handedness, dtype=np.int8).reshape(-1, MAX_HANDS),
+            handedness_score=np.array(self.handedness_score, dtype=np.float32).reshape(-1, MAX_HANDS),
+            pose=stack(self.pose, (POSE_POINTS, 4)),
+            pose_found=np.array([p is not None for p in self.pose], dtype=bool),
+            face=stack(self.face, (FACE_POINTS, 3)),
+            face_found=np.array([f is not None for f in self.face], dtype=bool),
+        )
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / archive_file(self.name)
+        tmp = path.with_name(f".{path.name}.tmp")
+        write_npz(tmp, arrays, compress=True)
+        os.replace(tmp, path)
+
+
+class LandmarkArchive:
+    """Read access to an archive directory"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.shards = sorted(
+            p.name[:-len(ARCHIVE_SUFFIX)] for p in self.directory.glob(f"*{ARCHIVE_SUFFIX}")
+        )
+
+    def load(self, shard):
+        """Arrays of a shard plus its decoded metadata columns"""
+        with np.load(self.directory / archive_file(shard)) as data:
+            columns = decode_columns(data, META_COLUMNS)
+            for key in ("hands", "hand_count", "handedness", "handedness_score",
+                        "pose", "pose_found", "face", "face_found"):
+                columns[key] = data[key]
+        return columns
+
+
+def featurize(archive_dir, output_dir, profile="full", mirror="analytic", output_format="store",
+              sample_threshold=None, min_stride=1, max_stride=None):
+    """Vectors from an archive, laid out as the vectorizers would write them
+
+    Matches a vectorizer run with the same profile and sampling; mirror
+    vectors can only be analytic, the archive has no flipped detections.
+    """
+    if mirror not in ("analytic", "none"):
+        raise ValueError(f"Unknown mirror mode '{mirror}', the archive supports analytic or none")
+    if output_format not in ("json", "store"):
+        raise ValueError(f"Unknown output format '{output_format}'")
+
+    archive = LandmarkArchive(archive_dir)
+    output_dir = Path(output_dir)
+    builder = FeatureBuilder(profile)
+    needed = set(PROFILES[profile]["detectors"])
+    sampler = MotionSampler(sample_threshold, min_stride, max_stride) if sample_threshold is not None else None
+
+    start = time.perf_counter()
+    rows = saved = 0
+    for shard in archive.shards:
+        data = archive.load(shard)
+        for recorded in set(data["profile"].tolist()):
+            missing = needed - set(PROFILES[recorded]["detectors"])
+            if missing:
+                raise ValueError(f"{shard} was recorded with profile {recorded}, which did not run {sorted(missing)}")
+        if not len(data["name"]):
+            continue
+
+        video = data["frame"][0] >= 0
+        if output_format == "store":
+            sink = ShardSink(output_dir, shard)
+        else:
+            folder = output_dir / data["folder"][0]
+            folder.mkdir(parents=True, exist_ok=True)
+            sink = JsonSink(folder, indent=None if video else 2)
+        if sampler is not None:
+            sampler.reset()
+
+        for i in range(len(data["name"])):
+            rows += 1
+            features = builder.from_landmarks(
+                data["hands"][i],
+                int(data["hand_count"][i]),
+                data["pose"][i] if data["pose_found"][i] else None,
+                data["face"][i] if data["face_found"][i] else None,
+            )
+            if features is None:
+                continue
+            if sampler is not None and video and not sampler.keep(int(data["frame"][i]), features):
+                continue
+
+            record = {"file": str(data["file"][i])}
+            if video:
+                record.update(frame=int(data["frame"][i]), timestamp=float(data["timestamp"][i]))
+            record.update(label=str(data["label"][i]), vector=features, dimension=len(features),
+                          augmentation="original", profile=profile)
+            sink.add(str(data["name"][i]), record)
+            if mirror == "analytic":
+                features_mirror = mirror_features(features)
+                sink.add(f"{data['name'][i]}_mirror", dict(record, vector=features_mirror, augmentation="mirror"))
+            saved += 1
+        sink.close()
+
+    seconds = time.perf_counter() - start
+    print(f"✓ {saved}/{rows} archived frames featurized ({profile}) from {len(archive.shards)} shards "
+          f"in {seconds:.2f}s ({rows / max(seconds, 1e-9):.0f} frames/s), saved to {output_dir}")
+    if sampler is not None:
+        print(f"Sampling: {sampler.summary()}")
+
+
+def report(archive_dir):
+    """Rows, detections and size of an archive"""
+    archive = LandmarkArchive(archive_dir)
+    rows = hands = pose = face = 0
+    for shard in archive.shards:
+        data = archive.load(shard)
+        rows += len(data["name"])
+        hands += int((data["hand_count"] > 0).sum())
+        pose += int(data["pose_found"].sum())
+        face += int(data["face_found"].sum())
+    size = sum(os.path.getsize(archive.directory / archive_file(shard)) for shard in archive.shards)
+    print(f"{len(archive.shards)} shards, {rows} frames, {size / 2**20:.1f} MB "
+          f"({size / max(rows, 1) / 1024:.1f} KB/frame)")
+    print(f"Detected: hands {hands}, pose {pose}, face {face}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild sign vectors from archived landmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    featurize_parser = commands.add_parser("featurize", help="Write vectors from an archive, no models needed")
+    featurize_parser.add_argument("archive_dir")
+    featurize_parser.add_argument("output_dir")
+    featurize_parser.add_argument("--profile", choices=tuple(PROFILES), default="full")
+    featurize_parser.add_argument("--mirror", choices=("analytic", "none"), default="analytic")
+    featurize_parser.add_argument("--format", choices=("json", "store"), default="store")
+    featurize_parser.add_argument("--sample-threshold", type=float, default=None,
+                                  help="Motion sampling for video frames, as in video_vectorizer.py")
+    featurize_parser.add_argument("--min-stride", type=int, default=1)
+    featurize_parser.add_argument("--max-stride", type=int, default=None)
+    report_parser = commands.add_parser("report", help="Frames, detections and size of an archive")
+    report_parser.add_argument("archive_dir")
+    args = parser.parse_args()
+
+    if args.command == "featurize":
+        featurize(args.archive_dir, args.output_dir, args.profile, args.mirror, args.format,
+                  args.sample_threshold, args.min_stride, args.max_stride)
+    else:
+        report(args.archive_dir)
@@ -0,0 +1,457 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import mediapipe as mp
+
+RUNNING_MODES = ("image", "video", "live_stream")
+DETECTORS = ("hands", "pose", "face")
+
+# Preconditions a cascade stage can enforce before the remaining detectors run
+GATES = {
+    "hands": lambda result: bool(result.hand_landmarks),
+    "pose": lambda result: bool(result.pose_landmarks),
+    "face": lambda result: bool(result.face_landmarks),
+}
+
+
+def parse_gates(value):
+    """'hands,face' -> ('hands', 'face'); empty string disables the cascade"""
+    gates = tuple(g.strip() for g in value.split(",") if g.strip())
+    for gate in gates:
+        if gate not in GATES:
+            raise ValueError(f"Unknown cascade gate '{gate}', expected one of {tuple(GATES)}")
+    return gates
+
+
+def check_gates(results, gates):
+    """First gate whose precondition fails on full (hands, pose, face) results, or None"""
+    by_name = dict(zip(DETECTORS, results))
+    for gate in gates:
+        if not GATES[gate](by_name[gate]):
+            return gate
+    return None
+
+
+class CascadeStats:
+    """How many frames the cascade saw and how many each stage rejected"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.passed = 0
+        self.rejected = {}
+
+    def record(self, rejected_by):
+        with self._lock:
+            self.frames += 1
+            if rejected_by is None:
+                self.passed += 1
+            else:
+                self.rejected[rejected_by] = self.rejected.get(rejected_by, 0) + 1
+
+    def as_dict(self):
+        with self._lock:
+            return {"frames": self.frames, "passed": self.passed, "rejected": dict(self.rejected)}
+
+    @staticmethod
+    def merge(stats_list):
+        """Combined as_dict() of several CascadeStats, e.g. one per pooled worker"""
+        merged = {"frames": 0, "passed": 0, "rejected": {}}
+        for stats in stats_list:
+            stats = stats.as_dict()
+            merged["frames"] += stats["frames"]
+            merged["passed"] += stats["passed"]
+            for name, count in stats["rejected"].items():
+                merged["rejected"][name] = merged["rejected"].get(name, 0) + count
+        return merged
+
+    def summary(self):
+        stats = self.as_dict()
+        rejected = ", ".join(f"{name} {count}" for name, count in stats["rejected"].items()) or "none"
+        return f"{stats['frames']} frames, {stats['passed']} passed, rejected: {rejected}"
+
+
+class DetectorTimings:
+    """Per-detector latency in milliseconds: last frame and running average"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def record(self, name, ms):
+        with self._lock:
+            self.last[name] = ms
+            self._total[name] = self._total.get(name, 0.0) + ms
+            self._count[name] = self._count.get(name, 0) + 1
+
+    def averages(self):
+        with self._lock:
+            return {name: self._total[name] / self._count[name] for name in self._total}
+
+    def clear_last(self):
+        """Forget the previous frame's times, so last only names detectors that ran on this one"""
+        with self._lock:
+            self.last = {}
+
+    def reset(self):
+        with self._lock:
+            self.last = {}
+            self._total = {}
+            self._count = {}
+
+    @staticmethod
+    def merge(timings_list):
+        """Averages across several DetectorTimings, weighted by how often each recorded"""
+        total, count = {}, {}
+        for timings in timings_list:
+            with timings._lock:
+                for name in timings._total:
+                    total[name] = total.get(name, 0.0) + timings._total[name]
+                    count[name] = count.get(name, 0) + timings._count[name]
+        return {name: total[name] / count[name] for name in total}
+
+    def summary(self):
+        """One-line report, e.g. 'hands 12.1ms | pose 8.3ms | face 9.0ms | frame 12.6ms'"""
+        averages = self.averages()
+        return " | ".join(f"{name} {averages[name]:.1f}ms" for name in (*DETECTORS, "frame") if name in averages)
+
+
+class Landmarkers:
+    """Hand, pose and face landmarkers built with one shared running mode
+
+    - image: every frame is detected from scratch (independent images)
+    - video: frames from one clip with increasing timestamps, so MediaPipe
+      tracks the previous ROI and skips the palm/face detector on most frames
+    - live_stream: like video, but results arrive through callbacks; use
+      detect_async() and read the newest complete result with latest()
+
+    With parallel=True the three detectors run on a small thread pool for each
+    frame (MediaPipe releases the GIL during inference), so a frame costs
+    roughly the slowest model instead of the sum of all three. Cascade gates
+    still run first, concurrently with each other, and the other detectors
+    only start once every gate passed.
+
+    With hand_roi=True, frames whose long side is at least hand_roi_min_side
+    run pose first and only landmark hands inside crops around the wrists
+    (see hand_roi.HandRoiDetector).
+
+    detectors limits which models are loaded at all, e.g. ("hands", "pose") for
+    the pose_face feature profile; results of detectors left out are None.
+    """
+
+    def __init__(self, model_dir="models", running_mode="image", parallel=False,
+                 hand_roi=False, hand_roi_min_side=960, detectors=DETECTORS):
+        if running_mode not in RUNNING_MODES:
+            raise ValueError(f"Unknown running mode '{running_mode}', expected one of {RUNNING_MODES}")
+        for name in detectors:
+            if name not in DETECTORS:
+                raise ValueError(f"Unknown detector '{name}', expected one of {DETECTORS}")
+        if hand_roi and "pose" not in detectors:
+            raise ValueError("hand_roi needs the pose detector")
+        if hand_roi and running_mode == "live_stream":
+            raise ValueError("hand_roi needs the pose result before hand detection, use image or video mode")
+
+        self.model_dir = model_dir
+        self.running_mode = running_mode
+        self.detectors = tuple(name for name in DETECTORS if name in detectors)
+        self.parallel = parallel
+        self.timings = DetectorTimings()
+        self.cascade = CascadeStats()
+        self._executor = None
+        if parallel and running_mode != "live_stream":
+            self._executor = ThreadPoolExecutor(max_workers=len(DETECTORS), thread_name_prefix="landmarker")
+        self._lock = threading.Lock()
+        self._build()
+
+        self.hand_roi = None
+        if hand_roi:
+            from hand_roi import HandRoiDetector
+            self.hand_roi = HandRoiDetector(model_dir, min_side=hand_roi_min_side)
+
+    def _build(self):
+        BaseOptions = mp.tasks.BaseOptions
+        HandLandmarker = mp.tasks.vision.HandLandmarker
+        HandLandmarkerOptions = mp.tasks.vision.HandLandmarkerOptions
+        PoseLandmarker = mp.tasks.vision.PoseLandmarker
+        PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
+        FaceLandmarker = mp.tasks.vision.FaceLandmarker
+        FaceLandmarkerOptions = mp.tasks.vision.FaceLandmarkerOptions
+        VisionRunningMode = mp.tasks.vision.RunningMode
+
+        mode = {
+            "image": VisionRunningMode.IMAGE,
+            "video": VisionRunningMode.VIDEO,
+            "live_stream": VisionRunningMode.LIVE_STREAM,
+        }[self.running_mode]
+
+        self._last_timestamp = -1
+        self._pending = {}
+        self._latest = None
+
+        def callback(name):
+            if self.running_mode != "live_stream":
+                return {}
+            return {"result_callback": lambda result, image, ts: self._on_result(name, result, ts)}
+
+        self.hands = self.pose = self.face = None
+
+        if "hands" in self.detectors:
+            self.hands = HandLandmarker.create_from_options(
+                HandLandmarkerOptions(
+                    base_options=BaseOptions(model_asset_path=f"{self.model_dir}/hand_landmarker.task"),
+                    running_mode=mode,
+                    num_hands=2,
+                    min_hand_detection_confidence=0.5,
+                    **callback("hands")
+                )
+            )
+        if "pose" in self.detectors:
+            self.pose = PoseLandmarker.create_from_options(
+                PoseLandmarkerOptions(
+                    base_options=BaseOptions(model_asset_path=f"{self.model_dir}/pose_landmarker_lite.task"),
+                    running_mode=mode,
+                    min_pose_detection_confidence=0.5,
+                    **callback("pose")
+                )
+            )
+        if "face" in self.detectors:
+            self.face = FaceLandmarker.create_from_options(
+                FaceLandmarkerOptions(
+                    base_options=BaseOptions(model_asset_path=f"{self.model_dir}/face_landmarker.task"),
+                    running_mode=mode,
+                    num_faces=1,
+                    min_face_detection_confidence=0.5,
+                    **callback("face")
+                )
+            )
+
+    def _next_timestamp(self, timestamp_ms):
+        """MediaPipe rejects non-increasing timestamps, so clamp to last + 1"""
+        if timestamp_ms is None:
+            timestamp_ms = self._last_timestamp + 1
+        timestamp_ms = max(int(timestamp_ms), self._last_timestamp + 1)
+        self._last_timestamp = timestamp_ms
+        return timestamp_ms
+
+    def _timed(self, name, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.timings.record(name, (time.perf_counter() - start) * 1000)
+        return result
+
+    def _calls(self, mp_image, timestamp_ms):
+        """(name, bound detect method, args) for each loaded detector in DETECTORS order"""
+        if self.running_mode == "image":
+            return [
+                (name, getattr(self, name).detect, (mp_image,))
+                for name in self.detectors
+            ]
+        if self.running_mode == "video":
+            ts = self._next_timestamp(timestamp_ms)
+            return [
+                (name, getattr(self, name).detect_for_video, (mp_image, ts))
+                for name in self.detectors
+            ]
+        raise RuntimeError("live_stream landmarkers are asynchronous, use detect_async()")
+
+    def _detect(self, mp_image, timestamp_ms, gates):
+        self.timings.clear_last()
+        calls = {name: (fn, args) for name, fn, args in self._calls(mp_image, timestamp_ms)}
+        use_roi = self.hand_roi is not None and self.hand_roi.applies(mp_image)
+        results = dict.fromkeys(DETECTORS)
+
+        def run(name):
+            fn, args = calls[name]
+            if name == "hands" and use_roi:
+                # Hand crops come from the pose, so pose always runs first
+                if results["pose"] is None:
+                    run("pose")
+                results["hands"] = self._timed(
+                    "hands", self.hand_roi.detect, mp_image, results["pose"], lambda: fn(*args)
+                )
+            else:
+                results[name] = self._timed(name, fn, *args)
+
+        def run_chain(chain):
+            for name in chain:
+                if results[name] is None:
+                    run(name)
+
+        def run_all(names):
+            """Run detectors, on the thread pool if there is one; hand crops still wait for the pose"""
+            if use_roi and "hands" in names and "pose" in names:
+                chains = [["pose", "hands"]] + [[name] for name in names if name not in ("pose", "hands")]
+            else:
+                chains = [[name] for name in names]
+            if self._executor is not None and len(chains) > 1:
+                for future in [self._executor.submit(run_chain, chain) for chain in chains]:
+                    future.result()
+            else:
+                for chain in chains:
+                    run_chain(chain)
+
+        start = time.perf_counter()
+        if self._executor is not None:
+            # The gates run at once, the other detectors only once every gate passed
+            run_all(list(gates))
+            rejected_by = next((gate for gate in gates if not GATES[gate](results[gate])), None)
+        else:
+            rejected_by = None
+            for gate in gates:
+                if results[gate] is None:
+                    run(gate)
+                if not GATES[gate](results[gate]):
+                    rejected_by = gate
+                    break
+        if rejected_by is not None:
+            self.timings.record("frame", (time.perf_counter() - start) * 1000)
+            return tuple(results[name] for name in DETECTORS), rejected_by
+
+        run_all([name for name in self.detectors if results[name] is None])
+        self.timings.record("frame", (time.perf_counter() - start) * 1000)
+        return tuple(results[name] for name in DETECTORS), None
+
+    def detect(self, mp_image, timestamp_ms=None):
+        """Run all three landmarkers, returns (hands_result, pose_result, face_result)"""
+        results, _ = self._detect(mp_image, timestamp_ms, ())
+        return results
+
+    def detect_cascade(self, mp_image, timestamp_ms=None, gates=("hands", "face")):
+        """Run gating detectors first and stop as soon as one finds nothing
+
+        Returns ((hands_result, pose_result, face_result), rejected_by). When a
+        gate rejects the frame, rejected_by is its name and detectors that never
+        ran are None (with parallel=True every gate ran); otherwise rejected_by
+        is None and all results are set.
+        """
+        missing = [gate for gate in gates if gate not in self.detectors]
+        if missing:
+            raise ValueError(f"Cascade gates {missing} are not among the loaded detectors {self.detectors}")
+
+        results, rejected_by = self._detect(mp_image, timestamp_ms, gates)
+        self.cascade.record(rejected_by)
+        return results, rejected_by
+
+    def detect_async(self, mp_image, timestamp_ms=None):
+        """Queue a live_stream frame; results are collected by the callbacks"""
+        ts = self._next_timestamp(timestamp_ms)
+        for name in self.detectors:
+            getattr(self, name).detect_async(mp_image, ts)
+        return ts
+
+    def _on_result(self, name, result, timestamp_ms):
+        with self._lock:
+            results = self._pending.setdefault(timestamp_ms, {})
+            results[name] = result
+            if len(results) < len(self.detectors):
+                return
+
+            del self._pending[timestamp_ms]
+            # Frames dropped by MediaPipe never complete, forget anything older
+            for stale in [ts for ts in self._pending if ts < timestamp_ms]:
+                del self._pending[stale]
+
+            if self._latest is None or timestamp_ms > self._latest[0]:
+                self._latest = (timestamp_ms, results.get("hands"), results.get("pose"), results.get("face"))
+
+    def latest(self, with_timestamp=False):
+        """Newest complete (hands_result, pose_result, face_result) from live_stream, or None
+
+        with_timestamp prepends the frame's timestamp, which tells a new result from one already seen.
+        """
+        with self._lock:
+            if self._latest is None:
+                return None
+            return self._latest if with_timestamp else self._latest[1:]
+
+    def reset(self):
+        """Start a new timestamp sequence, e.g. before the next video file"""
+        if self.running_mode == "image":
+            return
+        self._close_models()
+        self._build()
+
+    def _close_models(self):
+        for name in self.detectors:
+            getattr(self, name).close()
+
+    def close(self):
+        self._close_models()
+        if self.hand_roi is not None:
+            self.hand_roi.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class LandmarkerPool:
+    """Fixed set of landmarker workers that callers check out one at a time
+
+    MediaPipe task objects must not be used from two threads at once, so each
+    concurrent request needs its own set. The pool hands them out, blocks when
+    all are busy and tracks wait time and utilization.
+    """
+
+    def __init__(self, factory, size):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.size = size
+        self.workers = [factory() for _ in range(size)]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._busy_total = 0.0
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Borrow a worker; raises queue.Empty if none frees up within timeout"""
+        start = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+        try:
+            worker = self._idle.get(timeout=timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        acquired = time.perf_counter()
+        with self._lock:
+            wait = acquired - start
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+        try:
+            yield worker
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._busy_total += time.perf_counter() - acquired
+            self._idle.put(worker)
+
+    def metrics(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "wait_avg_ms": self._wait_total / self._checkouts * 1000 if self._checkouts else 0.0,
+                "wait_max_ms": self._wait_max * 1000,
+                "utilization": self._busy_total / (self.size * elapsed),
+            }
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
@@ -1,49 +1,47 @@
 import cv2
 import numpy as np
 import os
+import time
 import mediapipe as mp
 from pathlib import Path
 from collections import deque
 from qdrant_client import QdrantClient
 from dotenv import load_dotenv
+from sign_features import FeatureBuilder, PROFILES, collection_for
+from landmarkers import Landmarkers, RUNNING_MODES, check_gates, parse_gates
+from index_profiles import search_params
+from search_backend import backend_from_env
 
 load_dotenv()
 
 class LiveSignRecognizer:
-    def __init__(self, collection_name="sign_vectors", video_mode=False):
-        # Load MediaPipe
-        BaseOptions = mp.tasks.BaseOptions
-        HandLandmarker = mp.tasks.vision.HandLandmarker
-        HandLandmarkerOptions = mp.tasks.vision.HandLandmarkerOptions
-        PoseLandmarker = mp.tasks.vision.PoseLandmarker
-        PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
-        FaceLandmarker = mp.tasks.vision.FaceLandmarker
-        FaceLandmarkerOptions = mp.tasks.vision.FaceLandmarkerOptions
-        VisionRunningMode = mp.tasks.vision.RunningMode
-        
-        self.hands = HandLandmarker.create_from_options(
-            HandLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path="models/hand_landmarker.task"),
-                running_mode=VisionRunningMode.IMAGE,
-                num_hands=2,
-                min_hand_detection_confidence=0.5
-            )
-        )
-        self.pose = PoseLandmarker.create_from_options(
-            PoseLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path="models/pose_landmarker_lite.task"),
-                running_mode=VisionRunningMode.IMAGE,
-                min_pose_detection_confidence=0.5
-            )
-        )
-        self.face = FaceLandmarker.create_from_options(
-            FaceLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path="models/face_landmarker.task"),
-                running_mode=VisionRunningMode.IMAGE,
-                num_faces=1,
-                min_face_detection_confidence=0.5
-            )
+    def __init__(self, collection_name=None, video_mode=False, running_mode=None, parallel=False,
+                 cascade_gates=None, hand_roi=False, profile="full", search_backend=None, local_index=None,
+                 nprobe=None, prototypes=None, prototype_only=False):
+        # Load MediaPipe: track across frames instead of re-detecting every frame
+        # (hand ROI cropping needs the pose first, which live_stream cannot do)
+        if running_mode is None:
+            running_mode = "video" if video_mode or hand_roi else "live_stream"
+        self.landmarkers = Landmarkers(
+            "models",
+            running_mode=running_mode,
+            parallel=parallel,
+            hand_roi=hand_roi,
+            detectors=PROFILES[profile]["detectors"]
         )
+        self.features = FeatureBuilder(profile)
+        
+        # Frames failing a gate (no hands, no face) skip feature math and the search
+        if cascade_gates is None:
+            cascade_gates = PROFILES[profile]["gates"]
+        self.cascade_gates = tuple(cascade_gates)
+        self.rejected_by = None
+        
+        # live_stream hands back the same completed result until a newer frame finishes;
+        # a repeat reuses the last prediction instead of being gated, counted and searched again
+        self.result_timestamp = None
+        self.repeated = False
+        self.last_prediction = (None, 0.0)
         
         # Connect to Qdrant
         print("Connecting to Qdrant...")
@@ -57,114 +55,83 @@ class LiveSignRecognizer:
             url=qdrant_url,
             api_key=qdrant_api_key if qdrant_api_key else None
         )
-        self.collection_name = collection_name
+        self.collection_name = collection_name or collection_for(profile)
         print(f"✓ Connected to Qdrant: {qdrant_url}")
         
+        # Qdrant unless search_backend=local (env or argument), then an in-process index (see search_backend.py)
+        env = dict(os.environ)
+        if search_backend:
+            env["search_backend"] = search_backend
+        if local_index:
+            env["local_index"] = local_index
+        if nprobe:
+            env["local_nprobe"] = str(nprobe)
+        # A prototype pass first narrows every frame's search to a few labels (see prototypes.py)
+        if prototypes:
+            env["prototypes"] = prototypes
+        if prototype_only:
+            env["prototype_rerank"] = "0"
+        self.search = backend_from_env(
+            env, profile, self.qdrant, self.collection_name, search_params(os.getenv('index_profile') or None)
+        )
+        print(f"✓ Search backend: {self.search.name}")
+        
         # Smoothing
         self.prediction_history = deque(maxlen=5)
         self.video_mode = video_mode
     
-    def extract_features(self, frame):
-        """Extract normalized features from frame"""
+    def extract_features(self, frame, timestamp_ms=None):
+        """Extract normalized features from frame
+        
+        Returns None when no features are available; self.rejected_by then
+        names the cascade gate that rejected the frame, if any. In live_stream
+        mode self.repeated is set when no newer result has arrived since the
+        last call.
+        """
         img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
+        previous_rejection, self.rejected_by = self.rejected_by, None
+        self.repeated = False
         
-        hands_result = self.hands.detect(mp_image)
-        pose_result = self.pose.detect(mp_image)
-        face_result = self.face.detect(mp_image)
-        
-        # Extract face center
-        face_center = None
-        if face_result.face_landmarks:
-            nose = face_result.face_landmarks[0][1]
-            face_center = np.array([nose.x, nose.y, nose.z])
+        if self.landmarkers.running_mode == "live_stream":
+            # Results arrive asynchronously, use the newest completed frame;
+            # the gates can only be checked after the fact here
+            self.landmarkers.detect_async(mp_image, timestamp_ms)
+            latest = self.landmarkers.latest(with_timestamp=True)
+            if latest is None:
+                return None
+            if latest[0] == self.result_timestamp:
+                self.repeated, self.rejected_by = True, previous_rejection
+                return None
+            self.result_timestamp, results = latest[0], latest[1:]
+            if self.cascade_gates:
+                self.rejected_by = check_gates(results, self.cascade_gates)
+                self.landmarkers.cascade.record(self.rejected_by)
+        elif self.cascade_gates:
+            results, self.rejected_by = self.landmarkers.detect_cascade(
+                mp_image, timestamp_ms, gates=self.cascade_gates
+            )
+        else:
+            results = self.landmarkers.detect(mp_image, timestamp_ms)
         
-        if face_center is None:
+        if self.rejected_by is not None:
             return None
         
-        features = []
-        
-        # Hands
-        if hands_result.hand_landmarks:
-            for hand_landmarks in hands_result.hand_landmarks:
-                wrist = np.array([hand_landmarks[0].x, hand_landmarks[0].y, hand_landmarks[0].z])
-                
-                for i in range(21):
-                    lm = hand_landmarks[i]
-                    point = np.array([lm.x, lm.y, lm.z])
-                    wrist_dist = np.linalg.norm(point - wrist)
-                    face_dist = np.linalg.norm(point - face_center)
-                    rel_x = point[0] - wrist[0]
-                    rel_y = point[1] - wrist[1]
-                    rel_z = point[2] - wrist[2]
-                    features.extend([rel_x, rel_y, rel_z, wrist_dist, face_dist])
-        else:
-            features.extend([0.0] * (21 * 5 * 2))
-        
-        if hands_result.hand_landmarks and len(hands_result.hand_landmarks) == 1:
-            features.extend([0.0] * (21 * 5))
-        
-        # Pose
-        if pose_result.pose_landmarks:
-            pose_indices = [11, 12, 13, 14, 15, 16]
-            left_shoulder = np.array([
-                pose_result.pose_landmarks[0][11].x,
-                pose_result.pose_landmarks[0][11].y,
-                pose_result.pose_landmarks[0][11].z
-            ])
-            right_shoulder = np.array([
-                pose_result.pose_landmarks[0][12].x,
-                pose_result.pose_landmarks[0][12].y,
-                pose_result.pose_landmarks[0][12].z
-            ])
-            
-            for idx in pose_indices:
-                lm = pose_result.pose_landmarks[0][idx]
-                point = np.array([lm.x, lm.y, lm.z])
-                face_dist = np.linalg.norm(point - face_center)
-                left_dist = np.linalg.norm(point - left_shoulder)
-                right_dist = np.linalg.norm(point - right_shoulder)
-                shoulder_dist = min(left_dist, right_dist)
-                rel_x = point[0] - face_center[0]
-                rel_y = point[1] - face_center[1]
-                rel_z = point[2] - face_center[2]
-                features.extend([rel_x, rel_y, rel_z, face_dist, shoulder_dist])
-        else:
-            features.extend([0.0] * (6 * 5))
-        
-        # Face
-        if face_result.face_landmarks:
-            face_indices = [33, 263, 1, 61, 291]
-            for idx in face_indices:
-                lm = face_result.face_landmarks[0][idx]
-                point = np.array([lm.x, lm.y, lm.z])
-                rel_x = point[0] - face_center[0]
-                rel_y = point[1] - face_center[1]
-                rel_z = point[2] - face_center[2]
-                dist = np.linalg.norm(point - face_center)
-                features.extend([rel_x, rel_y, rel_z, dist])
-        else:
-            features.extend([0.0] * (5 * 4))
-        
-        return np.array(features)
+        hands_result, pose_result, face_result = results
+        return self.features.from_results(hands_result, pose_result, face_result)
     
     def find_match(self, features):
-        """Find closest match using Qdrant"""
+        """Find closest match using the search backend"""
         if features is None:
             return None, 0.0
         
         try:
-            results = self.qdrant.query_points(
-                collection_name=self.collection_name,
-                query=features.tolist(),
-                limit=1
-            )
-            
-            if results.points:
-                return results.points[0].payload["label"], results.points[0].score
+            matches = self.search.search(features, 1)
+            if matches:
+                return matches[0].label, matches[0].score
             return None, 0.0
         except Exception as e:
-            print(f"Qdrant search error: {e}")
+            print(f"Search error ({self.search.name}): {e}")
             return None, 0.0
     
     def run(self, video_path=None):
@@ -178,6 +145,10 @@ class LiveSignRecognizer:
             cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
             print("Starting live recognition from webcam...")
         
+        fps = cap.get(cv2.CAP_PROP_FPS) if video_path else 0
+        frame_idx = 0
+        
+        print(f"Running mode: {self.landmarkers.running_mode}")
         print("Press 'q' to quit")
         
         while True:
@@ -185,25 +156,37 @@ class LiveSignRecognizer:
             if not ret:
                 break
             
-            # Extract features
-            features = self.extract_features(frame)
+            # Video files use their own clock, the webcam uses wall time
+            if fps > 0:
+                timestamp_ms = frame_idx * 1000.0 / fps
+            else:
+                timestamp_ms = time.monotonic() * 1000
+            frame_idx += 1
             
-            # Find match
-            label, confidence = self.find_match(features)
+            # Extract features
+            features = self.extract_features(frame, timestamp_ms)
             
-            # Smooth predictions
-            if label:
-                self.prediction_history.append((label, confidence))
+            if self.repeated:
+                # No new detection result since the last frame
+                label, confidence = self.last_prediction
+            else:
+                # Find match
+                label, confidence = self.find_match(features)
                 
-                # Get most common prediction
-                if len(self.prediction_history) >= 3:
-                    labels_only = [l for l, c in self.prediction_history if c > 0.7]
-                    if labels_only:
-                        from collections import Counter
-                        most_common = Counter(labels_only).most_common(1)[0][0]
-                        avg_conf = np.mean([c for l, c in self.prediction_history if l == most_common])
-                        label = most_common
-                        confidence = avg_conf
+                # Smooth predictions
+                if label:
+                    self.prediction_history.append((label, confidence))
+                    
+                    # Get most common prediction
+                    if len(self.prediction_history) >= 3:
+                        labels_only = [l for l, c in self.prediction_history if c > 0.7]
+                        if labels_only:
+                            from collections import Counter
+                            most_common = Counter(labels_only).most_common(1)[0][0]
+                            avg_conf = np.mean([c for l, c in self.prediction_history if l == most_common])
+                            label = most_common
+                            confidence = avg_conf
+                self.last_prediction = (label, confidence)
             
             # Display
             display_frame = frame.copy()
@@ -218,6 +201,9 @@ class LiveSignRecognizer:
                 bar_width = int(confidence * 400)
                 cv2.rectangle(display_frame, (20, 100), (20 + bar_width, 130), (0, 255, 0), -1)
                 cv2.rectangle(display_frame, (20, 100), (420, 130), (255, 255, 255), 2)
+            elif self.rejected_by is not None:
+                cv2.putText(display_frame, f"No sign (no {self.rejected_by})", (20, 60), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 3)
             else:
                 cv2.putText(display_frame, "No match", (20, 60), 
                            cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 255), 3)
@@ -233,15 +219,54 @@ class LiveSignRecognizer:
         
         cap.release()
         cv2.destroyAllWindows()
+        if self.landmarkers.timings.averages():
+            print(f"Detector timings: {self.landmarkers.timings.summary()}")
+        if self.cascade_gates:
+            print(f"Cascade ({', '.join(self.cascade_gates)}): {self.landmarkers.cascade.summary()}")
+        self.landmarkers.close()
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Live sign language recognition")
+    parser.add_argument("video_path", nargs="?", help="Video file (default: webcam)")
+    parser.add_argument("--mode", choices=RUNNING_MODES, default=None,
+                        help="MediaPipe running mode (default: video for files, live_stream for webcam)")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run hand/pose/face detection concurrently (image/video modes); "
+                             "the cascade gates run together before the other detectors")
+    parser.add_argument("--cascade", default=None,
+                        help="Gating detectors run first, in order (default: the profile's gates); "
+                             "'' runs all detectors on every frame")
+    parser.add_argument("--hand-roi", action="store_true",
+                        help="Detect hands only in pose-guided crops (frames of 960px and up)")
+    parser.add_argument("--profile", choices=tuple(PROFILES), default="full",
+                        help="Feature profile; pose_face skips the face mesh (needs a pose_face collection)")
+    parser.add_argument("--search", choices=("qdrant", "local"), default=None,
+                        help="Search backend (default: search_backend env, else qdrant)")
+    parser.add_argument("--index", default=None,
+                        help="Local index directory or IVF index file for --search local "
+                             "(default: local_index env, else vectors_index)")
+    parser.add_argument("--nprobe", type=int, default=None,
+                        help="Partitions scanned per query with an IVF index (default: local_nprobe env, else the index's)")
+    parser.add_argument("--prototypes", default=None,
+                        help="prototypes.py file: search only the labels whose prototypes match best "
+                             "(default: prototypes env)")
+    parser.add_argument("--prototype-only", action="store_true",
+                        help="With --prototypes, answer from the prototypes without searching the vectors")
+    args = parser.parse_args()
     
-    video_path = None
-    if len(sys.argv) > 1:
-        video_path = sys.argv[1]
-        recognizer = LiveSignRecognizer(video_mode=True)
-        recognizer.run(video_path)
-    else:
-        recognizer = LiveSignRecognizer()
-        recognizer.run()
+    recognizer = LiveSignRecognizer(
+        video_mode=args.video_path is not None,
+        running_mode=args.mode,
+        parallel=args.parallel,
+        cascade_gates=parse_gates(args.cascade) if args.cascade is not None else None,
+        hand_roi=args.hand_roi,
+        profile=args.profile,
+        search_backend=args.search,
+        local_index=args.index,
+        nprobe=args.nprobe,
+        prototypes=args.prototypes,
+        prototype_only=args.prototype_only
+    )
+    recognizer.run(args.video_path)
@@ -1,48 +1,44 @@
 import os
-import json
 import cv2
-import numpy as np
 import mediapipe as mp
 from pathlib import Path
+from sign_features import FeatureBuilder, PROFILES, FEATURE_VERSION, mirror_features
+from landmarkers import Landmarkers
+from vector_manifest import VectorManifest
+from vector_store import JsonSink, ShardSink, shard_files, shard_name
+from landmark_archive import LandmarkRecorder, ARCHIVE_DIR, archive_file
+
+MANIFEST_NAME = "manifest_images.jsonl"
 
 class MediaPipeVectorizer:
-    def __init__(self, model_dir="models"):
-        # Use custom task files for better accuracy
-        BaseOptions = mp.tasks.BaseOptions
-        HandLandmarker = mp.tasks.vision.HandLandmarker
-        HandLandmarkerOptions = mp.tasks.vision.HandLandmarkerOptions
-        PoseLandmarker = mp.tasks.vision.PoseLandmarker
-        PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
-        FaceLandmarker = mp.tasks.vision.FaceLandmarker
-        FaceLandmarkerOptions = mp.tasks.vision.FaceLandmarkerOptions
-        VisionRunningMode = mp.tasks.vision.RunningMode
-        
-        self.hands = HandLandmarker.create_from_options(
-            HandLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path=f"{model_dir}/hand_landmarker.task"),
-                running_mode=VisionRunningMode.IMAGE,
-                num_hands=2,
-                min_hand_detection_confidence=0.5
-            )
-        )
-        self.pose = PoseLandmarker.create_from_options(
-            PoseLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path=f"{model_dir}/pose_landmarker_lite.task"),
-                running_mode=VisionRunningMode.IMAGE,
-                min_pose_detection_confidence=0.5
-            )
-        )
-        self.face = FaceLandmarker.create_from_options(
-            FaceLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path=f"{model_dir}/face_landmarker.task"),
-                running_mode=VisionRunningMode.IMAGE,
-                num_faces=1,
-                min_face_detection_confidence=0.5
-            )
+    def __init__(self, model_dir="models", parallel=False, mirror="analytic", profile="full", output_format="json",
+                 archive_dir=None):
+        # Use custom task files for better accuracy; images are independent, so IMAGE mode
+        self.landmarkers = Landmarkers(
+            model_dir,
+            running_mode="image",
+            parallel=parallel,
+            detectors=PROFILES[profile]["detectors"]
         )
+        self.features = FeatureBuilder(profile)
+        self.profile = profile
+        
+        # analytic: derive the mirror vector from the first pass (see mirror_features)
+        # detect: run detection again on the flipped image; none: no mirror vectors
+        if mirror not in ("analytic", "detect", "none"):
+            raise ValueError(f"Unknown mirror mode '{mirror}'")
+        self.mirror = mirror
+        
+        # json: one file per image and mirror; store: one shard per label folder (see vector_store)
+        if output_format not in ("json", "store"):
+            raise ValueError(f"Unknown output format '{output_format}'")
+        self.output_format = output_format
+        
+        # Also keep the raw landmarks of every image, one shard per folder (see landmark_archive)
+        self.archive_dir = archive_dir
     
-    def extract_normalized_features(self, image_path, mirror=False):
-        """Extract and normalize all landmarks with ratios"""
+    def detect(self, image_path, mirror=False):
+        """(hands_result, pose_result, face_result) of an image, None if it cannot be read"""
         img = cv2.imread(str(image_path))
         if img is None:
             return None
@@ -53,183 +49,142 @@ class MediaPipeVectorizer:
         if mirror:
             img_rgb = cv2.flip(img_rgb, 1)
         
-        h, w = img_rgb.shape[:2]
-        
         # Convert to MediaPipe Image format
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
         
         # Get all landmarks
-        hands_result = self.hands.detect(mp_image)
-        pose_result = self.pose.detect(mp_image)
-        face_result = self.face.detect(mp_image)
+        return self.landmarkers.detect(mp_image)
+    
+    def extract_normalized_features(self, image_path, mirror=False):
+        """Extract and normalize all landmarks with ratios"""
+        results = self.detect(image_path, mirror)
+        if results is None:
+            return None
+        return self.features.from_results(*results)
+    
+    def process_image(self, img_path, data_path, output_path, sink=None, recorder=None):
+        """Vectorize one image into output_path, mirroring its place under data_path
         
-        # Extract face center (nose tip) as reference
-        face_center = None
-        if face_result.face_landmarks:
-            nose = face_result.face_landmarks[0][1]  # nose tip
-            face_center = np.array([nose.x, nose.y, nose.z])
+        With a sink (see process_image_group) the vectors go there instead of
+        into JSON files; with a recorder the raw landmarks are archived too.
         
-        if face_center is None:
-            return None
+        Returns (1, 1) when vectors were saved and (1, 0) when the image was skipped.
+        """
+        # Extract features (original)
+        results = self.detect(img_path, mirror=False)
+        if recorder is not None and results is not None:
+            recorder.add({
+                "file": str(img_path),
+                "label": img_path.parent.name if img_path.parent != data_path else img_path.stem,
+                "profile": self.profile,
+                "name": img_path.stem,
+                "folder": str(img_path.relative_to(data_path).parent)
+            }, *results)
+        features = self.features.from_results(*results) if results is not None else None
         
-        features = []
+        if features is None:
+            print(f"Failed: {img_path.name} (no {PROFILES[self.profile]['reference']} detected)")
+            return 1, 0
         
-        # Process hands
-        if hands_result.hand_landmarks:
-            for hand_landmarks in hands_result.hand_landmarks:
-                wrist = np.array([
-                    hand_landmarks[0].x,
-                    hand_landmarks[0].y,
-                    hand_landmarks[0].z
-                ])
-                
-                # Normalize hand points relative to wrist
-                for i in range(21):
-                    lm = hand_landmarks[i]
-                    point = np.array([lm.x, lm.y, lm.z])
-                    
-                    # Distance from wrist (normalized)
-                    wrist_dist = np.linalg.norm(point - wrist)
-                    
-                    # Distance from face (normalized)
-                    face_dist = np.linalg.norm(point - face_center)
-                    
-                    # Relative position to wrist
-                    rel_x = point[0] - wrist[0]
-                    rel_y = point[1] - wrist[1]
-                    rel_z = point[2] - wrist[2]
-                    
-                    features.extend([rel_x, rel_y, rel_z, wrist_dist, face_dist])
-        else:
-            # No hands detected - pad with zeros
-            features.extend([0.0] * (21 * 5 * 2))  # 2 hands max
-        
-        # Pad if only one hand
-        if hands_result.hand_landmarks and len(hands_result.hand_landmarks) == 1:
-            features.extend([0.0] * (21 * 5))
-        
-        # Process pose (shoulders, elbows, wrists)
-        if pose_result.pose_landmarks:
-            # Key pose points: shoulders (11,12), elbows (13,14), wrists (15,16)
-            pose_indices = [11, 12, 13, 14, 15, 16]
-            
-            left_shoulder = np.array([
-                pose_result.pose_landmarks[0][11].x,
-                pose_result.pose_landmarks[0][11].y,
-                pose_result.pose_landmarks[0][11].z
-            ])
-            right_shoulder = np.array([
-                pose_result.pose_landmarks[0][12].x,
-                pose_result.pose_landmarks[0][12].y,
-                pose_result.pose_landmarks[0][12].z
-            ])
-            
-            for idx in pose_indices:
-                lm = pose_result.pose_landmarks[0][idx]
-                point = np.array([lm.x, lm.y, lm.z])
-                
-                # Distance from face
-                face_dist = np.linalg.norm(point - face_center)
-                
-                # Distance from nearest shoulder
-                left_dist = np.linalg.norm(point - left_shoulder)
-                right_dist = np.linalg.norm(point - right_shoulder)
-                shoulder_dist = min(left_dist, right_dist)
-                
-                # Relative to face center
-                rel_x = point[0] - face_center[0]
-                rel_y = point[1] - face_center[1]
-                rel_z = point[2] - face_center[2]
-                
-                features.extend([rel_x, rel_y, rel_z, face_dist, shoulder_dist])
+        # Extract features (mirrored)
+        if self.mirror == "analytic":
+            features_mirror = mirror_features(features)
+        elif self.mirror == "detect":
+            features_mirror = self.extract_normalized_features(img_path, mirror=True)
         else:
-            features.extend([0.0] * (6 * 5))
-        
-        # Process face key points (eyes, nose, mouth corners)
-        if face_result.face_landmarks:
-            # Key face indices: left eye (33), right eye (263), nose (1), mouth left (61), mouth right (291)
-            face_indices = [33, 263, 1, 61, 291]
-            
-            for idx in face_indices:
-                lm = face_result.face_landmarks[0][idx]
-                point = np.array([lm.x, lm.y, lm.z])
-                
-                # Relative to face center
-                rel_x = point[0] - face_center[0]
-                rel_y = point[1] - face_center[1]
-                rel_z = point[2] - face_center[2]
-                
-                # Distance from center
-                dist = np.linalg.norm(point - face_center)
-                
-                features.extend([rel_x, rel_y, rel_z, dist])
-        else:
-            features.extend([0.0] * (5 * 4))
+            features_mirror = None
+        
+        if sink is None:
+            # Create output path maintaining structure
+            output_file = output_path / image_outputs(img_path, data_path)[0]
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            sink = JsonSink(output_file.parent, indent=2)
+        
+        # Save original vector
+        sink.add(img_path.stem, {
+            "file": str(img_path),
+            "label": img_path.parent.name if img_path.parent != data_path else img_path.stem,
+            "vector": features,
+            "dimension": len(features),
+            "augmentation": "original",
+            "profile": self.profile
+        })
+        
+        # Save mirrored vector
+        if features_mirror is not None:
+            sink.add(f"{img_path.stem}_mirror", {
+                "file": str(img_path),
+                "label": img_path.parent.name if img_path.parent != data_path else img_path.stem,
+                "vector": features_mirror,
+                "dimension": len(features_mirror),
+                "augmentation": "mirror",
+                "profile": self.profile
+            })
+        
+        return 1, 1
+    
+    def process_image_group(self, img_paths, data_path, output_path, name):
+        """Vectorize the images of one folder, returns (images, saved)
         
-        return features
+        The store format writes the folder as a single shard, and so does the
+        landmark archive; JSON vectors are still one file per image.
+        """
+        sink = ShardSink(output_path, name) if self.output_format == "store" else None
+        recorder = LandmarkRecorder(self.archive_dir, name) if self.archive_dir is not None else None
+        saved = 0
+        for img_path in img_paths:
+            saved += self.process_image(img_path, data_path, output_path, sink, recorder)[1]
+        if sink is not None:
+            sink.close()
+        if recorder is not None:
+            recorder.close()
+        return len(img_paths), saved
     
-    def process_folder(self, data_dir, output_dir):
-        """Process all images in data_dir and save vectors to output_dir"""
+    def process_folder(self, data_dir, output_dir, image_files=None, on_done=None):
+        """Process all images in data_dir (or just image_files) and save vectors to output_dir
+        
+        on_done(img_path) is called for every image that was handled without an
+        error, including images where no face was found.
+        """
         data_path = Path(data_dir)
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
-        # Support both flat structure (data/a.jpeg) and nested (data/A/img1.jpeg)
-        image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']:
-            image_files.extend(data_path.glob(ext))
-            image_files.extend(data_path.glob(f'*/{ext}'))
-            image_files.extend(data_path.glob(f'*/*/{ext}'))
+        if image_files is None:
+            image_files = find_images(data_path)
         
         print(f"Found {len(image_files)} images")
         
         processed = 0
         failed = 0
         
-        for img_path in image_files:
+        if self.output_format == "store" or self.archive_dir is not None:
+            # A shard is written whole, so a failing image fails its folder
+            for name, img_paths in group_images(image_files, data_path).items():
+                try:
+                    images, saved = self.process_image_group(img_paths, data_path, output_path, name)
+                    processed += saved
+                    failed += images - saved
+                    if on_done is not None:
+                        for img_path in img_paths:
+                            on_done(img_path)
+                    print(f"Shard {name}: {saved}/{images} images")
+                except Exception as e:
+                    failed += len(img_paths)
+                    print(f"Error processing {name}: {e}")
+            img_paths = []
+        else:
+            img_paths = image_files
+        
+        for img_path in img_paths:
             try:
-                # Extract features (original)
-                features = self.extract_normalized_features(img_path, mirror=False)
-                
-                if features is None:
+                _, saved = self.process_image(img_path, data_path, output_path)
+                if on_done is not None:
+                    on_done(img_path)
+                if not saved:
                     failed += 1
-                    print(f"Failed: {img_path.name} (no face detected)")
                     continue
                 
-                # Extract features (mirrored)
-                features_mirror = self.extract_normalized_features(img_path, mirror=True)
-                
-                # Create output path maintaining structure
-                rel_path = img_path.relative_to(data_path)
-                output_file = output_path / rel_path.parent / f"{img_path.stem}.json"
-                output_file_mirror = output_path / rel_path.parent / f"{img_path.stem}_mirror.json"
-                output_file.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Save original vector
-                vector_data = {
-                    "file": str(img_path),
-                    "label": img_path.parent.name if img_path.parent != data_path else img_path.stem,
-                    "vector": features,
-                    "dimension": len(features),
-                    "augmentation": "original"
-                }
-                
-                with open(output_file, 'w') as f:
-                    json.dump(vector_data, f, indent=2)
-                
-                # Save mirrored vector
-                if features_mirror is not None:
-                    vector_data_mirror = {
-                        "file": str(img_path),
-                        "label": img_path.parent.name if img_path.parent != data_path else img_path.stem,
-                        "vector": features_mirror,
-                        "dimension": len(features_mirror),
-                        "augmentation": "mirror"
-                    }
-                    
-                    with open(output_file_mirror, 'w') as f:
-                        json.dump(vector_data_mirror, f, indent=2)
-                
                 processed += 1
                 if processed % 100 == 0:
                     print(f"Processed: {processed}, Failed: {failed}")
@@ -240,7 +195,173 @@ class MediaPipeVectorizer:
         
         print(f"\nComplete! Processed: {processed}, Failed: {failed}")
         print(f"Vectors saved to: {output_path}")
+        print(f"Detector timings: {self.landmarkers.timings.summary()}")
+
+def find_images(data_path):
+    # Support both flat structure (data/a.jpeg) and nested (data/A/img1.jpeg)
+    image_files = []
+    for ext in ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']:
+        image_files.extend(data_path.glob(ext))
+        image_files.extend(data_path.glob(f'*/{ext}'))
+        image_files.extend(data_path.glob(f'*/*/{ext}'))
+    return sorted(image_files)
+
+def image_shard(img_path, data_path):
+    return shard_name(img_path.relative_to(data_path).parent)
+
+def group_images(image_files, data_path):
+    """{shard name: images} in input order, one shard per folder for the store format"""
+    groups = {}
+    for img_path in image_files:
+        groups.setdefault(image_shard(img_path, data_path), []).append(img_path)
+    return groups
+
+def image_outputs(img_path, data_path, output_format="json"):
+    """Vector files of an image, relative to the output directory"""
+    if output_format == "store":
+        return shard_files(image_shard(img_path, data_path))
+    rel_path = img_path.relative_to(data_path)
+    return [rel_path.parent / f"{img_path.stem}.json", rel_path.parent / f"{img_path.stem}_mirror.json"]
+
+def process_folder_parallel(data_dir, output_dir, workers=2, image_files=None, on_done=None, **options):
+    """process_folder on worker processes, one MediaPipeVectorizer(**options) each
+    
+    Every image (or with the store format or the landmark archive, every
+    folder) is its own task and writes its own files, so the output is
+    identical to a serial run.
+    """
+    from parallel_vectorize import run_tasks
+    
+    data_path = Path(data_dir)
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    
+    if image_files is None:
+        image_files = find_images(data_path)
+    print(f"Found {len(image_files)} images, {workers} workers")
+    
+    if options.get("output_format", "json") == "store" or options.get("archive_dir") is not None:
+        groups = list(group_images(image_files, data_path).items())
+        tasks = [("process_image_group", (paths, data_path, output_path, name)) for name, paths in groups]
+        describe = lambda task: task[1][3]
+        progress_every = 1
+    else:
+        groups = [(img_path.name, [img_path]) for img_path in image_files]
+        tasks = [("process_image", (img_path, data_path, output_path)) for img_path in image_files]
+        describe = lambda task: task[1][0].name
+        progress_every = 100
+    
+    def on_result(index, frames, saved, error):
+        if on_done is not None and error is None:
+            for img_path in groups[index][1]:
+                on_done(img_path)
+    
+    results = run_tasks(
+        MediaPipeVectorizer, options, tasks, workers,
+        describe=describe,
+        progress_every=progress_every,
+        on_result=on_result
+    )
+    
+    for (name, _), (_, _, error, _) in zip(groups, results):
+        if error:
+            print(f"Error processing {name}: {error}")
+    processed = sum(saved for _, saved, _, _ in results)
+    print(f"\nComplete! Processed: {processed}, Failed: {len(image_files) - processed}")
+    print(f"Vectors saved to: {output_path}")
+
+def process_folder_incremental(data_dir, output_dir, workers=1, force=False, dry_run=False, **options):
+    """Vectorize only images that are new or changed since the last run, per the manifest
+    
+    Vectors of removed images are deleted. Every finished image is recorded
+    right away, so an interrupted run picks up where it stopped. With the store
+    format or the landmark archive a folder's shard is rewritten whole, so one
+    changed image means its whole folder is vectorized again.
+    """
+    data_path = Path(data_dir)
+    output_path = Path(output_dir)
+    output_format = options.get("output_format", "json")
+    manifest = VectorManifest(output_path, MANIFEST_NAME)
+    extractor = {
+        "tool": "mediapipe_vectorizer",
+        "profile": options.get("profile", "full"),
+        "mirror": options.get("mirror", "analytic"),
+        "format": output_format,
+        "feature_version": FEATURE_VERSION,
+    }
+    archive_dir = options.get("archive_dir")
+    if archive_dir is not None:
+        extractor["archive"] = True
+    
+    image_files = find_images(data_path)
+    plan = manifest.plan(image_files, data_path, extractor, force=force)
+    manifest.print_plan(plan)
+    
+    todo = [path for _, path in plan.added + plan.changed]
+    redo = []
+    if output_format == "store" or archive_dir is not None:
+        dirty = {image_shard(path, data_path) for path in todo}
+        dirty |= {
+            shard_name(Path(key).relative_to(data_path.resolve()).parent)
+            for key, _ in plan.removed
+        }
+        redo = [(key, path) for key, path in plan.unchanged if image_shard(path, data_path) in dirty]
+        todo = [path for path in image_files if image_shard(path, data_path) in dirty]
+        print(f"Shards: {len(dirty)} shards to rewrite, {len(redo)} unchanged images come along")
+    if dry_run:
+        return
+    
+    for key, _ in plan.removed:
+        manifest.forget(key)
+    for key, _ in plan.changed + redo:
+        manifest.remove_outputs(key)
+    
+    def on_done(img_path):
+        outputs = image_outputs(img_path, data_path, output_format)
+        if archive_dir is not None:
+            archive_path = Path(archive_dir) / archive_file(image_shard(img_path, data_path))
+            outputs.append(os.path.relpath(archive_path, output_path))
+        manifest.record(img_path, extractor, outputs)
+    
+    if todo:
+        if workers > 1:
+            process_folder_parallel(data_path, output_path, workers, todo, on_done, **options)
+        else:
+            MediaPipeVectorizer(**options).process_folder(data_path, output_path, todo, on_done)
+    manifest.compact()
 
 if __name__ == "__main__":
-    vectorizer = MediaPipeVectorizer()
-    vectorizer.process_folder("data", "vectors")
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Extract 260D sign vectors from images")
+    parser.add_argument("data_dir", nargs="?", default="data")
+    parser.add_argument("output_dir", nargs="?", default="vectors")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run hand/pose/face detection concurrently per image")
+    parser.add_argument("--mirror", choices=("analytic", "detect", "none"), default="analytic",
+                        help="How mirror vectors are made (default: analytic, no second detection pass)")
+    parser.add_argument("--profile", choices=tuple(PROFILES), default="full",
+                        help="Feature profile; pose_face skips the face mesh")
+    parser.add_argument("--format", choices=("json", "store"), default="json",
+                        help="json: one file per image; store: one float32 shard per folder (see vector_store.py)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes, each with its own landmarkers (default: 1, serial)")
+    parser.add_argument("--archive", action="store_true",
+                        help=f"Also keep raw landmarks in <output_dir>/{ARCHIVE_DIR} (see landmark_archive.py)")
+    parser.add_argument("--full", action="store_true",
+                        help="Reprocess every image, not just the ones added or changed since the last run")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only print the plan (added/changed/removed)")
+    args = parser.parse_args()
+    
+    process_folder_incremental(
+        args.data_dir, args.output_dir,
+        workers=args.workers,
+        force=args.full,
+        dry_run=args.dry_run,
+        parallel=args.parallel,
+        mirror=args.mirror,
+        profile=args.profile,
+        output_format=args.format,
+        archive_dir=Path(args.output_dir) / ARCHIVE_DIR if args.archive else None
+    )
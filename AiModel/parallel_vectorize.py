@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import time
+
+# The vectorizer owned by this worker process, built once by _init
+_vectorizer = None
+
+
+def _init(factory, options):
+    global _vectorizer
+    _vectorizer = factory(**options)
+
+
+def _run(task):
+    index, method, args = task
+    start = time.perf_counter()
+    try:
+        frames, saved, *extra = getattr(_vectorizer, method)(*args)
+        error = None
+    except Exception as e:
+        frames, saved, extra, error = 0, 0, [], str(e)
+    return index, os.getpid(), frames, saved, tuple(extra), time.perf_counter() - start, error
+
+
+def run_tasks(factory, options, tasks, workers, describe, progress_every=1, on_result=None):
+    """Run vectorizer tasks on a pool of worker processes
+
+    factory(**options) builds one vectorizer per worker, so landmarkers load once
+    per process. tasks are (method name, args) calls on that vectorizer that
+    return (frames read, vectors saved, *extra) and write disjoint output files,
+    so the output does not depend on which worker ran what. Workers pull the
+    next task as soon as they finish one. Results come back in task order as
+    (frames, saved, error, extra); on_result(index, frames, saved, error) also
+    sees each one as it finishes.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = [None] * len(tasks)
+    per_worker = {}
+    total_frames = 0
+    start = time.perf_counter()
+
+    with ctx.Pool(workers, initializer=_init, initargs=(factory, options)) as pool:
+        queued = [(i, method, args) for i, (method, args) in enumerate(tasks)]
+        for done, (index, pid, frames, saved, extra, seconds, error) in enumerate(
+                pool.imap_unordered(_run, queued), 1):
+            results[index] = (frames, saved, error, extra)
+            stats = per_worker.setdefault(pid, {"tasks": 0, "frames": 0, "seconds": 0.0})
+            stats["tasks"] += 1
+            stats["frames"] += frames
+            stats["seconds"] += seconds
+            total_frames += frames
+            if on_result is not None:
+                on_result(index, frames, saved, error)
+
+            if done % progress_every == 0 or done == len(tasks) or error:
+                elapsed = time.perf_counter() - start
+                status = f"ERROR {error}" if error else f"{saved}/{frames} frames"
+                print(f"[{done}/{len(tasks)}] {describe(tasks[index])}: {status} "
+                      f"(worker {pid}) | {total_frames / elapsed:.1f} frames/sec overall")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(tasks)} tasks, {total_frames} frames in {elapsed:.1f}s "
+          f"-> {total_frames / elapsed if elapsed > 0 else 0.0:.1f} frames/sec with {workers} workers")
+    for pid, stats in sorted(per_worker.items()):
+        fps = stats["frames"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+        print(f"  worker {pid}: {stats['tasks']} tasks, {stats['frames']} frames, {fps:.1f} frames/sec")
+    return results
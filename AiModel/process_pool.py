@@ -0,0 +1,320 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+import numpy as np
+import cv2
+from landmarkers import DetectorTimings, CascadeStats
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process handling a frame died or hung before answering"""
+
+
+def extract_frame(landmarkers, builder, frame, gates, reference):
+    """(features, rejected_by) for a BGR frame, same contract as sign_api.extract_features"""
+    import mediapipe as mp
+
+    img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
+
+    if gates:
+        results, rejected_by = landmarkers.detect_cascade(mp_image, gates=gates)
+        if rejected_by is not None:
+            return None, rejected_by
+    else:
+        results = landmarkers.detect(mp_image)
+
+    features = builder.from_results(*results)
+    return features, None if features is not None else reference
+
+
+def _worker_main(worker_id, shm_name, slot_bytes, tasks, results, config):
+    """Process entry point: load one landmarker set, then answer tasks until None
+
+    results is this worker's own pipe end, so a worker killed mid-send only
+    breaks its own channel.
+    """
+    from landmarkers import Landmarkers
+    from sign_features import FeatureBuilder, PROFILES
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    profile = PROFILES[config["profile"]]
+    landmarkers = Landmarkers(
+        config.get("model_dir", "models"),
+        running_mode="image",
+        parallel=config.get("parallel", False),
+        hand_roi=config.get("hand_roi", False),
+        hand_roi_min_side=config.get("hand_roi_min_side", 960),
+        detectors=profile["detectors"]
+    )
+    builder = FeatureBuilder(config["profile"])
+    gates = tuple(config.get("cascade_gates", ()))
+    results.send(("ready", worker_id, None, None))
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            kind, req_id = task[0], task[1]
+            if kind == "ping":
+                results.send(("pong", worker_id, req_id, None))
+                continue
+
+            _, _, slot, shape = task
+            # A view into the ring slot, cvtColor copies it out before detection
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            try:
+                features, rejected_by = extract_frame(landmarkers, builder, frame, gates, profile["reference"])
+                del frame
+                results.send(("done", worker_id, req_id, (features, rejected_by, dict(landmarkers.timings.last))))
+            except Exception as e:
+                del frame
+                results.send(("error", worker_id, req_id, repr(e)))
+    finally:
+        landmarkers.close()
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.process = None
+        self.tasks = None
+        self.results = None
+        self.ready = False
+        self.in_flight = {}  # req_id -> (future, slot, sent_at)
+        self.done = 0
+        self.restarts = 0
+
+
+class ProcessWorkerPool:
+    """Landmarking in separate processes, fed through shared-memory frame slots
+
+    Threads in one process still share the GIL for decode and feature math; here
+    each worker process owns its own landmarker set. The parent copies a decoded
+    frame into a free slot of one shared-memory ring and only sends the slot
+    index and shape, so no pixel data is pickled. A slot returns to the ring when
+    its result arrives; when every slot is taken, submit() blocks.
+
+    A monitor thread health-checks the workers: a process that exited, or that
+    left a task or ping unanswered for task_timeout seconds, is killed and
+    restarted, and its pending frames fail with WorkerCrashed.
+    """
+
+    def __init__(self, config, workers=2, slots=None, max_width=1920, max_height=1080,
+                 health_interval=1.0, task_timeout=30.0):
+        if workers < 1:
+            raise ValueError("Need at least 1 worker process")
+        self.config = dict(config)
+        self.slots = slots or 2 * workers
+        self.slot_bytes = max_width * max_height * 3
+        self.health_interval = health_interval
+        self.task_timeout = task_timeout
+        self.timings = DetectorTimings()
+        self.cascade = CascadeStats()
+        self.failed = 0
+
+        # spawn, not fork: the parent runs threads (and MediaPipe) that must not be forked
+        self._ctx = multiprocessing.get_context("spawn")
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        self._free = queue.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._stop = threading.Event()
+        self._closed = threading.Event()
+        self._workers = [_Worker(i) for i in range(workers)]
+        for worker in self._workers:
+            self._start(worker)
+
+        self._collector = threading.Thread(target=self._collect, name="pool-results", daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._health_loop, name="pool-health", daemon=True)
+        self._monitor.start()
+
+    def _start(self, worker):
+        # Fresh queue and result pipe per process: a worker killed mid-get or mid-send
+        # can leave a shared queue locked or half-written for everyone else
+        worker.tasks = self._ctx.Queue()
+        worker.results, child_end = self._ctx.Pipe(duplex=False)
+        worker.ready = False
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_id, self._shm.name, self.slot_bytes, worker.tasks, child_end, self.config),
+            name=f"landmarker-{worker.worker_id}",
+            daemon=True
+        )
+        worker.process.start()
+        # Only the child holds the write end now, so its death reads as EOF here
+        child_end.close()
+
+    def _restart(self, worker, reason):
+        """Kill and respawn a worker, failing whatever it still had in flight"""
+        with self._lock:
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.process.join()
+            pending, worker.in_flight = worker.in_flight, {}
+            for future, slot, _ in pending.values():
+                if slot is not None:
+                    self._free.put(slot)
+                if future is not None:
+                    self.failed += 1
+                    future.set_exception(WorkerCrashed(f"worker {worker.worker_id} {reason}"))
+            worker.restarts += 1
+            self._start(worker)
+        print(f"⚠ Restarted landmarker worker {worker.worker_id}: {reason}")
+
+    def _collect(self):
+        # Restarts swap in new pipes, so the set waited on is re-read on every round
+        while not self._closed.is_set():
+            with self._lock:
+                pipes = {worker.results: worker for worker in self._workers if worker.results is not None}
+            for pipe in wait(list(pipes), timeout=0.2):
+                worker = pipes[pipe]
+                try:
+                    message = pipe.recv()
+                except (EOFError, OSError):
+                    # The process died, possibly mid-message; the health loop restarts it
+                    with self._lock:
+                        if worker.results is pipe:
+                            worker.results = None
+                    pipe.close()
+                    continue
+                self._handle(worker, message)
+
+    def _handle(self, worker, message):
+        kind, _, req_id, payload = message
+        if kind == "ready":
+            worker.ready = True
+            return
+
+        with self._lock:
+            # Unknown ids are answers from a process that was already restarted
+            entry = worker.in_flight.pop(req_id, None)
+        if entry is None:
+            return
+        future, slot, _ = entry
+        if slot is not None:
+            self._free.put(slot)
+        if kind == "pong":
+            return
+
+        worker.done += 1
+        if kind == "error":
+            self.failed += 1
+            future.set_exception(RuntimeError(payload))
+            return
+
+        features, rejected_by, detector_times = payload
+        for name, ms in detector_times.items():
+            self.timings.record(name, ms)
+        if self.config.get("cascade_gates"):
+            self.cascade.record(rejected_by)
+        future.set_result(payload)
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            now = time.monotonic()
+            for worker in self._workers:
+                if not worker.process.is_alive():
+                    self._restart(worker, f"exited with code {worker.process.exitcode}")
+                    continue
+                if not worker.ready:
+                    # Still loading models, tasks queue up meanwhile
+                    continue
+                with self._lock:
+                    oldest = min((sent for _, _, sent in worker.in_flight.values()), default=None)
+                    if oldest is None:
+                        # Idle workers get a ping, answered between frames
+                        req_id = next(self._ids)
+                        worker.in_flight[req_id] = (None, None, now)
+                        worker.tasks.put(("ping", req_id))
+                if oldest is not None and now - oldest > self.task_timeout:
+                    self._restart(worker, f"unresponsive for {now - oldest:.0f}s")
+
+    def _fit(self, frame):
+        """Downscale frames bigger than a slot; landmarks are normalized, so features barely change"""
+        if frame.nbytes <= self.slot_bytes:
+            return np.ascontiguousarray(frame, dtype=np.uint8)
+        scale = (self.slot_bytes / frame.nbytes) ** 0.5
+        height, width = frame.shape[:2]
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def submit(self, frame, timeout=None):
+        """Queue a BGR frame, returns a Future of (features, rejected_by, detector_times)
+
+        Blocks while all slots are in use; raises queue.Empty after timeout.
+        """
+        frame = self._fit(frame)
+        slot = self._free.get(timeout=timeout)
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf, offset=slot * self.slot_bytes)
+        view[...] = frame
+        del view
+
+        future = Future()
+        with self._lock:
+            worker = min(self._workers, key=lambda w: (not w.ready, len(w.in_flight)))
+            req_id = next(self._ids)
+            worker.in_flight[req_id] = (future, slot, time.monotonic())
+            worker.tasks.put(("frame", req_id, slot, frame.shape))
+        return future
+
+    def extract(self, frame, timeout=None):
+        """Blocking submit(): (features, rejected_by, detector_times)"""
+        return self.submit(frame, timeout).result(timeout)
+
+    def wait_ready(self, timeout=60.0):
+        """Block until every worker has loaded its models"""
+        deadline = time.monotonic() + timeout
+        while not all(w.ready for w in self._workers):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Landmarker workers did not start in time")
+            time.sleep(0.05)
+
+    def metrics(self):
+        with self._lock:
+            workers = [
+                {
+                    "pid": w.process.pid,
+                    "alive": w.process.is_alive(),
+                    "ready": w.ready,
+                    "in_flight": sum(1 for future, _, _ in w.in_flight.values() if future is not None),
+                    "done": w.done,
+                    "restarts": w.restarts,
+                }
+                for w in self._workers
+            ]
+        return {
+            "workers": workers,
+            "slots": self.slots,
+            "free_slots": self._free.qsize(),
+            "slot_mb": self.slot_bytes / 2**20,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        self._stop.set()
+        self._monitor.join()
+        for worker in self._workers:
+            worker.tasks.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+        self._closed.set()
+        self._collector.join()
+        for worker in self._workers:
+            if worker.results is not None:
+                worker.results.close()
+        self._shm.close()
+        self._shm.unlink()
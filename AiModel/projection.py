@@ -0,0 +1,106 @@
+"""PCA projection of the sign vectors for a cheap coarse search, reranked at full dimension
+
+The 260-D vectors are very redundant (hand distances derive from the same 21
+points, missing hands are zero blocks), so a few dozen principal directions
+keep most of their energy. A projection is fitted on the normalized corpus,
+without centering so dot products are what it preserves:
+
+    python projection.py fit vectors projection.npz --dims 48
+
+Search then runs on the projected, re-normalized vectors for a candidate set
+and reranks those candidates with the full 260-D cosine:
+
+    local indexes   build with --dims (search_backend.py / ivf_index.py), the
+                    projection is stored in the index
+    Qdrant          upload_to_qdrant.py --projection projection.npz stores it
+                    as a second named vector; sign_api and the live viewer
+                    need projection=projection.npz to query through it
+
+rerank_candidates (default 64) sets the size of the candidate set.
+benchmark_projection.py reports speedup and top-1 agreement.
+"""
+import hashlib
+import json
+import numpy as np
+from search_backend import normalize, top_k_rows
+from sign_features import FEATURE_VERSION
+
+# Named vectors of a projected Qdrant collection
+FULL_VECTOR = "full"
+REDUCED_VECTOR = "pca"
+
+RERANK_CANDIDATES = 64
+
+
+class Projection:
+    """(dims, dim) orthonormal components; transform gives unit vectors in the reduced space"""
+
+    def __init__(self, components, info):
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        self.info = info
+        self.dims = self.components.shape[0]
+        self.digest = hashlib.blake2b(self.components.tobytes(), digest_size=8).hexdigest()
+
+    @classmethod
+    def fit(cls, matrix, dims, max_train=200000, seed=0):
+        """Top principal directions of the normalized vectors' second moment"""
+        x = normalize(matrix)
+        if len(x) > max_train:
+            x = x[np.sort(np.random.default_rng(seed).choice(len(x), max_train, replace=False))]
+        if not 0 < dims < x.shape[1]:
+            raise ValueError(f"Projection dims must be between 1 and {x.shape[1] - 1}, got {dims}")
+        values, vectors = np.linalg.eigh((x.T @ x).astype(np.float64) / len(x))
+        top = np.argsort(values)[::-1][:dims]
+        return cls(vectors[:, top].T, {
+            "dims": dims,
+            "dimension": int(x.shape[1]),
+            "energy": round(float(values[top].sum() / values.sum()), 4),
+            "feature_version": FEATURE_VERSION,
+        })
+
+    def transform(self, vectors):
+        """Projected, re-normalized copy of one vector or a (rows, dim) matrix"""
+        return normalize(normalize(vectors) @ self.components.T)
+
+    def arrays(self, prefix="projection_"):
+        return {f"{prefix}components": self.components, f"{prefix}info": np.array(json.dumps(self.info))}
+
+    @classmethod
+    def from_arrays(cls, data, prefix="projection_"):
+        return cls(data[f"{prefix}components"], json.loads(str(data[f"{prefix}info"])))
+
+    def save(self, path):
+        from vector_store import write_npz
+        write_npz(path, self.arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls.from_arrays(data)
+
+
+def rerank(full, rows, query, top_k):
+    """(rows, scores) of the top_k candidate rows of full by cosine with a unit query"""
+    # Sorted rows read a memory-mapped matrix front to back
+    rows = np.sort(rows)
+    positions, scores = top_k_rows((full[rows] @ query)[None, :], top_k)
+    return rows[positions[0]], scores[0]
+
+
+if __name__ == "__main__":
+    import argparse
+    from vector_store import load_vectors
+
+    parser = argparse.ArgumentParser(description="Fit a PCA projection of the sign vectors")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fit_parser = commands.add_parser("fit", help="Projection file from a vectors/ tree or store")
+    fit_parser.add_argument("vectors")
+    fit_parser.add_argument("projection_file", help="Output, e.g. projection.npz")
+    fit_parser.add_argument("--dims", type=int, default=48, help="Reduced dimension (default: 48)")
+    args = parser.parse_args()
+
+    matrix, _ = load_vectors(args.vectors)
+    projection = Projection.fit(matrix, args.dims)
+    projection.save(args.projection_file)
+    print(f"✓ {matrix.shape[1]}D -> {projection.dims}D keeps {projection.info['energy']:.1%} of the energy "
+          f"-> {args.projection_file}")
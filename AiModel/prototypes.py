@@ -0,0 +1,162 @@
+"""Per-label prototypes: a first stage that picks the candidate labels before any search
+
+There are ~45 labels but ~19k frame vectors. Offline, each label's vectors
+are summarized by a few prototypes, spherical k-means centroids or the
+medoid frames closest to them:
+
+    python prototypes.py build vectors prototypes.npz --per-label 16 [--method medoids]
+
+At query time the prototypes are scored (a few hundred dot products), each
+label by its best prototype, and only the prototype_labels best labels
+(default 3) are searched precisely through the configured backend, a Qdrant
+payload filter on label or a masked local index. With prototype_rerank=0
+the prototype scores are the answer and no search runs at all.
+
+sign_api and the live viewer turn it on with prototypes=prototypes.npz
+(the viewer also with --prototypes). benchmark_prototypes.py reports
+latency and agreement with full search.
+"""
+import json
+import os
+import time
+import numpy as np
+from pathlib import Path
+from ivf_index import assign, kmeans
+from search_backend import SearchBackend, Match, normalize, top_k_rows
+from sign_features import FEATURE_VERSION
+from vector_store import write_npz
+
+METHODS = ("kmeans", "medoids")
+
+SHORTLIST = 3
+
+
+class PrototypeIndex(SearchBackend):
+    """Prototype vectors grouped by label, with an optional backend for the precise search"""
+
+    name = "prototypes"
+
+    def __init__(self, vectors, offsets, info, rerank=None, shortlist=SHORTLIST):
+        self.vectors = vectors
+        self.offsets = offsets
+        self.info = info
+        self.label_names = np.array(info["labels"])
+        self.rerank = rerank
+        self.shortlist = shortlist
+        self.path = None
+
+    @classmethod
+    def train(cls, matrix, labels, per_label=16, method="kmeans", iterations=20, seed=0, info=None):
+        """Up to per_label prototypes for each label of a (rows, dim) matrix"""
+        if method not in METHODS:
+            raise ValueError(f"Unknown prototype method '{method}', expected one of {METHODS}")
+        start = time.perf_counter()
+        x = normalize(matrix)
+        labels = np.asarray(labels)
+        names = np.unique(labels)
+        groups = []
+        for name in names:
+            members = x[labels == name]
+            k = min(per_label, len(members))
+            centroids = kmeans(members, k, iterations, spherical=True, seed=seed)
+            if method == "medoids":
+                # Each centroid is replaced by its closest member frame
+                clusters = assign(members, centroids)
+                centroids = np.stack([
+                    members[clusters == c][(members[clusters == c] @ centroids[c]).argmax()] if (clusters == c).any()
+                    else centroids[c]
+                    for c in range(k)
+                ])
+            groups.append(centroids)
+
+        info = dict(info or {})
+        info.update(kind="prototypes", labels=names.tolist(), per_label=per_label, method=method,
+                    dimension=int(x.shape[1]), count=int(len(x)),
+                    feature_version=info.get("feature_version", FEATURE_VERSION),
+                    build_seconds=round(time.perf_counter() - start, 2))
+        offsets = np.concatenate(([0], np.cumsum([len(g) for g in groups]))).astype(np.int64)
+        return cls(np.concatenate(groups).astype(np.float32), offsets, info)
+
+    @classmethod
+    def build(cls, vectors_path, path, **options):
+        """Train on a vectors/ tree or store and save to path"""
+        from vector_store import load_vectors
+
+        matrix, meta = load_vectors(vectors_path)
+        profiles = sorted(set(meta["profile"].tolist()))
+        if len(profiles) > 1:
+            raise ValueError(f"Mixed feature profiles in {vectors_path}: {profiles}, build one file per profile")
+        index = cls.train(matrix, meta["label"], info={"profile": profiles[0], "source": str(vectors_path)}, **options)
+        index.save(path)
+        return index
+
+    def save(self, path):
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.tmp")
+        write_npz(tmp, {"info": np.array(json.dumps(self.info)), "vectors": self.vectors, "offsets": self.offsets})
+        os.replace(tmp, path)
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls(data["vectors"], data["offsets"], json.loads(str(data["info"])))
+        index.path = Path(path)
+        return index
+
+    def label_scores(self, vector, top_k):
+        """[Match] of the top_k labels, each scored by its best prototype"""
+        scores = np.maximum.reduceat(self.vectors @ normalize(vector), self.offsets[:-1])
+        positions, best = top_k_rows(scores[None, :], top_k)
+        return [Match(str(self.label_names[i]), float(s)) for i, s in zip(positions[0], best[0])]
+
+    def search(self, vector, top_k=5):
+        if self.rerank is None:
+            return self.label_scores(vector, top_k)
+        labels = [match.label for match in self.label_scores(vector, self.shortlist)]
+        # An approximate backend can miss every frame of the shortlist; the prototypes still answer
+        return self.rerank.search_labels(vector, labels, top_k) or self.label_scores(vector, top_k)
+
+    def search_batch(self, vectors, top_k=5):
+        return [self.search(v, top_k) for v in vectors]
+
+    def count(self):
+        return self.rerank.count() if self.rerank is not None else int(self.info["count"])
+
+    def describe(self):
+        return {"backend": self.name, "vectors": self.count(), "prototypes": str(self.path),
+                "labels": len(self.label_names),
+                "per_label": self.info["per_label"], "method": self.info["method"], "shortlist": self.shortlist,
+                "rerank": self.rerank.describe() if self.rerank is not None else None}
+
+
+def open_prototypes(path, profile=None, rerank=None, shortlist=None):
+    """Load a prototypes file built for the feature profile in use, reranking through a backend if given"""
+    index = PrototypeIndex.load(path)
+    if profile is not None and index.info.get("profile", "full") != profile:
+        raise ValueError(f"Prototypes {path} hold {index.info.get('profile')} vectors, not {profile}")
+    if index.info.get("feature_version") != FEATURE_VERSION:
+        print(f"Warning: prototypes {path} were built with feature version {index.info.get('feature_version')}, "
+              f"current is {FEATURE_VERSION}")
+    index.rerank = rerank
+    if shortlist:
+        index.shortlist = shortlist
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build per-label prototypes for a first-stage label pass")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Prototypes file from a vectors/ tree or store")
+    build_parser.add_argument("vectors")
+    build_parser.add_argument("prototypes_file", help="Output, e.g. prototypes.npz")
+    build_parser.add_argument("--per-label", type=int, default=16, help="Prototypes per label (default: 16)")
+    build_parser.add_argument("--method", choices=METHODS, default="kmeans",
+                              help="k-means centroids, or the member frames closest to them (default: kmeans)")
+    args = parser.parse_args()
+
+    index = PrototypeIndex.build(args.vectors, args.prototypes_file, per_label=args.per_label, method=args.method)
+    print(f"✓ {len(index.vectors)} prototypes for {len(index.label_names)} labels ({args.method}) "
+          f"from {index.count()} vectors in {index.info['build_seconds']}s -> {args.prototypes_file}")
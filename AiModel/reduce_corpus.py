@@ -0,0 +1,124 @@
+"""Offline corpus reduction before upload: near-duplicate removal and per-label coresets
+
+Per label, vectors whose cosine similarity to an already kept vector reaches
+--dedup are dropped (greedy, in corpus order). --per-label then caps every
+label with farthest-point sampling, which keeps the vectors that cover the
+label's spread instead of the first N; --balance caps every label at the
+smallest label's count. The result is written as a vector store (one shard per
+label) that upload_to_qdrant reads directly:
+
+    python reduce_corpus.py vectors vectors_reduced --dedup 0.999 --per-label 200
+    python upload_to_qdrant.py vectors_reduced
+"""
+import numpy as np
+from search_backend import normalize
+from vector_store import load_vectors, write_shard, shard_name
+
+
+def dedup(normed, threshold):
+    """Row indices kept by greedy near-duplicate removal at cosine similarity >= threshold"""
+    kept = []
+    kept_rows = np.empty_like(normed)
+    for i, row in enumerate(normed):
+        if kept and (kept_rows[:len(kept)] @ row).max() >= threshold:
+            continue
+        kept_rows[len(kept)] = row
+        kept.append(i)
+    return np.array(kept, dtype=np.int64)
+
+
+def farthest_point_sample(normed, k):
+    """k row indices spread over the label, in row order
+
+    Starts from the row closest to the label mean, then repeatedly adds the row
+    with the largest cosine distance to everything selected so far.
+    """
+    if k >= len(normed):
+        return np.arange(len(normed))
+    selected = [int(np.argmax(normed @ normed.mean(axis=0)))]
+    distance = 1.0 - normed @ normed[selected[0]]
+    for _ in range(k - 1):
+        nxt = int(np.argmax(distance))
+        selected.append(nxt)
+        distance = np.minimum(distance, 1.0 - normed @ normed[nxt])
+    return np.sort(np.array(selected, dtype=np.int64))
+
+
+def reduce_corpus(matrix, meta, dedup_threshold=None, per_label=None, balance=False):
+    """Selected row indices per label, plus (label, before, after dedup, after cap) report rows"""
+    labels = sorted(np.unique(meta["label"]))
+    normed = normalize(matrix)
+
+    deduped = {}
+    for label in labels:
+        rows = np.where(meta["label"] == label)[0]
+        if dedup_threshold is not None:
+            rows = rows[dedup(normed[rows], dedup_threshold)]
+        deduped[label] = rows
+
+    cap = per_label
+    if balance:
+        smallest = min(len(rows) for rows in deduped.values())
+        cap = smallest if cap is None else min(cap, smallest)
+
+    selected, report = {}, []
+    for label in labels:
+        rows = deduped[label]
+        if cap is not None:
+            rows = rows[farthest_point_sample(normed[rows], cap)]
+        selected[label] = rows
+        report.append((label, int((meta["label"] == label).sum()), len(deduped[label]), len(rows)))
+    return selected, report
+
+
+def print_report(report):
+    print(f"{'label':>12} {'before':>8} {'dedup':>8} {'after':>8}")
+    for label, before, after_dedup, after in report:
+        print(f"{label:>12} {before:8d} {after_dedup:8d} {after:8d}")
+    before = sum(r[1] for r in report)
+    after = sum(r[3] for r in report)
+    counts = [r[3] for r in report]
+    print(f"{'total':>12} {before:8d} {sum(r[2] for r in report):8d} {after:8d}  "
+          f"({1 - after / before if before else 0:.0%} smaller)")
+    if counts:
+        print(f"Per label after: min {min(counts)}, median {int(np.median(counts))}, max {max(counts)} "
+              f"(before: min {min(r[1] for r in report)}, max {max(r[1] for r in report)})")
+
+
+def _record(meta, i):
+    frame = int(meta["frame"][i])
+    timestamp = float(meta["timestamp"][i])
+    return {
+        "file": str(meta["file"][i]),
+        "frame": frame if frame >= 0 else None,
+        "timestamp": timestamp if not np.isnan(timestamp) else None,
+        "label": str(meta["label"][i]),
+        "augmentation": str(meta["augmentation"][i]),
+        "profile": str(meta["profile"][i]),
+    }
+
+
+def write_reduced(matrix, meta, selected, output_dir):
+    """One shard per label with the selected rows"""
+    for label, rows in selected.items():
+        write_shard(output_dir, shard_name(label), matrix[rows], [_record(meta, i) for i in rows])
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Deduplicate and cap a vector corpus per label")
+    parser.add_argument("input", help="vectors/ tree or vector store")
+    parser.add_argument("output_dir", nargs="?", default=None, help="Reduced store; omit to only print the report")
+    parser.add_argument("--dedup", type=float, default=None,
+                        help="Drop vectors with cosine similarity >= this to a kept one (e.g. 0.999)")
+    parser.add_argument("--per-label", type=int, default=None, help="Keep at most this many vectors per label")
+    parser.add_argument("--balance", action="store_true", help="Cap every label at the smallest label's count")
+    args = parser.parse_args()
+
+    matrix, meta = load_vectors(args.input)
+    selected, report = reduce_corpus(matrix, meta, args.dedup, args.per_label, args.balance)
+    print_report(report)
+    if args.output_dir:
+        write_reduced(matrix, meta, selected, args.output_dir)
+        print(f"Reduced corpus written to {args.output_dir}")
@@ -0,0 +1,342 @@
+"""Where recognition searches: a Qdrant collection or a local index in the process
+
+sign_api and live_sign_viewer take the backend from the environment:
+
+    search_backend=qdrant   (default) query_points against collection_name
+    search_backend=local    open the index in local_index (default vectors_index)
+
+A local exact index is built from a vectors/ tree or store:
+
+    python search_backend.py build vectors vectors_index
+
+and holds the L2-normalized corpus as one contiguous float32 matrix, memory
+mapped, so a query is one matrix-vector product plus argpartition. Scores
+are cosine similarities like Qdrant's, so thresholds carry over.
+
+local_index may also name an approximate index file from ivf_index.py;
+local_nprobe then overrides the number of partitions it scans.
+
+Either kind of index built with --dims searches a PCA projection first and
+reranks rerank_candidates rows at full dimension; for Qdrant the same comes
+from projection=projection.npz (see projection.py).
+
+prototypes=prototypes.npz puts a per-label prototype pass in front of any of
+them, which then only searches the best few labels (see prototypes.py).
+"""
+import json
+import numpy as np
+from collections import namedtuple
+from pathlib import Path
+from sign_features import FEATURE_VERSION
+
+Match = namedtuple("Match", "label score")
+
+INDEX_FILE = "index.json"
+
+
+class SearchBackend:
+    """Top-k cosine search over the sign vectors"""
+
+    name = None
+
+    def search(self, vector, top_k=5):
+        """[Match] for one vector, best first"""
+        return self.search_batch(np.asarray(vector, dtype=np.float32)[None, :], top_k)[0]
+
+    def search_batch(self, vectors, top_k=5):
+        """[[Match]] for a (batch, dim) array"""
+        raise NotImplementedError
+
+    def search_labels(self, vector, labels, top_k=5):
+        """[Match] for one vector among the points of the given labels only"""
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def describe(self):
+        """Summary for /health"""
+        return {"backend": self.name, "vectors": self.count()}
+
+    def close(self):
+        pass
+
+
+class QdrantBackend(SearchBackend):
+    """query_points against a collection or alias, with optional index-profile search params
+
+    With a projection the collection holds full and pca named vectors
+    (upload_to_qdrant.py --projection); the pca vector is searched in a
+    prefetch for `candidates` points, which are then rescored on the full one.
+    """
+
+    name = "qdrant"
+
+    def __init__(self, client, collection_name, params=None, projection=None, candidates=None):
+        self.client = client
+        self.collection_name = collection_name
+        self.params = params
+        self.projection = projection
+        self.candidates = candidates
+
+    def _query(self, vector, top_k, query_filter=None):
+        """query_points / QueryRequest arguments for one vector"""
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.projection is None:
+            return {"query": vector.tolist(), "limit": top_k}
+        from projection import FULL_VECTOR, REDUCED_VECTOR, RERANK_CANDIDATES
+        from qdrant_client.models import Prefetch
+
+        prefetch = Prefetch(query=self.projection.transform(vector).tolist(), using=REDUCED_VECTOR,
+                            limit=max(top_k, self.candidates or RERANK_CANDIDATES), params=self.params,
+                            filter=query_filter)
+        return {"query": vector.tolist(), "using": FULL_VECTOR, "prefetch": prefetch, "limit": top_k}
+
+    def search(self, vector, top_k=5):
+        results = self.client.query_points(
+            collection_name=self.collection_name,
+            search_params=self.params,
+            **self._query(vector, top_k)
+        )
+        return [Match(r.payload["label"], float(r.score)) for r in results.points]
+
+    def search_batch(self, vectors, top_k=5):
+        from qdrant_client.models import QueryRequest
+
+        requests = [QueryRequest(params=self.params, with_payload=["label"], **self._query(v, top_k)) for v in vectors]
+        responses = self.client.query_batch_points(collection_name=self.collection_name, requests=requests)
+        return [[Match(r.payload["label"], float(r.score)) for r in response.points] for response in responses]
+
+    def search_labels(self, vector, labels, top_k=5):
+        from qdrant_client.models import Filter, FieldCondition, MatchAny
+
+        # Served from the keyword index on label that upload_to_qdrant creates
+        query_filter = Filter(must=[FieldCondition(key="label", match=MatchAny(any=list(labels)))])
+        results = self.client.query_points(
+            collection_name=self.collection_name,
+            search_params=self.params,
+            query_filter=query_filter,
+            **self._query(vector, top_k, query_filter)
+        )
+        return [Match(r.payload["label"], float(r.score)) for r in results.points]
+
+    def search_excluding(self, vector, ids, top_k=5):
+        """search() as if the points ids were not there, e.g. a stored point queried without itself"""
+        from qdrant_client.models import Filter, HasIdCondition
+
+        query_filter = Filter(must_not=[HasIdCondition(has_id=list(ids))])
+        results = self.client.query_points(
+            collection_name=self.collection_name,
+            search_params=self.params,
+            query_filter=query_filter,
+            **self._query(vector, top_k, query_filter)
+        )
+        return [Match(r.payload["label"], float(r.score)) for r in results.points]
+
+    def count(self):
+        return self.client.get_collection(self.collection_name).points_count
+
+    def describe(self):
+        summary = {"backend": self.name, "collection": self.collection_name, "vectors": self.count()}
+        if self.projection is not None:
+            summary["projection"] = self.projection.dims
+        return summary
+
+
+def normalize(matrix):
+    """Rows scaled to unit length as contiguous float32; zero rows stay zero"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return np.ascontiguousarray(matrix / np.maximum(norms, 1e-12), dtype=np.float32)
+
+
+def top_k_rows(scores, top_k):
+    """(indices, scores) of the top_k columns per row, best first, via argpartition"""
+    k = min(top_k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((len(scores), 0), dtype=np.int64), np.zeros((len(scores), 0), dtype=scores.dtype)
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(k), (len(scores), k))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+def label_mask(label_codes, label_names, labels):
+    """Boolean mask of the rows whose label is one of labels"""
+    return np.isin(label_codes, np.flatnonzero(np.isin(label_names, list(labels))))
+
+
+def write_index_info(directory, info):
+    with open(Path(directory) / INDEX_FILE, "w") as f:
+        json.dump(info, f, indent=2)
+
+
+def read_index_info(directory):
+    with open(Path(directory) / INDEX_FILE) as f:
+        return json.load(f)
+
+
+class ExactIndex(SearchBackend):
+    """Brute-force cosine search over a memory-mapped, normalized matrix
+
+    Directory layout: matrix.npy (float32, rows unit length), label_codes.npy
+    and index.json with the label dictionary, profile and feature version.
+    Built with dims, projection.npz and reduced.npy hold a PCA projection and
+    the projected matrix, scanned first; `candidates` rows are reranked.
+    """
+
+    name = "exact"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.info = read_index_info(self.directory)
+        self.matrix = np.load(self.directory / "matrix.npy", mmap_mode="r")
+        self.label_codes = np.load(self.directory / "label_codes.npy")
+        self.label_names = np.array(self.info["labels"])
+        self.projection = None
+        if "projection" in self.info:
+            from projection import Projection, RERANK_CANDIDATES
+            self.projection = Projection.load(self.directory / "projection.npz")
+            self.reduced = np.load(self.directory / "reduced.npy", mmap_mode="r")
+            self.candidates = RERANK_CANDIDATES
+
+    @staticmethod
+    def build(vectors_path, directory, dims=None):
+        """Write an exact index for a vectors/ tree or store, with a dims-D projection stage if given"""
+        from vector_store import load_vectors
+
+        matrix, meta = load_vectors(vectors_path)
+        profiles = sorted(set(meta["profile"].tolist())) if len(matrix) else []
+        if len(profiles) > 1:
+            raise ValueError(f"Mixed feature profiles in {vectors_path}: {profiles}, build one index per profile")
+        return ExactIndex.write(directory, matrix, meta["label"], profiles[0] if profiles else "full", dims,
+                                source=vectors_path)
+
+    @staticmethod
+    def write(directory, matrix, row_labels, profile="full", dims=None, source=None):
+        """Write an exact index for a (rows, dim) matrix and its row labels"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        labels, codes = np.unique(row_labels, return_inverse=True) if len(matrix) else (np.array([]), [])
+        matrix = normalize(matrix)
+        np.save(directory / "matrix.npy", matrix)
+        np.save(directory / "label_codes.npy", np.asarray(codes, dtype=np.uint16))
+        extra = {}
+        if dims:
+            from projection import Projection
+            projection = Projection.fit(matrix, dims)
+            projection.save(directory / "projection.npz")
+            np.save(directory / "reduced.npy", projection.transform(matrix))
+            extra["projection"] = projection.info
+        write_index_info(directory, {
+            "kind": "exact",
+            "labels": labels.tolist(),
+            "profile": profile,
+            "dimension": int(matrix.shape[1]),
+            "count": int(len(matrix)),
+            "feature_version": FEATURE_VERSION,
+            "source": str(source),
+            **extra,
+        })
+        return ExactIndex(directory)
+
+    def search_batch(self, vectors, top_k=5):
+        queries = normalize(vectors)
+        if self.projection is None:
+            rows, row_scores = top_k_rows(queries @ self.matrix.T, top_k)
+        else:
+            from projection import rerank
+            candidates, _ = top_k_rows(self.projection.transform(queries) @ self.reduced.T, max(top_k, self.candidates))
+            rows, row_scores = zip(*(rerank(self.matrix, c, q, top_k) for c, q in zip(candidates, queries)))
+        return [
+            [Match(str(self.label_names[self.label_codes[i]]), float(s)) for i, s in zip(idx, sc)]
+            for idx, sc in zip(rows, row_scores)
+        ]
+
+    def search_labels(self, vector, labels, top_k=5):
+        # The rows of a few labels are few enough to scan at full dimension
+        rows = np.flatnonzero(label_mask(self.label_codes, self.label_names, labels))
+        positions, scores = top_k_rows((self.matrix[rows] @ normalize(vector))[None, :], top_k)
+        return [Match(str(self.label_names[self.label_codes[i]]), float(s))
+                for i, s in zip(rows[positions[0]], scores[0])]
+
+    def count(self):
+        return int(self.matrix.shape[0])
+
+    def describe(self):
+        summary = {"backend": self.name, "index": str(self.directory), "vectors": self.count(),
+                   "profile": self.info["profile"]}
+        if self.projection is not None:
+            summary.update(projection=self.projection.dims, candidates=self.candidates)
+        return summary
+
+
+# index.json "kind" -> class for index directories
+INDEX_KINDS = {"exact": ExactIndex}
+
+
+def open_index(path, profile=None):
+    """Load a local index directory or IVF index file, checking it was built for the feature profile in use"""
+    if Path(path).is_file():
+        from ivf_index import IVFIndex
+        index = IVFIndex.load(path)
+    else:
+        index = INDEX_KINDS[read_index_info(path)["kind"]](path)
+    info = index.info
+    if profile is not None and info.get("profile", "full") != profile:
+        raise ValueError(f"Index {path} holds {info.get('profile')} vectors, not {profile}")
+    if info.get("feature_version") != FEATURE_VERSION:
+        print(f"Warning: index {path} was built with feature version {info.get('feature_version')}, "
+              f"current is {FEATURE_VERSION}")
+    return index
+
+
+def backend_from_env(env, profile, qdrant=None, collection_name=None, params=None):
+    """Backend picked by the search_backend, local_*, projection, rerank_candidates and prototype*
+    entries of env (a mapping, e.g. os.environ)"""
+    kind = env.get("search_backend", "qdrant")
+    candidates = int(env["rerank_candidates"]) if env.get("rerank_candidates") else None
+    if kind == "qdrant":
+        projection = None
+        if env.get("projection"):
+            from projection import Projection
+            projection = Projection.load(env["projection"])
+        backend = QdrantBackend(qdrant, collection_name, params, projection, candidates)
+    elif kind == "local":
+        backend = open_index(env.get("local_index", "vectors_index"), profile)
+        if env.get("local_nprobe") and hasattr(backend, "nprobe"):
+            backend.nprobe = int(env["local_nprobe"])
+        if candidates and backend.projection is not None:
+            backend.candidates = candidates
+    else:
+        raise ValueError(f"Unknown search_backend '{kind}', expected qdrant or local")
+
+    if not env.get("prototypes"):
+        return backend
+    from prototypes import open_prototypes
+    # prototype_labels sets how many labels are searched; prototype_rerank=0 answers from the prototypes alone
+    return open_prototypes(
+        env["prototypes"], profile,
+        rerank=None if env.get("prototype_rerank", "1") == "0" else backend,
+        shortlist=int(env["prototype_labels"]) if env.get("prototype_labels") else None
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build and inspect local search indexes")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Exact index from a vectors/ tree or store")
+    build_parser.add_argument("vectors")
+    build_parser.add_argument("index_dir")
+    build_parser.add_argument("--dims", type=int, default=None,
+                              help="Also store a PCA projection to this many dims, searched first (see projection.py)")
+    args = parser.parse_args()
+
+    index = ExactIndex.build(args.vectors, args.index_dir, args.dims)
+    projected = f", projected to {index.projection.dims}D" if index.projection is not None else ""
+    print(f"✓ {index.count()} vectors, {len(index.label_names)} labels{projected} -> {args.index_dir}")
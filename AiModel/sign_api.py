@@ -1,14 +1,23 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import numpy as np
 import cv2
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import mediapipe as mp
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 from qdrant_client import QdrantClient
 from dotenv import load_dotenv
+from sign_features import FeatureBuilder, FEATURE_DIM, PROFILES, collection_for
+from index_profiles import search_params
+from search_backend import backend_from_env
+from landmarkers import Landmarkers, LandmarkerPool, DetectorTimings, CascadeStats, parse_gates
+from process_pool import ProcessWorkerPool, WorkerCrashed
+from feature_cache import FeatureCache
 
 load_dotenv()
 
@@ -33,53 +42,89 @@ class PredictionResult(BaseModel):
 class RecognitionResponse(BaseModel):
     predictions: List[PredictionResult]
     processing_time_ms: float
+    status: str = "ok"
+    detector_times_ms: Optional[Dict[str, float]] = None
+    cached: bool = False
+
+class ExtractionWorker:
+    """One set of landmarkers plus its feature buffers, used by one request at a time"""
+    def __init__(self, profile, parallel, hand_roi, hand_roi_min_side):
+        self.landmarkers = Landmarkers(
+            "models",
+            running_mode="image",
+            parallel=parallel,
+            hand_roi=hand_roi,
+            hand_roi_min_side=hand_roi_min_side,
+            detectors=PROFILES[profile]["detectors"]
+        )
+        self.features = FeatureBuilder(profile)
+    
+    def close(self):
+        self.landmarkers.close()
 
 class ModelState:
     def __init__(self):
-        self.hands = None
-        self.pose = None
-        self.face = None
+        self.pool = None
+        self.executor = None
+        self.process_pool = None
+        self.cache = None
+        self.cache_predictions = False
+        self.profile = "full"
+        self.cascade_gates = ()
         self.qdrant = None
         self.collection_name = "sign_vectors"
+        self.index_profile = None
+        self.search_params = None
+        self.search = None
 
 model_state = ModelState()
 
 @app.on_event("startup")
 async def load_models():
     print("Loading MediaPipe models...")
+    # feature_profile=pose_face skips the face mesh and queries its own collection;
+    # the name may be an alias, upload_to_qdrant --versioned swaps it without downtime
+    model_state.profile = os.getenv('feature_profile', 'full')
+    model_state.collection_name = os.getenv('collection_name', collection_for(model_state.profile))
+    # Query-time hnsw_ef / rescoring; must match the --index-profile the collection was built with
+    model_state.index_profile = os.getenv('index_profile') or None
+    model_state.search_params = search_params(model_state.index_profile)
+    profile = PROFILES[model_state.profile]
     
-    BaseOptions = mp.tasks.BaseOptions
-    HandLandmarker = mp.tasks.vision.HandLandmarker
-    HandLandmarkerOptions = mp.tasks.vision.HandLandmarkerOptions
-    PoseLandmarker = mp.tasks.vision.PoseLandmarker
-    PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
-    FaceLandmarker = mp.tasks.vision.FaceLandmarker
-    FaceLandmarkerOptions = mp.tasks.vision.FaceLandmarkerOptions
-    VisionRunningMode = mp.tasks.vision.RunningMode
+    # Gating detectors run first, in order; empty cascade_gates runs all of them always
+    model_state.cascade_gates = parse_gates(os.getenv('cascade_gates', ",".join(profile["gates"])))
     
-    model_state.hands = HandLandmarker.create_from_options(
-        HandLandmarkerOptions(
-            base_options=BaseOptions(model_asset_path="models/hand_landmarker.task"),
-            running_mode=VisionRunningMode.IMAGE,
-            num_hands=2,
-            min_hand_detection_confidence=0.5
-        )
-    )
-    model_state.pose = PoseLandmarker.create_from_options(
-        PoseLandmarkerOptions(
-            base_options=BaseOptions(model_asset_path="models/pose_landmarker_lite.task"),
-            running_mode=VisionRunningMode.IMAGE,
-            min_pose_detection_confidence=0.5
+    # Run hand/pose/face concurrently per image unless parallel_detect=0; the cascade
+    # gates run together first and the other detectors only for frames that pass them
+    # hand_roi=1 landmarks hands only in pose-guided crops on large uploads
+    parallel = os.getenv('parallel_detect', '1') == '1'
+    hand_roi = os.getenv('hand_roi', '0') == '1'
+    hand_roi_min_side = int(os.getenv('hand_roi_min_side', '960'))
+    
+    worker_processes = int(os.getenv('worker_processes', '0'))
+    if worker_processes > 0:
+        # One landmarker set per process, frames handed over through shared memory
+        model_state.process_pool = ProcessWorkerPool(
+            {
+                "profile": model_state.profile,
+                "parallel": parallel,
+                "hand_roi": hand_roi,
+                "hand_roi_min_side": hand_roi_min_side,
+                "cascade_gates": model_state.cascade_gates,
+            },
+            workers=worker_processes,
+            slots=int(os.getenv('frame_slots', str(2 * worker_processes)))
         )
-    )
-    model_state.face = FaceLandmarker.create_from_options(
-        FaceLandmarkerOptions(
-            base_options=BaseOptions(model_asset_path="models/face_landmarker.task"),
-            running_mode=VisionRunningMode.IMAGE,
-            num_faces=1,
-            min_face_detection_confidence=0.5
+        pool_size = worker_processes
+    else:
+        # One landmarker set per concurrent request; landmarker_pool_size defaults to the cores, up to 4
+        pool_size = int(os.getenv('landmarker_pool_size', str(min(4, os.cpu_count() or 1))))
+        model_state.pool = LandmarkerPool(
+            lambda: ExtractionWorker(model_state.profile, parallel, hand_roi, hand_roi_min_side),
+            pool_size
         )
-    )
+        # Extraction runs here, off the event loop; one thread per pooled worker
+        model_state.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="extract")
     
     print("Connecting to Qdrant...")
     qdrant_url = os.getenv('q_url', 'http://localhost:6333')
@@ -93,110 +138,79 @@ async def load_models():
         api_key=qdrant_api_key if qdrant_api_key else None
     )
     
-    print(f"✓ MediaPipe loaded")
+    # search_backend=local answers from an in-process index instead (see search_backend.py);
+    # local_index may be an IVF file from ivf_index.py, local_nprobe tunes its recall/latency
+    # projection=projection.npz searches a projected collection's pca vector first (see projection.py)
+    # prototypes=prototypes.npz narrows each search to the best few labels first (see prototypes.py)
+    model_state.search = backend_from_env(
+        os.environ, model_state.profile, model_state.qdrant, model_state.collection_name, model_state.search_params
+    )
+    
+    # Resubmitted uploads reuse their features; feature_cache_mb=0 disables the cache
+    cache_mb = float(os.getenv('feature_cache_mb', '64'))
+    if cache_mb > 0:
+        model_state.cache = FeatureCache(
+            max_bytes=int(cache_mb * 2**20),
+            ttl=float(os.getenv('feature_cache_ttl', '300'))
+        )
+        # Search results too, they can lag a reindex by up to the TTL
+        model_state.cache_predictions = os.getenv('cache_predictions', '0') == '1'
+    
+    mode = "processes" if model_state.process_pool else "threads"
+    print(f"✓ MediaPipe loaded ({pool_size} landmarker sets, {mode})")
     print(f"✓ Qdrant connected: {qdrant_url}")
+    print(f"✓ Search backend: {model_state.search.name}")
+
+@app.on_event("shutdown")
+async def close_models():
+    if model_state.executor:
+        model_state.executor.shutdown(wait=True)
+    if model_state.pool:
+        model_state.pool.close()
+    if model_state.process_pool:
+        model_state.process_pool.close()
+
+def decode_image(contents):
+    nparr = np.frombuffer(contents, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
 def extract_features(frame):
-    """Extract normalized features from frame"""
+    """Extract normalized features from frame, returns (features, rejected_by, detector_times)
+    
+    rejected_by names the detector that found nothing ("hands", "face", ...),
+    in which case features is None. Blocks until a pooled worker is free, so
+    call it from a thread, not the event loop.
+    """
+    reference = PROFILES[model_state.profile]["reference"]
     img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
     
-    hands_result = model_state.hands.detect(mp_image)
-    pose_result = model_state.pose.detect(mp_image)
-    face_result = model_state.face.detect(mp_image)
-    
-    # Extract face center
-    face_center = None
-    if face_result.face_landmarks:
-        nose = face_result.face_landmarks[0][1]
-        face_center = np.array([nose.x, nose.y, nose.z])
-    
-    if face_center is None:
-        return None
-    
-    features = []
-    
-    # Hands
-    if hands_result.hand_landmarks:
-        for hand_landmarks in hands_result.hand_landmarks:
-            wrist = np.array([hand_landmarks[0].x, hand_landmarks[0].y, hand_landmarks[0].z])
-            
-            for i in range(21):
-                lm = hand_landmarks[i]
-                point = np.array([lm.x, lm.y, lm.z])
-                wrist_dist = np.linalg.norm(point - wrist)
-                face_dist = np.linalg.norm(point - face_center)
-                rel_x = point[0] - wrist[0]
-                rel_y = point[1] - wrist[1]
-                rel_z = point[2] - wrist[2]
-                features.extend([rel_x, rel_y, rel_z, wrist_dist, face_dist])
-    else:
-        features.extend([0.0] * (21 * 5 * 2))
-    
-    if hands_result.hand_landmarks and len(hands_result.hand_landmarks) == 1:
-        features.extend([0.0] * (21 * 5))
-    
-    # Pose
-    if pose_result.pose_landmarks:
-        pose_indices = [11, 12, 13, 14, 15, 16]
-        left_shoulder = np.array([
-            pose_result.pose_landmarks[0][11].x,
-            pose_result.pose_landmarks[0][11].y,
-            pose_result.pose_landmarks[0][11].z
-        ])
-        right_shoulder = np.array([
-            pose_result.pose_landmarks[0][12].x,
-            pose_result.pose_landmarks[0][12].y,
-            pose_result.pose_landmarks[0][12].z
-        ])
+    with model_state.pool.checkout() as worker:
+        if model_state.cascade_gates:
+            results, rejected_by = worker.landmarkers.detect_cascade(
+                mp_image, gates=model_state.cascade_gates
+            )
+        else:
+            results, rejected_by = worker.landmarkers.detect(mp_image), None
+        detector_times = dict(worker.landmarkers.timings.last)
+        if rejected_by is not None:
+            return None, rejected_by, detector_times
         
-        for idx in pose_indices:
-            lm = pose_result.pose_landmarks[0][idx]
-            point = np.array([lm.x, lm.y, lm.z])
-            face_dist = np.linalg.norm(point - face_center)
-            left_dist = np.linalg.norm(point - left_shoulder)
-            right_dist = np.linalg.norm(point - right_shoulder)
-            shoulder_dist = min(left_dist, right_dist)
-            rel_x = point[0] - face_center[0]
-            rel_y = point[1] - face_center[1]
-            rel_z = point[2] - face_center[2]
-            features.extend([rel_x, rel_y, rel_z, face_dist, shoulder_dist])
-    else:
-        features.extend([0.0] * (6 * 5))
-    
-    # Face
-    if face_result.face_landmarks:
-        face_indices = [33, 263, 1, 61, 291]
-        for idx in face_indices:
-            lm = face_result.face_landmarks[0][idx]
-            point = np.array([lm.x, lm.y, lm.z])
-            rel_x = point[0] - face_center[0]
-            rel_y = point[1] - face_center[1]
-            rel_z = point[2] - face_center[2]
-            dist = np.linalg.norm(point - face_center)
-            features.extend([rel_x, rel_y, rel_z, dist])
-    else:
-        features.extend([0.0] * (5 * 4))
-    
-    return np.array(features)
+        hands_result, pose_result, face_result = results
+        features = worker.features.from_results(hands_result, pose_result, face_result)
+    return features, None if features is not None else reference, detector_times
 
 def find_matches(features, top_k=5):
     if features is None:
         return []
     
     try:
-        results = model_state.qdrant.query_points(
-            collection_name=model_state.collection_name,
-            query=features.tolist(),
-            limit=top_k
-        )
-        
         return [
-            {"label": r.payload["label"], "confidence": float(r.score)}
-            for r in results.points
+            {"label": match.label, "confidence": match.score}
+            for match in model_state.search.search(features, top_k)
         ]
     except Exception as e:
-        print(f"Qdrant error: {e}")
+        print(f"Search error ({model_state.search.name}): {e}")
         return []
 
 @app.post("/recognize/image", response_model=RecognitionResponse)
@@ -213,28 +227,71 @@ async def recognize_image(file: UploadFile = File(...), top_k: int = 5):
     try:
         # Read image
         contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
-        if frame is None:
-            raise HTTPException(status_code=400, detail="Invalid image file")
+        cache_key = cached = None
+        if model_state.cache:
+            cache_key = await run_in_threadpool(FeatureCache.key, contents)
+            cached = model_state.cache.get(cache_key)
         
-        # Extract features
-        features = extract_features(frame)
+        if cached is not None:
+            features, rejected_by, detector_times = cached.features, cached.rejected_by, None
+        else:
+            frame = await run_in_threadpool(decode_image, contents)
+            
+            if frame is None:
+                raise HTTPException(status_code=400, detail="Invalid image file")
+            
+            # Extract features off the event loop so other requests and /health keep flowing
+            if model_state.process_pool:
+                try:
+                    features, rejected_by, detector_times = await run_in_threadpool(
+                        model_state.process_pool.extract, frame
+                    )
+                except WorkerCrashed as e:
+                    raise HTTPException(status_code=503, detail=str(e))
+            else:
+                loop = asyncio.get_running_loop()
+                features, rejected_by, detector_times = await loop.run_in_executor(
+                    model_state.executor, extract_features, frame
+                )
+            
+            if cache_key is not None:
+                model_state.cache.put(cache_key, features, rejected_by)
         
-        if features is None:
-            raise HTTPException(status_code=400, detail="No face detected in image")
+        if rejected_by == PROFILES[model_state.profile]["reference"]:
+            raise HTTPException(status_code=400, detail=f"No {rejected_by} detected in image")
+        
+        if rejected_by is not None:
+            # No hands (or pose) means no sign, skip the vector search entirely
+            return RecognitionResponse(
+                predictions=[],
+                processing_time_ms=(time.time() - start) * 1000,
+                status="no_sign",
+                detector_times_ms=detector_times,
+                cached=cached is not None
+            )
         
         # Find matches
-        predictions = find_matches(features, top_k)
+        predictions = None
+        if cached is not None and model_state.cache_predictions:
+            predictions = cached.predictions.get(top_k)
+        if predictions is None:
+            predictions = await run_in_threadpool(find_matches, features, top_k)
+            # find_matches returns [] on search errors, which must not stick
+            if cache_key is not None and model_state.cache_predictions and predictions:
+                model_state.cache.put_predictions(cache_key, top_k, predictions)
         
         processing_time = (time.time() - start) * 1000
         
         return RecognitionResponse(
             predictions=predictions,
-            processing_time_ms=processing_time
+            processing_time_ms=processing_time,
+            detector_times_ms=detector_times,
+            cached=cached is not None
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -250,16 +307,16 @@ async def recognize_landmarks(request: LandmarkRequest):
     start = time.time()
     
     try:
-        if len(request.vector) != 260:
+        if len(request.vector) != FEATURE_DIM:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Expected 260D vector, got {len(request.vector)}D"
+                detail=f"Expected {FEATURE_DIM}D vector, got {len(request.vector)}D"
             )
         
-        features = np.array(request.vector)
+        features = np.array(request.vector, dtype=np.float32)
         
         # Find matches
-        predictions = find_matches(features, request.top_k)
+        predictions = await run_in_threadpool(find_matches, features, request.top_k)
         
         processing_time = (time.time() - start) * 1000
         
@@ -274,16 +331,58 @@ async def recognize_landmarks(request: LandmarkRequest):
 @app.get("/health")
 async def health():
     try:
-        collection_info = model_state.qdrant.get_collection(model_state.collection_name)
-        vector_count = collection_info.points_count
+        search = model_state.search.describe()
+        vector_count = search["vectors"]
     except:
+        search = {"backend": model_state.search.name if model_state.search else None}
         vector_count = 0
     
+    # With upload_to_qdrant --versioned the collection name is an alias for sign_vectors_v{n}
+    collection_target = None
+    try:
+        if model_state.search.name == "qdrant":
+            collection_target = next(
+                (a.collection_name for a in model_state.qdrant.get_aliases().aliases
+                 if a.alias_name == model_state.collection_name),
+                model_state.collection_name
+            )
+    except:
+        pass
+    
+    workers = model_state.pool.workers if model_state.pool else []
+    hand_roi = None
+    if workers and workers[0].landmarkers.hand_roi:
+        hand_roi = {
+            key: sum(w.landmarkers.hand_roi.stats[key] for w in workers)
+            for key in workers[0].landmarkers.hand_roi.stats
+        }
+    
+    if model_state.process_pool:
+        parallel = model_state.process_pool.config["parallel"]
+        detector_avg_ms = model_state.process_pool.timings.averages()
+        cascade = model_state.process_pool.cascade.as_dict()
+    else:
+        parallel = workers[0].landmarkers.parallel if workers else False
+        detector_avg_ms = DetectorTimings.merge([w.landmarkers.timings for w in workers])
+        cascade = CascadeStats.merge([w.landmarkers.cascade for w in workers])
+    
     return {
         "status": "healthy",
         "qdrant_connected": model_state.qdrant is not None,
         "collection": model_state.collection_name,
-        "vectors_count": vector_count
+        "collection_target": collection_target,
+        "index_profile": model_state.index_profile,
+        "search": search,
+        "feature_profile": model_state.profile,
+        "vectors_count": vector_count,
+        "parallel_detection": parallel,
+        "hand_roi": hand_roi,
+        "detector_avg_ms": detector_avg_ms,
+        "cascade_gates": list(model_state.cascade_gates),
+        "cascade": cascade,
+        "pool": model_state.pool.metrics() if model_state.pool else None,
+        "worker_processes": model_state.process_pool.metrics() if model_state.process_pool else None,
+        "feature_cache": model_state.cache.stats() if model_state.cache else None
     }
 
 @app.get("/")
@@ -0,0 +1,201 @@
+import numpy as np
+
+# Landmark layout of the 260D feature vector
+HAND_POINTS = 21
+MAX_HANDS = 2
+POSE_INDICES = [11, 12, 13, 14, 15, 16]  # shoulders, elbows, wrists
+FACE_INDICES = [33, 263, 1, 61, 291]     # left eye, right eye, nose, mouth left, mouth right
+NOSE_INDEX = 1
+
+# Pose landmarks at the same spots as FACE_INDICES / NOSE_INDEX, for the pose_face profile:
+# right eye outer, left eye outer, nose, mouth right, mouth left
+POSE_FACE_INDICES = [6, 3, 0, 10, 9]
+POSE_NOSE_INDEX = 0
+
+# Extraction profiles: which detectors run and which gates the recognition cascade uses.
+# Both give the same 260D layout, but their vectors are not comparable and each
+# profile needs its own collection (see collection_for).
+PROFILES = {
+    # Face reference and face points from the 478-point face mesh
+    "full": {"detectors": ("hands", "pose", "face"), "reference": "face", "gates": ("hands", "face")},
+    # Face reference and face points from pose landmarks, no face mesh at all
+    "pose_face": {"detectors": ("hands", "pose"), "reference": "pose", "gates": ("hands", "pose")},
+}
+
+# Row order of POSE_INDICES / FACE_INDICES after a horizontal flip (left <-> right)
+POSE_MIRROR = [1, 0, 3, 2, 5, 4]
+FACE_MIRROR = [1, 0, 2, 4, 3]
+
+HAND_DIM = HAND_POINTS * 5 * MAX_HANDS   # 210
+POSE_DIM = len(POSE_INDICES) * 5         # 30
+FACE_DIM = len(FACE_INDICES) * 4         # 20
+FEATURE_DIM = HAND_DIM + POSE_DIM + FACE_DIM
+
+# Bump whenever the vector layout or normalization changes; stored in vectorizer manifests
+FEATURE_VERSION = 1
+
+
+def _fill(buffer, landmarks, indices=None):
+    """Copy (x, y, z) of MediaPipe landmarks into a preallocated (N,3) array"""
+    if indices is None:
+        for i, lm in enumerate(landmarks):
+            buffer[i, 0] = lm.x
+            buffer[i, 1] = lm.y
+            buffer[i, 2] = lm.z
+    else:
+        for i, idx in enumerate(indices):
+            lm = landmarks[idx]
+            buffer[i, 0] = lm.x
+            buffer[i, 1] = lm.y
+            buffer[i, 2] = lm.z
+    return buffer
+
+
+def build_features(hand_points, num_hands, pose_points, face_points, face_center, out=None):
+    """Build the 260D vector from packed landmark arrays
+
+    hand_points: (MAX_HANDS, 21, 3), only the first num_hands rows are used
+    pose_points: (6, 3) for POSE_INDICES, or None when no pose was found
+    face_points: (5, 3) for FACE_INDICES, or None when no face was found
+    face_center: (3,) reference point (nose tip)
+    """
+    if out is None:
+        out = np.zeros(FEATURE_DIM, dtype=np.float32)
+    else:
+        out.fill(0.0)
+
+    # Hands (210D): relative to wrist, distance to wrist, distance to face
+    if num_hands:
+        hands = hand_points[:num_hands]
+        rel = hands - hands[:, :1, :]
+        hand_block = out[:num_hands * HAND_POINTS * 5].reshape(num_hands, HAND_POINTS, 5)
+        hand_block[..., :3] = rel
+        hand_block[..., 3] = np.sqrt(np.einsum('hpc,hpc->hp', rel, rel))
+        to_face = hands - face_center
+        hand_block[..., 4] = np.sqrt(np.einsum('hpc,hpc->hp', to_face, to_face))
+
+    # Pose (30D): relative to face, distance to face, distance to nearest shoulder
+    if pose_points is not None:
+        pose_block = out[HAND_DIM:HAND_DIM + POSE_DIM].reshape(len(POSE_INDICES), 5)
+        rel = pose_points - face_center
+        pose_block[:, :3] = rel
+        pose_block[:, 3] = np.sqrt(np.einsum('pc,pc->p', rel, rel))
+        to_shoulders = pose_points[:, None, :] - pose_points[None, :2, :]
+        pose_block[:, 4] = np.sqrt(np.einsum('psc,psc->ps', to_shoulders, to_shoulders)).min(axis=1)
+
+    # Face (20D): relative to face center, distance to face center
+    if face_points is not None:
+        face_block = out[HAND_DIM + POSE_DIM:].reshape(len(FACE_INDICES), 4)
+        rel = face_points - face_center
+        face_block[:, :3] = rel
+        face_block[:, 3] = np.sqrt(np.einsum('pc,pc->p', rel, rel))
+
+    return out
+
+
+def collection_for(profile, base="sign_vectors"):
+    """Qdrant collection holding vectors of a profile: sign_vectors, sign_vectors_pose_face, ..."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown feature profile '{profile}', expected one of {tuple(PROFILES)}")
+    return base if profile == "full" else f"{base}_{profile}"
+
+
+def mirror_features(features):
+    """260D vector of the horizontally flipped frame, without running detection again
+
+    Flipping maps x -> 1 - x, so every x offset changes sign while y, z and all
+    distances stay the same. Pose and face points swap left/right (MediaPipe
+    labels them anatomically). Hand slots keep their order: the hand landmarker
+    returns hands in detection order, not by side, so there is no slot to swap.
+    """
+    out = np.array(features, dtype=np.float32)
+
+    hands = out[:HAND_DIM].reshape(MAX_HANDS, HAND_POINTS, 5)
+    hands[..., 0] = 0.0 - hands[..., 0]
+
+    pose = out[HAND_DIM:HAND_DIM + POSE_DIM].reshape(len(POSE_INDICES), 5)
+    pose[:] = pose[POSE_MIRROR]
+    pose[:, 0] = 0.0 - pose[:, 0]
+
+    face = out[HAND_DIM + POSE_DIM:].reshape(len(FACE_INDICES), 4)
+    face[:] = face[FACE_MIRROR]
+    face[:, 0] = 0.0 - face[:, 0]
+
+    return out
+
+
+class FeatureBuilder:
+    """Packs MediaPipe results into preallocated arrays and builds the 260D vector
+
+    One builder per landmarker set; the buffers are reused across frames, so the
+    returned vector is a fresh copy that is safe to keep.
+    """
+
+    def __init__(self, profile="full"):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown feature profile '{profile}', expected one of {tuple(PROFILES)}")
+        self.profile = profile
+        self.hand_points = np.zeros((MAX_HANDS, HAND_POINTS, 3), dtype=np.float32)
+        self.pose_points = np.zeros((len(POSE_INDICES), 3), dtype=np.float32)
+        self.face_points = np.zeros((len(FACE_INDICES), 3), dtype=np.float32)
+        self.face_center = np.zeros(3, dtype=np.float32)
+
+    def from_results(self, hands_result, pose_result, face_result=None):
+        """Build features from hand/pose/face detection results, None without a face
+
+        With the pose_face profile the face comes from the pose, face_result is
+        not used and a frame without a pose returns None.
+        """
+        if self.profile == "pose_face":
+            if not pose_result.pose_landmarks:
+                return None
+            face_landmarks = pose_result.pose_landmarks[0]
+            _fill(self.face_points, face_landmarks, POSE_FACE_INDICES)
+            nose = face_landmarks[POSE_NOSE_INDEX]
+        else:
+            if not face_result.face_landmarks:
+                return None
+            face_landmarks = face_result.face_landmarks[0]
+            _fill(self.face_points, face_landmarks, FACE_INDICES)
+            nose = face_landmarks[NOSE_INDEX]
+        self.face_center[:] = (nose.x, nose.y, nose.z)
+
+        num_hands = min(len(hands_result.hand_landmarks), MAX_HANDS)
+        for h in range(num_hands):
+            _fill(self.hand_points[h], hands_result.hand_landmarks[h])
+
+        pose_points = None
+        if pose_result.pose_landmarks:
+            pose_points = _fill(self.pose_points, pose_result.pose_landmarks[0], POSE_INDICES)
+
+        return build_features(
+            self.hand_points, num_hands, pose_points, self.face_points, self.face_center
+        )
+
+    def from_landmarks(self, hand_points, num_hands, pose_landmarks, face_landmarks):
+        """from_results on packed arrays, e.g. rows of a landmark archive
+
+        hand_points: (MAX_HANDS, 21, 3); pose_landmarks: (33, >=3) and
+        face_landmarks: (478, 3) hold every point of the first pose / face, or
+        are None when nothing was detected.
+        """
+        if self.profile == "pose_face":
+            if pose_landmarks is None:
+                return None
+            self.face_points[:] = pose_landmarks[POSE_FACE_INDICES, :3]
+            self.face_center[:] = pose_landmarks[POSE_NOSE_INDEX, :3]
+        else:
+            if face_landmarks is None:
+                return None
+            self.face_points[:] = face_landmarks[FACE_INDICES, :3]
+            self.face_center[:] = face_landmarks[NOSE_INDEX, :3]
+
+        pose_points = None
+        if pose_landmarks is not None:
+            pose_points = self.pose_points
+            pose_points[:] = pose_landmarks[POSE_INDICES, :3]
+
+        return build_features(
+            hand_points, num_hands, pose_points, self.face_points, self.face_center
+        )
+
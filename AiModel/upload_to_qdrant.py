@@ -1,16 +1,202 @@
+import hashlib
 import json
 import os
-from pathlib import Path
+import posixpath
+import re
+import resource
+import sqlite3
+import tempfile
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain, islice
+from multiprocessing import Pool
+from pathlib import Path, PureWindowsPath
+import numpy as np
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import (
+    PointStruct, PointIdsList, CollectionStatus, PayloadSchemaType,
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation, SampleQuery, Sample
+)
 from dotenv import load_dotenv
+from vector_store import VectorStore
+from index_profiles import INDEX_PROFILES, collection_config, search_params
+from projection import Projection, FULL_VECTOR, REDUCED_VECTOR
+from search_backend import QdrantBackend, normalize
 
 load_dotenv()
 
-def upload_vectors_to_qdrant(vectors_dir="vectors", collection_name="sign_vectors", batch_size=100):
-    """Upload all vectors from JSON files to Qdrant"""
+# JSON files handed to the parse pool at a time; bounds how far parsing runs ahead of the uploads
+PARSE_WINDOW = 2048
+
+# Points sampled by the smoke test, how far below the exact leave-one-out top-1 it may score,
+# and the top-1 no collection may fall below, whatever its exact figure (e.g. mixed-up labels)
+SMOKE_QUERIES = 200
+SMOKE_SLACK = 0.03
+SMOKE_FLOOR = 0.5
+
+# Point IDs are UUIDv5 names in this namespace, see point_id
+POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "sign_vectors")
+
+def source_key(file, data_root="."):
+    """file as a POSIX path relative to data_root, the form point IDs are made from
+    
+    The vectorizers store whatever path they were given, so one clip can be
+    'data/a.mov', './data/a.mov', '/home/me/AiModel/data/a.mov' or
+    'data\\a.mov'. Absolute paths outside data_root stay absolute.
+    """
+    if not file:
+        return file
+    path = file.replace("\\", "/")
+    if posixpath.isabs(path) or PureWindowsPath(path).drive:
+        root = data_root.replace("\\", "/")
+        if not (posixpath.isabs(root) or PureWindowsPath(root).drive):
+            root = Path(root).resolve().as_posix()
+        root = posixpath.normpath(root)
+        if posixpath.normpath(path).startswith(root.rstrip("/") + "/"):
+            path = posixpath.relpath(posixpath.normpath(path), root)
+    return posixpath.normpath(path)
+
+def point_id(file, frame, augmentation):
+    """Stable point ID of a vector: the same source frame and augmentation always maps to the same point
+    
+    file is expected in source_key form.
+    """
+    frame = "" if frame is None else frame
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{file}|{frame}|{augmentation}"))
+
+def vector_hash(vector, salt=""):
+    """Digest of the float32 vector, stored in the payload to tell changed vectors from unchanged ones
+    
+    A projected collection salts it with the projection's digest, so a new projection rewrites every point.
+    """
+    digest = hashlib.blake2b(salt.encode(), digest_size=8)
+    digest.update(np.asarray(vector, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+def _vector_sizes(vectors_config):
+    """{vector name: size} of a collection's vectors; the unnamed vector is None"""
+    if isinstance(vectors_config, dict):
+        return {name: params.size for name, params in vectors_config.items()}
+    return {None: vectors_config.size}
+
+def _layout(sizes):
+    return " + ".join(f"{name} {size}D" if name else f"{size}D" for name, size in sizes.items())
+
+def _keyed(vec, data_root="."):
+    vec["file"] = source_key(vec["file"], data_root)
+    vec["id"] = point_id(vec["file"], vec["frame"], vec["augmentation"])
+    vec["vector_hash"] = vector_hash(vec["vector"])
+    return vec
+
+def _load_json(json_file, data_root="."):
+    """(path, point fields) of one vector file, or (path, error message)"""
+    try:
+        with open(json_file) as f:
+            data = json.load(f)
+        return json_file, _keyed({
+            "vector": data["vector"],
+            "label": data["label"],
+            "file": data.get("file", ""),
+            "augmentation": data.get("augmentation", "original"),
+            "frame": data.get("frame"),
+            "timestamp": data.get("timestamp"),
+            "profile": data.get("profile", "full")
+        }, data_root)
+    except Exception as e:
+        return json_file, f"{type(e).__name__}: {e}"
+
+def _json_files(root):
+    """Vector JSON files under root in path order, without Path.rglob's set of every path seen"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(".json"):
+                yield Path(dirpath) / name
+
+def iter_vectors(vectors_dir, workers=None, data_root="."):
+    """Point fields of every vector under vectors_dir, streamed
+    
+    A store is read shard by shard from memory-mapped files. JSON files are
+    parsed on a process pool, PARSE_WINDOW files at a time, so memory stays
+    flat however large the corpus is. Source paths are made relative to
+    data_root, see source_key.
+    """
+    vectors_path = Path(vectors_dir)
     
-    # Connect to Qdrant
+    if VectorStore.is_store(vectors_path):
+        # Shards written with --format store (see vector_store.py)
+        store = VectorStore(vectors_path)
+        print(f"Reading vector store: {len(store.shards)} shards")
+        for record in store.records():
+            yield _keyed({
+                "vector": record["vector"].tolist(),
+                "label": record["label"],
+                "file": record["file"],
+                "augmentation": record["augmentation"],
+                "frame": record["frame"],
+                "timestamp": record["timestamp"],
+                "profile": record["profile"]
+            }, data_root)
+        return
+    
+    json_files = _json_files(vectors_path)
+    window = list(islice(json_files, PARSE_WINDOW))
+    if not window:
+        return
+    with Pool(workers or os.cpu_count()) as pool:
+        while window:
+            for json_file, vec in pool.imap(partial(_load_json, data_root=data_root), window, chunksize=64):
+                if isinstance(vec, str):
+                    print(f"Error loading {json_file}: {vec}")
+                else:
+                    yield vec
+            window = list(islice(json_files, PARSE_WINDOW))
+
+def _batches(items, size):
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+def _stored_hashes(client, collection_name, ids):
+    """{point id: vector_hash} of those of ids already in a collection"""
+    records = client.retrieve(collection_name, ids, with_payload=["vector_hash"], with_vectors=False)
+    return {str(record.id): (record.payload or {}).get("vector_hash") for record in records}
+
+def _delete_unseen(client, collection_name, seen, page=500):
+    """Delete points whose IDs are not in the seen table, one scroll page at a time; returns how many"""
+    deleted = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name, limit=page, offset=offset, with_payload=False, with_vectors=False
+        )
+        ids = [str(record.id) for record in records]
+        found = {row[0] for row in seen.execute(
+            f"SELECT id FROM ids WHERE id IN ({','.join('?' * len(ids))})", ids
+        )} if ids else set()
+        stale = [record.id for record in records if str(record.id) not in found]
+        if stale:
+            client.delete(collection_name, points_selector=PointIdsList(points=stale))
+            deleted += len(stale)
+        if offset is None:
+            return deleted
+
+def is_local(client):
+    """True for an embedded client (path= or ':memory:'), which is not thread-safe"""
+    options = getattr(client, "init_options", None) or {}
+    return options.get("location") == ":memory:" or options.get("path") is not None
+
+def connect():
+    """QdrantClient for q_url / q_api from the environment"""
     qdrant_url = os.getenv('q_url', 'http://localhost:6333')
     qdrant_api_key = os.getenv('q_api', '')
     
@@ -23,83 +209,412 @@ def upload_vectors_to_qdrant(vectors_dir="vectors", collection_name="sign_vector
     )
     
     print(f"Connected to Qdrant: {qdrant_url}")
+    return client
+
+def upload_vectors_to_qdrant(vectors_dir="vectors", collection_name="sign_vectors", batch_size=100,
+                             workers=None, concurrency=4, recreate=False, client=None, index_profile=None,
+                             projection=None, data_root="."):
+    """Stream all vectors under vectors_dir into Qdrant
     
-    # Load all vectors
-    print("Loading vectors from JSON files...")
-    vectors_path = Path(vectors_dir)
-    all_vectors = []
-    
-    for json_file in vectors_path.rglob("*.json"):
-        try:
-            with open(json_file) as f:
-                data = json.load(f)
-                all_vectors.append({
-                    "id": str(json_file),
-                    "vector": data["vector"],
-                    "label": data["label"],
-                    "file": data.get("file", ""),
-                    "augmentation": data.get("augmentation", "original"),
-                    "frame": data.get("frame"),
-                    "timestamp": data.get("timestamp")
-                })
-        except Exception as e:
-            print(f"Error loading {json_file}: {e}")
-    
-    print(f"Loaded {len(all_vectors)} vectors")
-    
-    if not all_vectors:
+    Files are parsed on `workers` processes while up to `concurrency` upsert
+    batches are in flight; at most twice that many batches wait in memory.
+    
+    Point IDs come from (file, frame, augmentation), with file relative to
+    data_root (see source_key), so an existing collection is updated in place: only new or changed vectors are upserted and points
+    whose vectors are gone are deleted. Stored hashes are fetched batch by
+    batch and the IDs seen are kept in a temporary SQLite file, so memory
+    stays flat on updates too. recreate drops the collection first.
+    
+    index_profile (see index_profiles.py) sets HNSW, quantization and storage
+    of a new collection; an existing one keeps the settings it was built with.
+    
+    With a projection (see projection.py) each point holds the vector as
+    `full` and its projection as `pca`, and the services need the same
+    projection file to search it.
+    
+    Returns the number of points the collection should now hold, None when
+    the upload was refused or stopped early.
+    """
+    if client is None:
+        client = connect()
+    if concurrency > 1 and is_local(client):
+        # Concurrent upserts break the embedded client's point bookkeeping
+        print(f"Local Qdrant client: upserting one batch at a time instead of {concurrency}")
+        concurrency = 1
+    
+    vectors = iter_vectors(vectors_dir, workers, data_root)
+    first = next(vectors, None)
+    if first is None:
         print("No vectors found!")
         return
     
-    # Get vector dimension
-    vector_dim = len(all_vectors[0]["vector"])
-    print(f"Vector dimension: {vector_dim}D")
+    # Vectors of different feature profiles are not comparable; the first one decides
+    profile = first["profile"]
+    vector_dim = len(first["vector"])
+    print(f"Vector dimension: {vector_dim}D, profile: {profile}")
     
-    # Create or recreate collection
-    try:
+    updating = False
+    if recreate and client.collection_exists(collection_name):
         client.delete_collection(collection_name)
         print(f"Deleted existing collection: {collection_name}")
-    except:
-        pass
-    
-    client.create_collection(
-        collection_name=collection_name,
-        vectors_config=VectorParams(size=vector_dim, distance=Distance.COSINE)
-    )
-    print(f"Created collection: {collection_name}")
     
-    # Upload in batches
-    print(f"Uploading vectors in batches of {batch_size}...")
+    wanted = {None: vector_dim} if projection is None else {FULL_VECTOR: vector_dim, REDUCED_VECTOR: projection.dims}
+    if client.collection_exists(collection_name):
+        sizes = _vector_sizes(client.get_collection(collection_name).config.params.vectors)
+        if sizes != wanted:
+            print(f"Collection {collection_name} holds {_layout(sizes)} vectors, not {_layout(wanted)}; use --recreate")
+            return
+        updating = True
+        print(f"Updating collection: {collection_name} ({client.count(collection_name, exact=True).count} points)")
+        if index_profile is not None:
+            print(f"Index profile {index_profile} is not applied to an existing collection, use --recreate or --versioned")
+    else:
+        client.create_collection(
+            collection_name=collection_name,
+            **collection_config(index_profile, vector_dim, projection.dims if projection is not None else None)
+        )
+        # Keyword index for the label filter of the prototype stage (see prototypes.py)
+        client.create_payload_index(collection_name, field_name="label", field_schema=PayloadSchemaType.KEYWORD)
+        print(f"Created collection: {collection_name}" + (f" (index profile {index_profile})" if index_profile else ""))
     
-    for i in range(0, len(all_vectors), batch_size):
-        batch = all_vectors[i:i+batch_size]
-        
+    def upsert(batch):
+        """Writes the new or changed vectors of a batch, returns (upserted, unchanged)"""
+        unchanged = 0
+        if updating:
+            # Stored hashes of this batch only, not of the whole collection
+            stored = _stored_hashes(client, collection_name, [vec["id"] for vec in batch])
+            fresh = [vec for vec in batch if stored.get(vec["id"]) != vec["vector_hash"]]
+            unchanged, batch = len(batch) - len(fresh), fresh
+        if not batch:
+            return 0, unchanged
+        vectors = [vec["vector"] for vec in batch]
+        if projection is not None:
+            reduced = projection.transform(np.asarray(vectors, dtype=np.float32))
+            vectors = [{FULL_VECTOR: vector, REDUCED_VECTOR: r.tolist()} for vector, r in zip(vectors, reduced)]
         points = [
             PointStruct(
-                id=idx + i,
-                vector=vec["vector"],
+                id=vec["id"],
+                vector=vector,
                 payload={
                     "label": vec["label"],
                     "file": vec["file"],
                     "augmentation": vec["augmentation"],
                     "frame": vec["frame"],
-                    "timestamp": vec["timestamp"]
+                    "timestamp": vec["timestamp"],
+                    "profile": vec["profile"],
+                    "vector_hash": vec["vector_hash"]
                 }
             )
-            for idx, vec in enumerate(batch)
+            for vec, vector in zip(batch, vectors)
         ]
-        
         client.upsert(collection_name=collection_name, points=points)
-        print(f"Uploaded {i+len(batch)}/{len(all_vectors)} vectors")
+        return len(points), unchanged
+    
+    print(f"Uploading vectors in batches of {batch_size}, {concurrency} in flight...")
+    started = time.perf_counter()
+    uploaded = 0
+    total = 0
+    pending = deque()
+    stats = {"unchanged": 0, "mixed": None}
+    
+    # IDs of this upload, on disk, to find the points whose vectors are gone; a new collection has none
+    seen_dir = tempfile.TemporaryDirectory(prefix="upload_ids_") if updating else None
+    seen = sqlite3.connect(os.path.join(seen_dir.name, "ids.db")) if updating else None
+    if seen is not None:
+        seen.execute("CREATE TABLE ids (id TEXT PRIMARY KEY) WITHOUT ROWID")
+    
+    def accepted(vectors):
+        for vec in vectors:
+            if vec["profile"] != profile:
+                stats["mixed"] = vec["profile"]
+                return
+            if projection is not None:
+                vec["vector_hash"] = vector_hash(vec["vector"], projection.digest)
+            yield vec
+    
+    def collect():
+        nonlocal uploaded
+        done, unchanged = pending.popleft().result()
+        stats["unchanged"] += unchanged
+        if (uploaded + done) // 5000 > uploaded // 5000:
+            elapsed = time.perf_counter() - started
+            print(f"Uploaded {uploaded + done} vectors ({(uploaded + done) / elapsed:.0f} points/s)")
+        uploaded += done
+    
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upsert") as executor:
+            for batch in _batches(accepted(chain([first], vectors)), batch_size):
+                total += len(batch)
+                if seen is not None:
+                    seen.executemany("INSERT OR IGNORE INTO ids VALUES (?)", [(vec["id"],) for vec in batch])
+                while len(pending) >= concurrency * 2:
+                    collect()
+                pending.append(executor.submit(upsert, batch))
+            while pending:
+                collect()
+        vectors.close()
+        
+        if stats["mixed"] is not None:
+            # Only part of the corpus was seen, so nothing may be deleted
+            print(f"Mixed feature profiles in {vectors_dir}: {sorted({profile, stats['mixed']})}, "
+                  f"upload each to its own collection; stopped after {total} vectors")
+            return
+        
+        # Points whose source vectors disappeared, including integer IDs from older uploads
+        stale = _delete_unseen(client, collection_name, seen) if seen is not None else 0
+    finally:
+        if seen is not None:
+            seen.close()
+            seen_dir.cleanup()
     
-    print(f"\n✓ Successfully uploaded {len(all_vectors)} vectors to Qdrant!")
+    elapsed = time.perf_counter() - started
+    print(f"\n✓ Upserted {uploaded} vectors to Qdrant, {stats['unchanged']} unchanged, {stale} deleted")
     print(f"Collection: {collection_name}")
-    print(f"Dimension: {vector_dim}D")
+    print(f"Dimension: {_layout(wanted)}")
+    print(f"Throughput: {uploaded / elapsed:.0f} points/s over {elapsed:.1f}s")
+    print(f"Peak RSS: {_peak_rss_mb():.0f} MB (parse workers: {_peak_rss_mb(resource.RUSAGE_CHILDREN):.0f} MB)")
+    return total
+
+def alias_target(client, alias):
+    """Collection an alias points to, None if there is no such alias"""
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+def versions(client, alias, status=None):
+    """Versioned collections of an alias, oldest first: [(n, 'sign_vectors_v{n}')]
+    
+    status keeps only versions whose smoke test is recorded as that, see version_status.
+    """
+    pattern = re.compile(rf"{re.escape(alias)}_v(\d+)")
+    found = []
+    for collection in client.get_collections().collections:
+        match = pattern.fullmatch(collection.name)
+        if match and (status is None or version_status(client, collection.name) == status):
+            found.append((int(match.group(1)), collection.name))
+    return sorted(found)
+
+def version_status(client, collection_name):
+    """'passed' or 'failed' as publish_version recorded it in the collection metadata, None without a record"""
+    return (client.get_collection(collection_name).config.metadata or {}).get("smoke_test")
+
+def _record_status(client, collection_name, status):
+    client.update_collection(collection_name, metadata={"smoke_test": status})
+
+def _version_number(collection_name):
+    return int(collection_name.rsplit("_v", 1)[1])
+
+def wait_indexed(client, collection_name, timeout=600.0):
+    """Wait until Qdrant has finished optimizing a collection, so the first searches are not slow"""
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection_name).status != CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(1.0)
+    return True
+
+def _leave_one_out_top1(client, collection_name, records, vector_name=None, page=1000):
+    """Labels of the exact nearest other point of each record, scanning the stored vectors page by page"""
+    queries = normalize(np.array([r.vector[vector_name] if vector_name else r.vector for r in records]))
+    query_ids = [str(r.id) for r in records]
+    best = np.full(len(records), -np.inf, dtype=np.float32)
+    labels = [None] * len(records)
+    offset = None
+    while True:
+        page_records, offset = client.scroll(
+            collection_name, limit=page, offset=offset, with_payload=["label"],
+            with_vectors=[vector_name] if vector_name else True
+        )
+        if page_records:
+            matrix = normalize(np.array([r.vector[vector_name] if vector_name else r.vector for r in page_records]))
+            scores = queries @ matrix.T
+            page_ids = np.array([str(r.id) for r in page_records])
+            scores[np.array(query_ids)[:, None] == page_ids[None, :]] = -np.inf
+            top = scores.argmax(axis=1)
+            better = scores[np.arange(len(records)), top] > best
+            for i in np.flatnonzero(better):
+                best[i] = scores[i, top[i]]
+                labels[i] = page_records[top[i]].payload["label"]
+        if offset is None:
+            return labels
+
+def smoke_test(client, collection_name, expected_points, queries=SMOKE_QUERIES, min_top1=None, params=None,
+               projection=None):
+    """Check a collection before it goes live
+    
+    The point count must match and a random sample of its own points, queried
+    back the way the services query but with each point itself left out, must
+    find their own label first in at least min_top1 of the cases. Leaving the
+    point out makes the neighbouring frames answer, which a broken index gets
+    wrong.
+    
+    How often the neighbours share the label depends on the corpus (a reduced
+    corpus has fewer near-duplicates), so without min_top1 the bar is the
+    exact leave-one-out top-1 of the same sample, over the stored vectors,
+    less SMOKE_SLACK for approximate search, but at least SMOKE_FLOOR.
+    """
+    count = client.count(collection_name, exact=True).count
+    if count != expected_points:
+        print(f"✗ Smoke test: {count} points, expected {expected_points}")
+        return False
+    
+    vector_name = FULL_VECTOR if projection is not None else None
+    backend = QdrantBackend(client, collection_name, params, projection)
+    records = client.query_points(
+        collection_name, query=SampleQuery(sample=Sample.RANDOM), limit=queries, with_payload=["label"],
+        with_vectors=[vector_name] if vector_name else True
+    ).points
+    hits = 0
+    latencies = []
+    for record in records:
+        vector = record.vector[vector_name] if vector_name else record.vector
+        start = time.perf_counter()
+        matches = backend.search_excluding(vector, [record.id], 1)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += bool(matches) and matches[0].label == record.payload["label"]
+    
+    bar = ""
+    if min_top1 is None:
+        exact = sum(label == r.payload["label"]
+                    for label, r in zip(_leave_one_out_top1(client, collection_name, records, vector_name), records))
+        min_top1 = max(exact / len(records) - SMOKE_SLACK, SMOKE_FLOOR) if records else 1.0
+        bar = f"exact {exact}/{len(records)}, "
+    top1 = hits / len(records) if records else 0.0
+    p50 = float(np.median(latencies)) if latencies else 0.0
+    print(f"{'✓' if top1 >= min_top1 else '✗'} Smoke test: {count} points, "
+          f"top-1 own label {hits}/{len(records)} ({bar}needs {min_top1:.1%}), p50 {p50:.1f} ms")
+    return top1 >= min_top1
+
+def swap_alias(client, alias, collection_name):
+    """Point alias at collection_name in one atomic alias update"""
+    operations = []
+    if alias_target(client, alias) is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=alias)))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"✓ {alias} -> {collection_name}")
+
+def publish_version(vectors_dir="vectors", alias="sign_vectors", keep=3, client=None, smoke_queries=SMOKE_QUERIES,
+                    smoke_min_top1=None, **options):
+    """Build the next sign_vectors_v{n}, smoke-test it and move the alias to it
+    
+    Services query the alias, which keeps serving the previous version until
+    the new one is uploaded, indexed and checked. The outcome is recorded in
+    the collection metadata (see version_status); the newest `keep` versions
+    that passed stay for rollback, a failed build stays for inspection until
+    the next version goes live. smoke_queries and smoke_min_top1 are passed
+    to smoke_test.
+    """
+    if client is None:
+        client = connect()
+    
+    # collection_exists also answers for aliases, only the collection list tells them apart
+    legacy = any(collection.name == alias for collection in client.get_collections().collections)
+    if legacy:
+        # A plain collection from before versioning; the name has to become the alias
+        print(f"{alias} is a collection, not an alias; it is replaced when the new version goes live")
+    
+    existing = versions(client, alias)
+    version = existing[-1][0] + 1 if existing else 1
+    collection_name = f"{alias}_v{version}"
+    print(f"Building {collection_name}")
+    
+    def failed(reason):
+        if client.collection_exists(collection_name):
+            _record_status(client, collection_name, "failed")
+        print(f"✗ {collection_name} {reason}, alias not moved")
+    
+    expected = upload_vectors_to_qdrant(vectors_dir, collection_name, recreate=True, client=client, **options)
+    if expected is None:
+        failed("was not uploaded completely")
+        return None
+    if not wait_indexed(client, collection_name):
+        failed("is still being indexed")
+        return None
+    if not smoke_test(client, collection_name, expected, smoke_queries, smoke_min_top1,
+                      params=search_params(options.get("index_profile")), projection=options.get("projection")):
+        failed("kept for inspection")
+        return None
+    
+    _record_status(client, collection_name, "passed")
+    if legacy:
+        client.delete_collection(alias)
+    swap_alias(client, alias, collection_name)
+    prune_versions(client, alias, keep)
+    return collection_name
+
+def rollback(alias="sign_vectors", client=None):
+    """Point alias back at the newest version older than the live one that passed its smoke test"""
+    if client is None:
+        client = connect()
+    live = alias_target(client, alias)
+    older = [name for n, name in versions(client, alias, status="passed")
+             if live is None or n < _version_number(live)]
+    if not older:
+        print(f"No passed version older than {live} to roll back to")
+        return None
+    swap_alias(client, alias, older[-1])
+    return older[-1]
+
+def prune_versions(client, alias, keep):
+    """Delete all but the newest `keep` passed versions and failed builds older than the live one
+    
+    The live version is never deleted, nor are versions without a recorded
+    smoke test (built before it was recorded, or interrupted).
+    """
+    live = alias_target(client, alias)
+    passed = versions(client, alias, status="passed")
+    doomed = [name for _, name in passed[:-keep]]
+    if live is not None:
+        doomed += [name for n, name in versions(client, alias, status="failed") if n < _version_number(live)]
+    for name in doomed:
+        if name != live:
+            client.delete_collection(name)
+            print(f"Deleted old version: {name}")
 
 if __name__ == "__main__":
-    import sys
+    import argparse
     
-    vectors_dir = sys.argv[1] if len(sys.argv) > 1 else "vectors"
-    collection_name = sys.argv[2] if len(sys.argv) > 2 else "sign_vectors"
+    parser = argparse.ArgumentParser(description="Upload a vectors/ tree or vector store to Qdrant")
+    parser.add_argument("vectors_dir", nargs="?", default="vectors")
+    parser.add_argument("collection_name", nargs="?", default="sign_vectors")
+    parser.add_argument("--batch-size", type=int, default=100, help="Points per upsert (default: 100)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes parsing JSON files (default: one per CPU)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Upsert requests in flight (default: 4)")
+    parser.add_argument("--data-root", default=".",
+                        help="Directory the vectorizers ran in; absolute source paths under it become relative "
+                             "so point IDs do not depend on how a clip was named (default: .)")
+    parser.add_argument("--recreate", action="store_true",
+                        help="Drop and rebuild the collection instead of updating it in place")
+    parser.add_argument("--index-profile", choices=tuple(INDEX_PROFILES), default=None,
+                        help="HNSW/quantization/storage profile for new collections (see index_profiles.py); "
+                             "start sign_api with the same index_profile")
+    parser.add_argument("--projection", default=None,
+                        help="projection.py file: also store each vector's projection as a pca named vector; "
+                             "start sign_api with the same projection")
+    parser.add_argument("--versioned", action="store_true",
+                        help="Build <collection>_v{n}, smoke-test it, then point the <collection> alias at it")
+    parser.add_argument("--keep", type=int, default=3, help="With --versioned, versions that passed the smoke test kept for rollback")
+    parser.add_argument("--smoke-queries", type=int, default=SMOKE_QUERIES,
+                        help=f"With --versioned, random points queried back by the smoke test (default: {SMOKE_QUERIES})")
+    parser.add_argument("--smoke-min-top1", type=float, default=None,
+                        help="With --versioned, top-1 share the smoke test needs (default: the corpus's exact "
+                             f"leave-one-out top-1 less {SMOKE_SLACK}, at least {SMOKE_FLOOR})")
+    parser.add_argument("--rollback", action="store_true",
+                        help="Point the <collection> alias back at the previous passed version and exit")
+    args = parser.parse_args()
+    projection = Projection.load(args.projection) if args.projection else None
     
-    upload_vectors_to_qdrant(vectors_dir, collection_name)
+    if args.rollback:
+        rollback(args.collection_name)
+    elif args.versioned:
+        publish_version(args.vectors_dir, args.collection_name, args.keep,
+                        smoke_queries=args.smoke_queries, smoke_min_top1=args.smoke_min_top1,
+                        batch_size=args.batch_size, workers=args.workers, concurrency=args.concurrency,
+                        index_profile=args.index_profile, projection=projection, data_root=args.data_root)
+    else:
+        upload_vectors_to_qdrant(args.vectors_dir, args.collection_name, args.batch_size,
+                                 args.workers, args.concurrency, args.recreate, index_profile=args.index_profile,
+                                 projection=projection, data_root=args.data_root)
@@ -0,0 +1,186 @@
+"""Check that the current feature extraction reproduces the vectors already in vectors/
+
+Takes a sample of the source files named by the stored vectors (a clip or an
+image each), runs them through today's vectorizers and compares the fresh
+vectors frame by frame with the stored originals. A difference beyond --atol
+means FEATURE_VERSION should be bumped and the corpus rebuilt.
+
+    python validate_features.py vectors --data-root . --sample 5
+
+That needs the source files and MediaPipe. --synthetic checks FeatureBuilder
+alone against the per-landmark loop it replaced, on random landmarks:
+
+    python validate_features.py --synthetic
+"""
+import random
+import tempfile
+import numpy as np
+from pathlib import Path
+from types import SimpleNamespace
+from sign_features import (
+    FeatureBuilder, FEATURE_DIM, HAND_DIM, HAND_POINTS, MAX_HANDS, NOSE_INDEX, POSE_DIM, POSE_INDICES, FACE_INDICES
+)
+from vector_store import load_vectors
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+
+def stored_originals(vectors_path):
+    """{source file: {frame: vector}} of the non-augmented stored vectors"""
+    matrix, meta = load_vectors(vectors_path)
+    sources = {}
+    for row in np.flatnonzero(meta["augmentation"] == "original"):
+        sources.setdefault(str(meta["file"][row]), {})[int(meta["frame"][row])] = matrix[row]
+    return sources
+
+
+def fresh_vectors(source, profile="full"):
+    """{frame: vector} of a source file vectorized the way the corpus is built today"""
+    if source.suffix.lower() in IMAGE_SUFFIXES:
+        from mediapipe_vectorizer import MediaPipeVectorizer
+
+        features = MediaPipeVectorizer(mirror="none", profile=profile).extract_normalized_features(source)
+        return {-1: features} if features is not None else {}
+
+    from video_vectorizer import VideoVectorizer
+
+    # The stored corpus was extracted frame by frame in image mode; video mode tracks and gives other landmarks
+    with tempfile.TemporaryDirectory() as tmp:
+        VideoVectorizer(running_mode="image", mirror="none", profile=profile).process_video(source, tmp, verbose=False)
+        matrix, meta = load_vectors(tmp)
+    return {int(frame): vector for frame, vector in zip(meta["frame"], matrix)}
+
+
+def compare(stored, fresh):
+    """(frames compared, stored frames not reproduced, max abs difference)"""
+    # Fresh runs may keep more frames than a sampled or reduced corpus, not fewer
+    common = sorted(set(stored) & set(fresh))
+    missing = len(set(stored) - set(fresh))
+    worst = max((float(np.abs(stored[f] - fresh[f]).max()) for f in common), default=0.0)
+    return len(common), missing, worst
+
+
+def _legacy_features(hands_result, pose_result, face_result):
+    """Per-landmark loop FeatureBuilder replaced, the reference for check_parity"""
+    if not face_result.face_landmarks:
+        return None
+    nose = face_result.face_landmarks[0][NOSE_INDEX]
+    face_center = np.array([nose.x, nose.y, nose.z])
+
+    features = []
+    if hands_result.hand_landmarks:
+        for hand_landmarks in hands_result.hand_landmarks:
+            wrist = np.array([hand_landmarks[0].x, hand_landmarks[0].y, hand_landmarks[0].z])
+            for i in range(HAND_POINTS):
+                lm = hand_landmarks[i]
+                point = np.array([lm.x, lm.y, lm.z])
+                features.extend([
+                    point[0] - wrist[0],
+                    point[1] - wrist[1],
+                    point[2] - wrist[2],
+                    np.linalg.norm(point - wrist),
+                    np.linalg.norm(point - face_center)
+                ])
+    else:
+        features.extend([0.0] * HAND_DIM)
+
+    if hands_result.hand_landmarks and len(hands_result.hand_landmarks) == 1:
+        features.extend([0.0] * (HAND_POINTS * 5))
+
+    if pose_result.pose_landmarks:
+        pose = pose_result.pose_landmarks[0]
+        ls = np.array([pose[11].x, pose[11].y, pose[11].z])
+        rs = np.array([pose[12].x, pose[12].y, pose[12].z])
+        for idx in POSE_INDICES:
+            point = np.array([pose[idx].x, pose[idx].y, pose[idx].z])
+            features.extend([
+                point[0] - face_center[0],
+                point[1] - face_center[1],
+                point[2] - face_center[2],
+                np.linalg.norm(point - face_center),
+                min(np.linalg.norm(point - ls), np.linalg.norm(point - rs))
+            ])
+    else:
+        features.extend([0.0] * POSE_DIM)
+
+    for idx in FACE_INDICES:
+        point = np.array([face_result.face_landmarks[0][idx].x,
+                          face_result.face_landmarks[0][idx].y,
+                          face_result.face_landmarks[0][idx].z])
+        features.extend([
+            point[0] - face_center[0],
+            point[1] - face_center[1],
+            point[2] - face_center[2],
+            np.linalg.norm(point - face_center)
+        ])
+
+    return np.array(features)
+
+
+def check_parity(trials=500, seed=0, atol=1e-5):
+    """Max abs difference between FeatureBuilder and the legacy loop on random landmark sets
+
+    Raises AssertionError when they disagree beyond atol or on which frames have features.
+    """
+    rng = np.random.default_rng(seed)
+
+    def points(n):
+        xyz = rng.random((n, 3)).astype(np.float32)
+        xyz[:, 2] -= 0.5
+        return [SimpleNamespace(x=float(x), y=float(y), z=float(z)) for x, y, z in xyz]
+
+    builder = FeatureBuilder()
+    worst = 0.0
+    for _ in range(trials):
+        num_hands = int(rng.integers(0, MAX_HANDS + 1))
+        hands_result = SimpleNamespace(hand_landmarks=[points(HAND_POINTS) for _ in range(num_hands)])
+        pose_result = SimpleNamespace(pose_landmarks=[points(33)] if rng.random() > 0.2 else [])
+        face_result = SimpleNamespace(face_landmarks=[points(478)] if rng.random() > 0.1 else [])
+
+        expected = _legacy_features(hands_result, pose_result, face_result)
+        actual = builder.from_results(hands_result, pose_result, face_result)
+        if expected is None or actual is None:
+            assert expected is None and actual is None, "face gating differs"
+            continue
+        assert actual.shape == (FEATURE_DIM,), f"expected {FEATURE_DIM}D, got {actual.shape}"
+        worst = max(worst, float(np.abs(actual - expected).max()))
+
+    assert worst <= atol, f"max abs difference {worst:.2e} exceeds {atol:.0e}"
+    return worst
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Re-vectorize sampled sources and compare with the stored vectors")
+    parser.add_argument("vectors", nargs="?", default="vectors", help="vectors/ tree or vector store")
+    parser.add_argument("--data-root", default=".", help="Directory the stored 'file' paths are relative to")
+    parser.add_argument("--sample", type=int, default=5, help="Source files to re-vectorize (default: 5)")
+    parser.add_argument("--profile", default="full", help="Feature profile the vectors were built with")
+    parser.add_argument("--atol", type=float, default=1e-5, help="Allowed max abs difference (default: 1e-5)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Only check FeatureBuilder against the legacy loop on random landmarks (no data needed)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        worst = check_parity(seed=args.seed, atol=args.atol)
+        print(f"✓ Vectorized features match legacy extraction (max abs diff {worst:.2e})")
+        raise SystemExit
+
+    sources = stored_originals(args.vectors)
+    available = [f for f in sorted(sources) if (Path(args.data_root) / f).exists()]
+    print(f"{len(sources)} source files in {args.vectors}, {len(available)} found under {args.data_root}")
+    if not available:
+        raise SystemExit("✗ No source files to re-vectorize, check --data-root")
+
+    failed = 0
+    for source in random.Random(args.seed).sample(available, min(args.sample, len(available))):
+        frames, missing, worst = compare(sources[source], fresh_vectors(Path(args.data_root) / source, args.profile))
+        ok = frames > 0 and missing == 0 and worst <= args.atol
+        failed += not ok
+        print(f"{'✓' if ok else '✗'} {source}: {frames} frames, {missing} missing, max abs diff {worst:.2e}")
+
+    if failed:
+        raise SystemExit(f"✗ {failed} source files differ from the stored vectors")
+    print("✓ Current extraction reproduces the stored vectors")
@@ -0,0 +1,117 @@
+import json
+import random
+import numpy as np
+from pathlib import Path
+from sign_features import mirror_features, HAND_DIM, POSE_DIM, HAND_POINTS
+
+SECTIONS = {
+    "hands": slice(0, HAND_DIM),
+    "pose": slice(HAND_DIM, HAND_DIM + POSE_DIM),
+    "face": slice(HAND_DIM + POSE_DIM, None),
+}
+
+
+def compare(features, detected_mirror):
+    """Errors of the analytic mirror against a real re-detection of the flipped input"""
+    analytic = mirror_features(features)
+    detected = np.asarray(detected_mirror, dtype=np.float32)
+
+    # Hand slots follow detection order, which may differ between the two passes
+    swapped = analytic.copy()
+    swapped[:HAND_DIM] = np.concatenate([analytic[HAND_POINTS * 5:HAND_DIM], analytic[:HAND_POINTS * 5]])
+    if np.abs(swapped - detected).max() < np.abs(analytic - detected).max():
+        analytic = swapped
+
+    errors = {name: float(np.abs(analytic[s] - detected[s]).max()) for name, s in SECTIONS.items()}
+    norms = np.linalg.norm(analytic) * np.linalg.norm(detected)
+    errors["cosine"] = float(analytic @ detected / norms) if norms > 0 else 1.0
+    return errors
+
+
+def pairs_from_vectors(vectors_dir):
+    """(original, mirror) vectors from an existing JSON tree built with detected mirrors"""
+    for mirror_file in sorted(Path(vectors_dir).rglob("*_mirror.json")):
+        original_file = mirror_file.with_name(mirror_file.name.replace("_mirror.json", ".json"))
+        if not original_file.exists():
+            continue
+        with open(original_file) as f:
+            original = json.load(f)["vector"]
+        with open(mirror_file) as f:
+            mirror = json.load(f)["vector"]
+        yield original, mirror
+
+
+def pairs_from_images(data_dir, sample=None, seed=0):
+    """(original, mirror) vectors by running detection on each image and its flip"""
+    from mediapipe_vectorizer import MediaPipeVectorizer
+
+    vectorizer = MediaPipeVectorizer(mirror="detect")
+    image_files = [p for p in sorted(Path(data_dir).rglob("*"))
+                   if p.suffix.lower() in (".jpg", ".jpeg", ".png")]
+    # Sample before detecting, detection is the expensive part
+    if sample is not None and len(image_files) > sample:
+        image_files = random.Random(seed).sample(image_files, sample)
+    for img_path in image_files:
+        original = vectorizer.extract_normalized_features(img_path, mirror=False)
+        mirror = vectorizer.extract_normalized_features(img_path, mirror=True)
+        if original is not None and mirror is not None:
+            yield original, mirror
+
+
+def pairs_from_video(video_path):
+    """(original, mirror) vectors for each frame of a video and its flip"""
+    import cv2
+    from video_vectorizer import VideoVectorizer
+
+    vectorizer = VideoVectorizer(running_mode="image", mirror="detect")
+    cap = cv2.VideoCapture(str(video_path))
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        original = vectorizer.extract_features(frame, mirror=False)
+        mirror = vectorizer.extract_features(frame, mirror=True)
+        if original is not None and mirror is not None:
+            yield original, mirror
+    cap.release()
+
+
+def report(pairs, sample=None, seed=0):
+    pairs = list(pairs)
+    if sample is not None and len(pairs) > sample:
+        pairs = random.Random(seed).sample(pairs, sample)
+
+    errors = [compare(original, mirror) for original, mirror in pairs]
+    print(f"Compared {len(errors)} analytic mirrors against re-detection")
+    if not errors:
+        return
+
+    print(f"{'':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for name in (*SECTIONS, "cosine"):
+        values = np.array([e[name] for e in errors])
+        if name == "cosine":
+            # Low cosine is the bad tail, so report lower percentiles
+            p50, p90, p99 = np.percentile(values, [50, 10, 1])
+            print(f"{'cosine':>8} {p50:8.4f} {p90:8.4f} {p99:8.4f} {values.min():8.4f}  (p10/p1/min)")
+        else:
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            print(f"{name:>8} {p50:8.4f} {p90:8.4f} {p99:8.4f} {values.max():8.4f}  (max abs diff)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate analytic mirror vectors against re-detection")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--vectors", help="Existing vectors/ tree with detected *_mirror.json files")
+    source.add_argument("--images", help="Image folder, detection is run on each image and its flip")
+    source.add_argument("--video", help="Video file, detection is run on each frame and its flip")
+    parser.add_argument("--sample", type=int, default=500, help="Random sample size (default: 500)")
+    args = parser.parse_args()
+
+    if args.vectors:
+        report(pairs_from_vectors(args.vectors), args.sample)
+    elif args.images:
+        report(pairs_from_images(args.images, args.sample), args.sample)
+    else:
+        report(pairs_from_video(args.video), args.sample)
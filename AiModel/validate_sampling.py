@@ -0,0 +1,66 @@
+import numpy as np
+from frame_sampling import sample_sequence
+from search_backend import normalize
+from vector_store import load_vectors
+
+
+def split(frames, block=30, test_every=5):
+    """Held-out mask: every test_every-th block of frames within each clip"""
+    return (frames // block) % test_every == test_every - 1
+
+
+def nearest_accuracy(train, train_labels, test, test_labels):
+    """Top-1 cosine nearest-neighbour accuracy"""
+    train, test = normalize(train), normalize(test)
+    correct = 0
+    for start in range(0, len(test), 1024):
+        scores = test[start:start + 1024] @ train.T
+        correct += int((train_labels[scores.argmax(axis=1)] == test_labels[start:start + 1024]).sum())
+    return correct / len(test) if len(test) else float("nan")
+
+
+def sampled_mask(matrix, meta, threshold, min_stride, max_stride):
+    """Rows a sampled indexing run would have written: kept originals plus their mirrors"""
+    original = meta["augmentation"] == "original"
+    keep = np.zeros(len(matrix), dtype=bool)
+    for clip in np.unique(meta["file"]):
+        rows = np.where((meta["file"] == clip) & original)[0]
+        kept = rows[sample_sequence(meta["frame"][rows], matrix[rows], threshold, min_stride, max_stride)]
+        keep[kept] = True
+        kept_frames = set(meta["frame"][kept].tolist())
+        mirrors = np.where((meta["file"] == clip) & ~original)[0]
+        keep[mirrors[np.isin(meta["frame"][mirrors], list(kept_frames))]] = True
+    return keep
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Reduction and held-out accuracy of motion-adaptive sampling, simulated on an every-frame index"
+    )
+    parser.add_argument("vectors", help="vectors/ tree or store built from videos without sampling")
+    parser.add_argument("--thresholds", default="0,0.25,0.5,0.75,1.0,1.5")
+    parser.add_argument("--min-stride", type=int, default=1)
+    parser.add_argument("--max-stride", type=int, default=None)
+    parser.add_argument("--block", type=int, default=30, help="Frames per train/test block (default: 30)")
+    args = parser.parse_args()
+
+    matrix, meta = load_vectors(args.vectors)
+    video = meta["frame"] >= 0
+    matrix, meta = matrix[video], {column: values[video] for column, values in meta.items()}
+
+    held_out = split(meta["frame"], args.block)
+    test = held_out & (meta["augmentation"] == "original")
+    print(f"{len(matrix)} video vectors from {len(np.unique(meta['file']))} clips, "
+          f"{int(test.sum())} held-out test frames\n")
+
+    print(f"{'threshold':>9} {'indexed':>8} {'reduction':>9} {'top-1':>7} {'change':>7}")
+    baseline = None
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        train = sampled_mask(matrix, meta, threshold, args.min_stride, args.max_stride) & ~held_out
+        accuracy = nearest_accuracy(matrix[train], meta["label"][train], matrix[test], meta["label"][test])
+        if baseline is None:
+            baseline, full = accuracy, train.sum()
+        print(f"{threshold:9.2f} {int(train.sum()):8d} {1 - train.sum() / full:9.1%} "
+              f"{accuracy:7.1%} {accuracy - baseline:+7.1%}")
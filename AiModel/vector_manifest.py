@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import shutil
+from collections import namedtuple
+from pathlib import Path
+
+Plan = namedtuple("Plan", "added changed unchanged removed")
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """BLAKE2b of a file's contents, read in chunks so videos are not loaded whole"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class VectorManifest:
+    """Record of which inputs have been vectorized, with what settings, into which outputs
+
+    One JSON line per finished input is appended to a .jsonl file in the output
+    directory (upload_to_qdrant only reads *.json). A crash loses at most the
+    inputs that were still in progress; the next run simply redoes them. The
+    last line for an input wins, and a removal is recorded as {"removed": true}.
+
+    An input is unchanged when size and mtime match, or when they do not but the
+    content hash still does (e.g. after a copy). A change in the extractor
+    settings (profile, mirror mode, feature version, ...) marks every input as
+    changed.
+    """
+
+    def __init__(self, output_dir, name):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / name
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    entry = json.loads(line)
+                    if entry.get("removed"):
+                        self.entries.pop(entry["input"], None)
+                    else:
+                        self.entries[entry["input"]] = entry
+
+    @staticmethod
+    def key(path):
+        return str(Path(path).resolve())
+
+    def plan(self, inputs, input_root, extractor, force=False):
+        """Sort inputs into added/changed/unchanged; removed are manifest entries under input_root that are gone
+
+        Each list holds (key, path) pairs; removed paths are None.
+        """
+        added, changed, unchanged = [], [], []
+        for path in inputs:
+            key = self.key(path)
+            entry = self.entries.get(key)
+            if entry is None:
+                added.append((key, path))
+            elif force or entry["extractor"] != extractor or not self._same_content(entry, path):
+                changed.append((key, path))
+            else:
+                unchanged.append((key, path))
+
+        current = {key for key, _ in added + changed + unchanged}
+        root = self.key(input_root)
+        removed = [
+            (key, None) for key in sorted(self.entries)
+            if key not in current and (key == root or key.startswith(root + os.sep))
+        ]
+        return Plan(added, changed, unchanged, removed)
+
+    def _same_content(self, entry, path):
+        stat = os.stat(path)
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+        return file_hash(path) == entry["hash"]
+
+    def print_plan(self, plan, show=10):
+        print(f"Plan: {len(plan.added)} added, {len(plan.changed)} changed, "
+              f"{len(plan.removed)} removed, {len(plan.unchanged)} unchanged")
+        for name, items in (("+", plan.added), ("~", plan.changed), ("-", plan.removed)):
+            for key, _ in items[:show]:
+                print(f"  {name} {key}")
+            if len(items) > show:
+                print(f"  {name} ... {len(items) - show} more")
+
+    def remove_outputs(self, key):
+        """Delete the vectors an input produced last time"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        for output in entry["outputs"]:
+            target = self.output_dir / output
+            if target.is_dir():
+                shutil.rmtree(target)
+            elif target.exists():
+                target.unlink()
+
+    def record(self, path, extractor, outputs):
+        """Append a finished input; outputs are paths relative to the output directory"""
+        stat = os.stat(path)
+        entry = {
+            "input": self.key(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": file_hash(path),
+            "extractor": extractor,
+            "outputs": [str(Path(output)) for output in outputs],
+        }
+        self.entries[entry["input"]] = entry
+        self._append(entry)
+
+    def forget(self, key):
+        self.remove_outputs(key)
+        self.entries.pop(key, None)
+        self._append({"input": key, "removed": True})
+
+    def _append(self, entry):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Rewrite the manifest with one line per live input"""
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            for key in sorted(self.entries):
+                f.write(json.dumps(self.entries[key]) + "\n")
+        os.replace(tmp, self.path)
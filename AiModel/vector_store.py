@@ -0,0 +1,296 @@
+"""Columnar on-disk format for sign vectors
+
+A store is a directory of shards. Each shard is two files:
+
+    <name>.vectors.npy   float32 (rows, 260) matrix, memory-mappable
+    <name>.meta.npz      one array per metadata column
+
+String columns (label, file, augmentation, profile) are dictionary-encoded:
+`<col>.dictionary` holds the sorted distinct values and `<col>.codes` a small
+unsigned index per row. frame is int32 (-1 for images) and timestamp float64
+(NaN for images). Writing the same rows always gives the same bytes.
+
+The vectorizers write one shard per video and one per image label folder
+(--format store). For existing JSON trees:
+    python vector_store.py convert vectors vectors_store
+    python vector_store.py report vectors vectors_store
+"""
+import json
+import os
+import time
+import zipfile
+import numpy as np
+from pathlib import Path
+from sign_features import FEATURE_DIM
+
+VECTORS_SUFFIX = ".vectors.npy"
+META_SUFFIX = ".meta.npz"
+STRING_COLUMNS = ("label", "file", "augmentation", "profile")
+
+
+def shard_files(name):
+    """Files of a shard, relative to the store directory"""
+    return [f"{name}{VECTORS_SUFFIX}", f"{name}{META_SUFFIX}"]
+
+
+def shard_name(relative_dir):
+    """Shard name for a folder relative to the input root: 'A/B' -> 'A__B', '.' -> '_root'"""
+    parts = Path(relative_dir).parts
+    return "__".join(parts) if parts else "_root"
+
+
+def _code_dtype(size):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if size <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint64
+
+
+def write_npz(path, arrays, compress=False):
+    """np.savez with fixed zip timestamps, so identical shards are identical bytes"""
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(path, "w", compression=compression) as zf:
+        for key, array in arrays.items():
+            info = zipfile.ZipInfo(f"{key}.npy", date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = compression
+            with zf.open(info, "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+
+
+def encode_columns(rows, string_columns=STRING_COLUMNS):
+    """Metadata rows as npz arrays: dictionary-encoded strings, frame and timestamp"""
+    columns = {}
+    for column in string_columns:
+        values = [str(row.get(column) or "") for row in rows]
+        dictionary = sorted(set(values))
+        index = {value: i for i, value in enumerate(dictionary)}
+        columns[f"{column}.dictionary"] = np.array(dictionary, dtype=str)
+        columns[f"{column}.codes"] = np.array([index[v] for v in values], dtype=_code_dtype(len(dictionary)))
+    columns["frame"] = np.array(
+        [-1 if row.get("frame") is None else row["frame"] for row in rows], dtype=np.int32
+    )
+    columns["timestamp"] = np.array(
+        [np.nan if row.get("timestamp") is None else row["timestamp"] for row in rows], dtype=np.float64
+    )
+    return columns
+
+
+def decode_columns(meta, string_columns=STRING_COLUMNS):
+    """Inverse of encode_columns on an open npz: strings as str arrays, frame, timestamp"""
+    columns = {
+        column: meta[f"{column}.dictionary"][meta[f"{column}.codes"]]
+        for column in string_columns
+    }
+    columns["frame"] = meta["frame"]
+    columns["timestamp"] = meta["timestamp"]
+    return columns
+
+
+def write_shard(directory, name, vectors, rows, dim=FEATURE_DIM):
+    """Write one shard; rows are metadata dicts with the keys of the JSON records"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(rows), dim)
+    columns = encode_columns(rows)
+
+    # Write to temporary names first, a crash never leaves a half-written shard behind
+    vectors_path, meta_path = (directory / f for f in shard_files(name))
+    tmp_vectors = vectors_path.with_name(f".{vectors_path.name}.tmp")
+    tmp_meta = meta_path.with_name(f".{meta_path.name}.tmp")
+    with open(tmp_vectors, "wb") as f:
+        np.save(f, vectors)
+    write_npz(tmp_meta, columns)
+    os.replace(tmp_meta, meta_path)
+    os.replace(tmp_vectors, vectors_path)
+
+
+class ShardSink:
+    """Collects the vectors of one video or image folder and writes them as a shard on close()"""
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.vectors = []
+        self.rows = []
+
+    def add(self, name, record):
+        self.vectors.append(np.asarray(record["vector"], dtype=np.float32))
+        self.rows.append(record)
+
+    def close(self):
+        vectors = np.stack(self.vectors) if self.vectors else np.zeros((0, FEATURE_DIM), dtype=np.float32)
+        write_shard(self.directory, self.name, vectors, self.rows, dim=vectors.shape[1])
+
+
+class JsonSink:
+    """One <name>.json file per record, the original vectors/ layout"""
+
+    def __init__(self, directory, indent=None):
+        self.directory = Path(directory)
+        self.indent = indent
+
+    def add(self, name, record):
+        record = {key: value.tolist() if key == "vector" else value for key, value in record.items()}
+        with open(self.directory / f"{name}.json", 'w') as f:
+            json.dump(record, f, indent=self.indent)
+
+    def close(self):
+        pass
+
+
+class VectorStore:
+    """Read access to a store directory
+
+    vectors(shard) is a read-only memmap, so opening a store costs almost
+    nothing until rows are touched. load() concatenates every shard into one
+    matrix plus decoded metadata columns.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.shards = sorted(
+            p.name[:-len(VECTORS_SUFFIX)] for p in self.directory.glob(f"*{VECTORS_SUFFIX}")
+        )
+
+    @staticmethod
+    def is_store(directory):
+        return any(Path(directory).glob(f"*{VECTORS_SUFFIX}"))
+
+    def vectors(self, shard):
+        return np.load(self.directory / f"{shard}{VECTORS_SUFFIX}", mmap_mode="r")
+
+    def metadata(self, shard):
+        """Decoded columns of a shard: label/file/augmentation/profile as str arrays, frame, timestamp"""
+        with np.load(self.directory / f"{shard}{META_SUFFIX}") as meta:
+            return decode_columns(meta)
+
+    def __len__(self):
+        return sum(self.vectors(shard).shape[0] for shard in self.shards)
+
+    def load(self):
+        """(matrix, metadata) over all shards, in shard order"""
+        matrices, columns = [], {}
+        for shard in self.shards:
+            matrices.append(self.vectors(shard))
+            for column, values in self.metadata(shard).items():
+                columns.setdefault(column, []).append(values)
+        if not matrices:
+            return np.zeros((0, FEATURE_DIM), dtype=np.float32), {}
+        return np.concatenate(matrices), {column: np.concatenate(values) for column, values in columns.items()}
+
+    def records(self):
+        """Rows as dicts shaped like the JSON records (vector is a float32 array)"""
+        for shard in self.shards:
+            vectors = self.vectors(shard)
+            meta = self.metadata(shard)
+            for i in range(vectors.shape[0]):
+                frame = int(meta["frame"][i])
+                timestamp = float(meta["timestamp"][i])
+                yield {
+                    "file": str(meta["file"][i]),
+                    "frame": frame if frame >= 0 else None,
+                    "timestamp": timestamp if not np.isnan(timestamp) else None,
+                    "label": str(meta["label"][i]),
+                    "vector": vectors[i],
+                    "dimension": vectors.shape[1],
+                    "augmentation": str(meta["augmentation"][i]),
+                    "profile": str(meta["profile"][i]),
+                }
+
+
+def iter_json_vectors(json_dir):
+    """(path, record) for every vector JSON file under json_dir, in path order"""
+    for json_file in sorted(Path(json_dir).rglob("*.json")):
+        with open(json_file) as f:
+            data = json.load(f)
+        if "vector" in data:
+            yield json_file, data
+
+
+def load_vectors(path):
+    """(matrix, metadata columns) from a store or a JSON vectors/ tree, same shape as VectorStore.load()"""
+    if VectorStore.is_store(path):
+        return VectorStore(path).load()
+    records = [data for _, data in iter_json_vectors(path)]
+    matrix = np.array([r["vector"] for r in records], dtype=np.float32).reshape(len(records), -1)
+    columns = {
+        column: np.array([str(r.get(column) or ("full" if column == "profile" else "")) for r in records])
+        for column in STRING_COLUMNS
+    }
+    columns["frame"] = np.array([-1 if r.get("frame") is None else r["frame"] for r in records], dtype=np.int32)
+    columns["timestamp"] = np.array(
+        [np.nan if r.get("timestamp") is None else r["timestamp"] for r in records], dtype=np.float64
+    )
+    return matrix, columns
+
+
+def convert(json_dir, store_dir):
+    """Write a JSON vectors/ tree as a store, one shard per folder"""
+    json_dir = Path(json_dir)
+    groups = {}
+    for json_file, data in iter_json_vectors(json_dir):
+        data.setdefault("profile", "full")
+        groups.setdefault(shard_name(json_file.parent.relative_to(json_dir)), []).append(data)
+
+    rows = 0
+    for name, records in groups.items():
+        write_shard(store_dir, name, np.array([r["vector"] for r in records], dtype=np.float32), records)
+        rows += len(records)
+    print(f"Converted {rows} vectors into {len(groups)} shards in {store_dir}")
+
+
+def _disk_usage(paths):
+    """(apparent bytes, allocated bytes) of a set of files"""
+    apparent = allocated = 0
+    for path in paths:
+        stat = os.stat(path)
+        apparent += stat.st_size
+        allocated += getattr(stat, "st_blocks", 0) * 512 or stat.st_size
+    return apparent, allocated
+
+
+def report(json_dir, store_dir):
+    """Disk size and full-load time of a JSON tree versus the equivalent store"""
+    json_files = list(Path(json_dir).rglob("*.json"))
+    store_files = [p for p in Path(store_dir).iterdir() if p.name.endswith((VECTORS_SUFFIX, META_SUFFIX))]
+
+    start = time.perf_counter()
+    records = [data for _, data in iter_json_vectors(json_dir)]
+    json_matrix = np.array([r["vector"] for r in records], dtype=np.float32)
+    json_labels = [r["label"] for r in records]
+    json_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store_matrix, meta = VectorStore(store_dir).load()
+    store_seconds = time.perf_counter() - start
+
+    print(f"{'':>6} {'files':>7} {'rows':>7} {'MB':>8} {'MB on disk':>11} {'load s':>8}")
+    for name, files, rows, seconds in (
+        ("json", json_files, len(json_labels), json_seconds),
+        ("store", store_files, len(store_matrix), store_seconds),
+    ):
+        apparent, allocated = _disk_usage(files)
+        print(f"{name:>6} {len(files):7d} {rows:7d} {apparent / 2**20:8.1f} {allocated / 2**20:11.1f} {seconds:8.3f}")
+
+    if len(json_matrix) == len(store_matrix):
+        same = sorted(json_labels) == sorted(meta.get("label", np.array([])).tolist())
+        print(f"Same rows: {same}, speedup {json_seconds / max(store_seconds, 1e-9):.0f}x")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert and compare JSON vector trees and vector stores")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert", help="Write a JSON vectors/ tree as a store")
+    convert_parser.add_argument("json_dir")
+    convert_parser.add_argument("store_dir")
+    report_parser = commands.add_parser("report", help="Disk size and load time, JSON vs store")
+    report_parser.add_argument("json_dir")
+    report_parser.add_argument("store_dir")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert(args.json_dir, args.store_dir)
+    else:
+        report(args.json_dir, args.store_dir)
@@ -1,199 +1,410 @@
+import os
 import cv2
-import json
-import numpy as np
+import time
 import mediapipe as mp
 from pathlib import Path
+from sign_features import FeatureBuilder, PROFILES, FEATURE_VERSION, mirror_features
+from landmarkers import Landmarkers
+from vector_manifest import VectorManifest
+from vector_store import JsonSink, ShardSink, shard_files
+from frame_pipeline import FrameDecoder, BatchWriter, StageStats, report
+from frame_sampling import MotionSampler, sampling_summary
+from landmark_archive import LandmarkRecorder, ARCHIVE_DIR, archive_file
+
+MANIFEST_NAME = "manifest_videos.jsonl"
+VIDEO_PATTERNS = ['*.mp4', '*.mov', '*.avi', '*.MP4', '*.MOV', '*.AVI']
+
+def read_frames(cap, start_frame=0, end_frame=None):
+    """(frame_idx, frame, None) for frames [start_frame, end_frame), read inline"""
+    # Skip by decoding rather than seeking, seeks are not frame-exact for every codec
+    frame_idx = 0
+    while frame_idx < start_frame and cap.grab():
+        frame_idx += 1
+    while end_frame is None or frame_idx < end_frame:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame_idx, frame, None
+        frame_idx += 1
+
+def find_videos(video_dir):
+    video_files = []
+    for ext in VIDEO_PATTERNS:
+        video_files.extend(Path(video_dir).glob(ext))
+        video_files.extend(Path(video_dir).glob(f'*/{ext}'))
+    return sorted(video_files)
 
 class VideoVectorizer:
-    def __init__(self):
-        BaseOptions = mp.tasks.BaseOptions
-        HandLandmarker = mp.tasks.vision.HandLandmarker
-        HandLandmarkerOptions = mp.tasks.vision.HandLandmarkerOptions
-        PoseLandmarker = mp.tasks.vision.PoseLandmarker
-        PoseLandmarkerOptions = mp.tasks.vision.PoseLandmarkerOptions
-        FaceLandmarker = mp.tasks.vision.FaceLandmarker
-        FaceLandmarkerOptions = mp.tasks.vision.FaceLandmarkerOptions
-        VisionRunningMode = mp.tasks.vision.RunningMode
-        
-        self.hands = HandLandmarker.create_from_options(
-            HandLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path="models/hand_landmarker.task"),
-                running_mode=VisionRunningMode.IMAGE,
-                num_hands=2,
-                min_hand_detection_confidence=0.5
-            )
-        )
-        self.pose = PoseLandmarker.create_from_options(
-            PoseLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path="models/pose_landmarker_lite.task"),
-                running_mode=VisionRunningMode.IMAGE,
-                min_pose_detection_confidence=0.5
-            )
-        )
-        self.face = FaceLandmarker.create_from_options(
-            FaceLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path="models/face_landmarker.task"),
-                running_mode=VisionRunningMode.IMAGE,
-                num_faces=1,
-                min_face_detection_confidence=0.5
+    def __init__(self, running_mode="video", parallel=False, mirror="analytic", profile="full", output_format="json",
+                 pipeline=False, sample_threshold=None, min_stride=1, max_stride=None, archive_dir=None):
+        detectors = PROFILES[profile]["detectors"]
+        self.landmarkers = Landmarkers("models", running_mode=running_mode, parallel=parallel, detectors=detectors)
+        self.features = FeatureBuilder(profile)
+        self.profile = profile
+        
+        # analytic: derive the mirror vector from the first pass (see mirror_features)
+        # detect: run detection again on the flipped frame; none: no mirror vectors
+        if mirror not in ("analytic", "detect", "none"):
+            raise ValueError(f"Unknown mirror mode '{mirror}'")
+        self.mirror = mirror
+        self.mirror_landmarkers = None
+        if mirror == "detect":
+            # Mirrored frames need their own tracker, interleaving them would reset the ROI
+            self.mirror_landmarkers = Landmarkers(
+                "models", running_mode=running_mode, parallel=parallel, detectors=detectors
             )
-        )
+        
+        # json: one file per frame under <output>/<clip>/; store: one shard per clip (see vector_store)
+        if output_format not in ("json", "store"):
+            raise ValueError(f"Unknown output format '{output_format}'")
+        self.output_format = output_format
+        
+        # Decode and write on their own threads while inference runs (see frame_pipeline)
+        self.pipeline = pipeline
+        
+        # Only index frames whose features moved since the last kept one (see frame_sampling)
+        self.sampler = None
+        if sample_threshold is not None:
+            self.sampler = MotionSampler(sample_threshold, min_stride, max_stride)
+        
+        # Also keep the raw landmarks of every frame, one shard per clip (see landmark_archive)
+        self.archive_dir = archive_dir
     
-    def extract_features(self, frame, mirror=False):
+    def detect(self, frame, mirror=False, timestamp_ms=None, img_rgb=None):
+        """(hands_result, pose_result, face_result) of a BGR frame; img_rgb skips the conversion"""
         if mirror:
             frame = cv2.flip(frame, 1)
+            img_rgb = None
         
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if img_rgb is None:
+            img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
         
-        hands_result = self.hands.detect(mp_image)
-        pose_result = self.pose.detect(mp_image)
-        face_result = self.face.detect(mp_image)
-        
-        face_center = None
-        if face_result.face_landmarks:
-            nose = face_result.face_landmarks[0][1]
-            face_center = np.array([nose.x, nose.y, nose.z])
-        
-        if face_center is None:
-            return None
-        
-        features = []
-        
-        # Hands (210D)
-        if hands_result.hand_landmarks:
-            for hand_landmarks in hands_result.hand_landmarks:
-                wrist = np.array([hand_landmarks[0].x, hand_landmarks[0].y, hand_landmarks[0].z])
-                for i in range(21):
-                    lm = hand_landmarks[i]
-                    point = np.array([lm.x, lm.y, lm.z])
-                    features.extend([
-                        point[0] - wrist[0],
-                        point[1] - wrist[1],
-                        point[2] - wrist[2],
-                        np.linalg.norm(point - wrist),
-                        np.linalg.norm(point - face_center)
-                    ])
-        else:
-            features.extend([0.0] * (21 * 5 * 2))
-        
-        if hands_result.hand_landmarks and len(hands_result.hand_landmarks) == 1:
-            features.extend([0.0] * (21 * 5))
-        
-        # Pose (30D)
-        if pose_result.pose_landmarks:
-            ls = np.array([pose_result.pose_landmarks[0][11].x, pose_result.pose_landmarks[0][11].y, pose_result.pose_landmarks[0][11].z])
-            rs = np.array([pose_result.pose_landmarks[0][12].x, pose_result.pose_landmarks[0][12].y, pose_result.pose_landmarks[0][12].z])
-            
-            for idx in [11, 12, 13, 14, 15, 16]:
-                lm = pose_result.pose_landmarks[0][idx]
-                point = np.array([lm.x, lm.y, lm.z])
-                features.extend([
-                    point[0] - face_center[0],
-                    point[1] - face_center[1],
-                    point[2] - face_center[2],
-                    np.linalg.norm(point - face_center),
-                    min(np.linalg.norm(point - ls), np.linalg.norm(point - rs))
-                ])
-        else:
-            features.extend([0.0] * 30)
-        
-        # Face (20D)
-        if face_result.face_landmarks:
-            for idx in [33, 263, 1, 61, 291]:
-                lm = face_result.face_landmarks[0][idx]
-                point = np.array([lm.x, lm.y, lm.z])
-                features.extend([
-                    point[0] - face_center[0],
-                    point[1] - face_center[1],
-                    point[2] - face_center[2],
-                    np.linalg.norm(point - face_center)
-                ])
-        else:
-            features.extend([0.0] * 20)
-        
-        return features
+        landmarkers = self.mirror_landmarkers if mirror else self.landmarkers
+        return landmarkers.detect(mp_image, timestamp_ms)
+    
+    def extract_features(self, frame, mirror=False, timestamp_ms=None, img_rgb=None):
+        """260D features of a BGR frame; img_rgb skips the conversion when it is already done"""
+        return self.features.from_results(*self.detect(frame, mirror, timestamp_ms, img_rgb))
     
-    def process_video(self, video_path, output_dir="vectors"):
+    def process_video(self, video_path, output_dir="vectors", start_frame=0, end_frame=None, verbose=True):
+        """Vectorize frames [start_frame, end_frame) of a video, returns (frames read, frames saved)
+        
+        Frame ranges are only independent in image mode; video mode tracks
+        landmarks from the previous frames, so clips must run from the start.
+        The store format and the landmark archive write one shard per clip and
+        need the whole clip.
+        """
         video_path = Path(video_path)
-        output_path = Path(output_dir) / video_path.stem
-        output_path.mkdir(parents=True, exist_ok=True)
+        if self.archive_dir is not None and (start_frame or end_frame is not None):
+            raise ValueError("Frame ranges cannot be archived, a clip is archived whole")
+        if self.output_format == "store":
+            if start_frame or end_frame is not None:
+                raise ValueError("Frame ranges need the json output format")
+            output_path = Path(output_dir)
+            sink = ShardSink(output_path, video_path.stem)
+        else:
+            output_path = Path(output_dir) / video_path.stem
+            output_path.mkdir(parents=True, exist_ok=True)
+            sink = JsonSink(output_path)
+        recorder = LandmarkRecorder(self.archive_dir, video_path.stem) if self.archive_dir is not None else None
         
         cap = cv2.VideoCapture(str(video_path))
         fps = cap.get(cv2.CAP_PROP_FPS)
         
-        print(f"Processing: {video_path.name}")
+        if verbose:
+            print(f"Processing: {video_path.name} ({self.landmarkers.running_mode} mode)")
+        
+        # Each clip starts a fresh timestamp sequence
+        self.landmarkers.reset()
+        if self.mirror_landmarkers is not None:
+            self.mirror_landmarkers.reset()
+        if self.sampler is not None:
+            self.sampler.reset()
         
-        frame_idx = 0
+        if self.pipeline:
+            frames = FrameDecoder(cap, start_frame, end_frame)
+            sink = BatchWriter(sink)
+            infer = StageStats("infer")
+            started = time.perf_counter()
+        else:
+            frames = read_frames(cap, start_frame, end_frame)
+        
+        end_idx = start_frame
         processed = 0
+        completed = False
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            features = self.extract_features(frame, mirror=False)
-            
-            if features:
-                with open(output_path / f"frame_{frame_idx:04d}.json", 'w') as f:
-                    json.dump({
-                        "file": str(video_path),
-                        "frame": frame_idx,
-                        "timestamp": frame_idx / fps if fps > 0 else 0,
-                        "label": video_path.stem,
-                        "vector": features,
-                        "dimension": len(features),
-                        "augmentation": "original"
-                    }, f)
-                
-                features_mirror = self.extract_features(frame, mirror=True)
-                if features_mirror:
-                    with open(output_path / f"frame_{frame_idx:04d}_mirror.json", 'w') as f:
-                        json.dump({
-                            "file": str(video_path),
-                            "frame": frame_idx,
-                            "timestamp": frame_idx / fps if fps > 0 else 0,
-                            "label": video_path.stem,
-                            "vector": features_mirror,
-                            "dimension": len(features_mirror),
-                            "augmentation": "mirror"
-                        }, f)
+        try:
+            for frame_idx, frame, img_rgb in frames:
+                if self.pipeline:
+                    infer_start = time.perf_counter()
+                processed += self._vectorize_frame(video_path, frame_idx, fps, frame, img_rgb, sink, recorder)
+                if self.pipeline:
+                    infer.busy += time.perf_counter() - infer_start
+                    infer.items += 1
                 
-                processed += 1
-            
-            frame_idx += 1
-            if frame_idx % 30 == 0:
-                print(f"Processed: {processed}/{frame_idx}")
+                end_idx = frame_idx + 1
+                if verbose and end_idx % 30 == 0:
+                    print(f"Processed: {processed}/{end_idx}")
+            completed = True
+        finally:
+            if self.pipeline:
+                frames.close()
+            cap.release()
+            # A failed clip still stops the writer thread, but writes no partial shard or archive
+            if completed:
+                sink.close()
+                if recorder is not None:
+                    recorder.close()
+            elif self.pipeline:
+                sink.close(commit=False)
         
-        cap.release()
-        print(f"Complete! {processed}/{frame_idx} frames saved to {output_path}")
+        if verbose:
+            print(f"Complete! {processed}/{end_idx} frames saved to {output_path}")
+            print(f"Detector timings: {self.landmarkers.timings.summary()}")
+            if self.pipeline:
+                print(report([frames.stats, infer, sink.stats], time.perf_counter() - started))
+        return end_idx - start_frame, processed
     
-    def process_folder(self, video_dir, output_dir="vectors"):
-        video_files = []
-        for ext in ['*.mp4', '*.mov', '*.avi', '*.MP4', '*.MOV', '*.AVI']:
-            video_files.extend(Path(video_dir).glob(ext))
-            video_files.extend(Path(video_dir).glob(f'*/{ext}'))
+    def process_video_sampled(self, *args, **kwargs):
+        """process_video plus the (kept, seen) sampler counts of this clip alone, for worker tasks"""
+        kept, seen = self.sampler.kept, self.sampler.seen
+        frames, saved = self.process_video(*args, **kwargs)
+        return frames, saved, self.sampler.kept - kept, self.sampler.seen - seen
+    
+    def _vectorize_frame(self, video_path, frame_idx, fps, frame, img_rgb, sink, recorder=None):
+        """Detect one frame and hand its vectors to sink, returns 1 if the frame was saved"""
+        timestamp_ms = frame_idx * 1000.0 / fps if fps > 0 else frame_idx * 33
+        results = self.detect(frame, mirror=False, timestamp_ms=timestamp_ms, img_rgb=img_rgb)
+        if recorder is not None:
+            recorder.add({
+                "file": str(video_path),
+                "frame": frame_idx,
+                "timestamp": frame_idx / fps if fps > 0 else 0,
+                "label": video_path.stem,
+                "profile": self.profile,
+                "name": f"frame_{frame_idx:04d}",
+                "folder": video_path.stem
+            }, *results)
+        features = self.features.from_results(*results)
+        
+        if features is None:
+            return 0
+        # Dropped frames are not written at all; kept ones keep their frame index and timestamp
+        if self.sampler is not None and not self.sampler.keep(frame_idx, features):
+            return 0
+        
+        sink.add(f"frame_{frame_idx:04d}", {
+            "file": str(video_path),
+            "frame": frame_idx,
+            "timestamp": frame_idx / fps if fps > 0 else 0,
+            "label": video_path.stem,
+            "vector": features,
+            "dimension": len(features),
+            "augmentation": "original",
+            "profile": self.profile
+        })
+        
+        if self.mirror == "analytic":
+            features_mirror = mirror_features(features)
+        elif self.mirror == "detect":
+            features_mirror = self.extract_features(frame, mirror=True, timestamp_ms=timestamp_ms)
+        else:
+            features_mirror = None
+        if features_mirror is not None:
+            sink.add(f"frame_{frame_idx:04d}_mirror", {
+                "file": str(video_path),
+                "frame": frame_idx,
+                "timestamp": frame_idx / fps if fps > 0 else 0,
+                "label": video_path.stem,
+                "vector": features_mirror,
+                "dimension": len(features_mirror),
+                "augmentation": "mirror",
+                "profile": self.profile
+            })
+        return 1
+    
+    def process_folder(self, video_dir, output_dir="vectors", video_files=None, on_done=None):
+        """Process all videos in video_dir (or just video_files); on_done(video_path) after each success"""
+        if video_files is None:
+            video_files = find_videos(video_dir)
         
         print(f"Found {len(video_files)} videos")
         
         for video_file in video_files:
             try:
                 self.process_video(video_file, output_dir)
+                if on_done is not None:
+                    on_done(video_file)
             except Exception as e:
                 print(f"Error: {video_file.name} - {e}")
+        
+        if self.sampler is not None:
+            print(f"Sampling: {self.sampler.summary()}")
 
-if __name__ == "__main__":
-    import sys
+def process_folder_parallel(video_paths, output_dir="vectors", workers=2, chunk_frames=300, on_done=None, **options):
+    """process_folder on worker processes, one VideoVectorizer(**options) each
+    
+    In image mode long videos are split into chunk_frames ranges so one long
+    clip does not leave the other workers idle; in video mode (or with the
+    store format, sampling or the landmark archive) every clip is one task because tracking needs
+    the frames in order. Either way the files
+    written are identical to a serial run. on_done(video_path) runs once all
+    ranges of a video finished without an error.
+    """
+    from parallel_vectorize import run_tasks
+    
+    # Sampling keeps its counters per worker, so sampled clips report theirs with the result
+    sampling = options.get("sample_threshold") is not None
+    method = "process_video_sampled" if sampling else "process_video"
+    tasks = []
+    owners = []
+    for video_path in video_paths:
+        frame_count = 0
+        chunkable = (options.get("running_mode", "video") == "image"
+                     and options.get("output_format", "json") == "json"
+                     and options.get("sample_threshold") is None
+                     and options.get("archive_dir") is None)
+        if chunkable:
+            cap = cv2.VideoCapture(str(video_path))
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+        if frame_count > chunk_frames:
+            # The last range runs to the end, frame counts from the container can be off
+            starts = list(range(0, frame_count, chunk_frames))
+            for start, end in zip(starts, starts[1:] + [None]):
+                tasks.append(("process_video", (video_path, output_dir, start, end, False)))
+                owners.append(video_path)
+        else:
+            tasks.append((method, (video_path, output_dir, 0, None, False)))
+            owners.append(video_path)
+    
+    remaining = {}
+    for video_path in owners:
+        remaining[video_path] = remaining.get(video_path, 0) + 1
+    
+    def on_result(index, frames, saved, error):
+        video_path = owners[index]
+        if error is not None:
+            remaining[video_path] = None
+        elif remaining[video_path] is not None:
+            remaining[video_path] -= 1
+            if remaining[video_path] == 0 and on_done is not None:
+                on_done(video_path)
     
-    if len(sys.argv) < 2:
-        print("Usage: python video_vectorizer.py <video.mov|videos/> [output_dir]")
-        exit(1)
+    print(f"Found {len(video_paths)} videos -> {len(tasks)} tasks for {workers} workers")
+    
+    def describe(task):
+        _, (video_path, _, start, end, _) = task
+        return f"{Path(video_path).name}" + (f" [{start}:{end or 'end'}]" if start or end else "")
+    
+    results = run_tasks(VideoVectorizer, options, tasks, workers, describe, on_result=on_result)
+    saved = sum(r[1] for r in results)
+    errors = [(describe(t), r[2]) for t, r in zip(tasks, results) if r[2]]
+    for name, error in errors:
+        print(f"Error: {name} - {error}")
+    print(f"Complete! {saved} frames saved to {output_dir}")
+    if sampling:
+        counts = [r[3] for r in results if r[3]]
+        print(f"Sampling: {sampling_summary(sum(c[0] for c in counts), sum(c[1] for c in counts))}")
+
+def process_folder_incremental(input_path, output_dir="vectors", workers=1, chunk_frames=300,
+                               force=False, dry_run=False, **options):
+    """Vectorize only videos that are new or changed since the last run, per the manifest
+    
+    A changed video's frame folder is deleted before it is processed again, so
+    frames that no longer detect do not linger; removed videos lose theirs.
+    """
+    input_path = Path(input_path)
+    manifest = VectorManifest(output_dir, MANIFEST_NAME)
+    extractor = {
+        "tool": "video_vectorizer",
+        "profile": options.get("profile", "full"),
+        "mirror": options.get("mirror", "analytic"),
+        "running_mode": options.get("running_mode", "video"),
+        "format": options.get("output_format", "json"),
+        "sampling": [options.get("sample_threshold"), options.get("min_stride", 1), options.get("max_stride")],
+        "feature_version": FEATURE_VERSION,
+    }
+    archive_dir = options.get("archive_dir")
+    if archive_dir is not None:
+        extractor["archive"] = True
+    
+    video_paths = [input_path] if input_path.is_file() else find_videos(input_path)
+    plan = manifest.plan(video_paths, input_path, extractor, force=force)
+    manifest.print_plan(plan)
+    if dry_run:
+        return
+    
+    for key, _ in plan.removed:
+        manifest.forget(key)
+    for key, _ in plan.changed:
+        manifest.remove_outputs(key)
+    
+    def on_done(video_path):
+        stem = Path(video_path).stem
+        outputs = shard_files(stem) if extractor["format"] == "store" else [stem]
+        if archive_dir is not None:
+            outputs.append(os.path.relpath(Path(archive_dir) / archive_file(stem), output_dir))
+        manifest.record(video_path, extractor, outputs)
+    
+    todo = [path for _, path in plan.added + plan.changed]
+    if todo:
+        if workers > 1:
+            process_folder_parallel(todo, output_dir, workers, chunk_frames, on_done, **options)
+        else:
+            VideoVectorizer(**options).process_folder(input_path, output_dir, todo, on_done)
+    manifest.compact()
+
+if __name__ == "__main__":
+    import argparse
     
-    vectorizer = VideoVectorizer()
-    input_path = Path(sys.argv[1])
-    output_path = sys.argv[2] if len(sys.argv) > 2 else "vectors"
+    parser = argparse.ArgumentParser(description="Extract 260D sign vectors from videos")
+    parser.add_argument("input", help="Video file or folder of videos")
+    parser.add_argument("output_dir", nargs="?", default="vectors")
+    parser.add_argument("--mode", choices=("image", "video"), default="video",
+                        help="MediaPipe running mode (default: video, tracks landmarks across frames)")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run hand/pose/face detection concurrently per frame")
+    parser.add_argument("--mirror", choices=("analytic", "detect", "none"), default="analytic",
+                        help="How mirror vectors are made (default: analytic, no second detection pass)")
+    parser.add_argument("--profile", choices=tuple(PROFILES), default="full",
+                        help="Feature profile; pose_face skips the face mesh")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes, each with its own landmarkers (default: 1, serial)")
+    parser.add_argument("--chunk-frames", type=int, default=300,
+                        help="With --workers and --mode image, split videos into ranges of this many frames")
+    parser.add_argument("--format", choices=("json", "store"), default="json",
+                        help="json: one file per frame; store: one float32 shard per video (see vector_store.py)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Decode ahead and write on background threads, reports per-stage throughput")
+    parser.add_argument("--sample-threshold", type=float, default=None,
+                        help="Keep a frame only if its vector moved this far (L2) from the last kept one; "
+                             "0.3 with --max-stride 10 drops ~70%% of frames (see validate_sampling.py)")
+    parser.add_argument("--min-stride", type=int, default=1, help="With sampling, frames between kept frames at least")
+    parser.add_argument("--max-stride", type=int, default=None, help="With sampling, keep a frame at least this often")
+    parser.add_argument("--archive", action="store_true",
+                        help=f"Also keep raw landmarks in <output_dir>/{ARCHIVE_DIR} (see landmark_archive.py)")
+    parser.add_argument("--full", action="store_true",
+                        help="Reprocess every video, not just the ones added or changed since the last run")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only print the plan (added/changed/removed)")
+    args = parser.parse_args()
     
-    if input_path.is_file():
-        vectorizer.process_video(input_path, output_path)
-    else:
-        vectorizer.process_folder(input_path, output_path)
+    process_folder_incremental(
+        args.input, args.output_dir,
+        workers=args.workers,
+        chunk_frames=args.chunk_frames,
+        force=args.full,
+        dry_run=args.dry_run,
+        running_mode=args.mode,
+        parallel=args.parallel,
+        mirror=args.mirror,
+        profile=args.profile,
+        output_format=args.format,
+        pipeline=args.pipeline,
+        sample_threshold=args.sample_threshold,
+        min_stride=args.min_stride,
+        max_stride=args.max_stride,
+        archive_dir=Path(args.output_dir) / ARCHIVE_DIR if args.archive else None
+    )